@@ -0,0 +1,120 @@
+# 기존 RecursiveCharacterTextSplitter(100자) 와 구조 인식 chunker 의 검색 품질 / 토큰 비용 비교
+# 고정된 질문 목록에 대해 top-k 안에 정답 문구가 온전히 들어있는 chunk 가 있는지 확인한다.
+# 기본은 API 없이 글자 n-gram 임베딩을 쓰고, --openai 를 주면 실제 OpenAI 임베딩으로 비교한다.
+# 실행: python bench_chunking.py --k 4
+import argparse
+import json
+import os
+import numpy as np
+from common import NgramEmbeddings, use_chatbot_dir
+
+# (질문, 정답 chunk 에 들어있어야 하는 문구)
+QUERIES = [
+    ("카카오싱크 개인정보제공 항목 검수는 얼마나 걸리나요?", "영업일 기준 3~5일"),
+    ("카카오싱크 간편가입을 쓰면 어떤 효과가 있나요?", "서비스 약관 동의 절차 생략 가능"),
+    ("호스팅사 사용 여부를 나중에 바꿀 수 있나요?", "최초 선택 이후 변경 불가"),
+    ("카카오싱크 동의 화면에서 채널을 친구로 추가할 수 있나요?", "카카오톡 채널을 친구로 추가할 수도 있습니다"),
+    ("피커는 어떤 언어를 지원하나요?", "다국어 지원 | 한국어, 영어, 일본어"),
+    ("JavaScript SDK 피커의 화면 표시 형태는?", "JavaScript SDK는 풀 스크린 형태만 제공"),
+    ("친구 목록 가져오기 API 지원 범위", "REST API, Kakao SDK for JavaScript, Android, iOS, Flutter"),
+    ("친구 API 사용 권한은 어디서 신청하나요?", "[친구 API 사용 신청]"),
+    ("고객 파일 등록하기 API 문서 주소", "rest-api#create-user-file"),
+    ("카카오톡 채널 관계 알림은 어떤 방식으로 제공되나요?", "카카오톡 채널 관계 알림 | 사용자가 앱에 연결된 카카오톡 채널을 추가하거나 차단했을 때"),
+    ("카카오톡 채널 프로필 ID는 어떻게 확인하나요?", "[카카오톡 채널 관리자센터] > [관리] > [상세설정]"),
+    ("카카오톡 채널 고객 관리 API는 어디서 호출해야 하나요?", "서버에서만 호출해야 합니다"),
+]
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def baseline_chunks(sections):
+    # 기존 chatbot_3 generate_vector_db 의 2단계 100자 분할
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0)
+    chunk_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=10)
+    chunks = []
+    for section in sections:
+        pages = text_splitter.split_text(section.text)
+        chunks.extend(document.page_content for document in chunk_splitter.create_documents(pages))
+    return chunks
+
+
+def structure_chunks(sections, max_tokens):
+    from chunker import StructureChunker
+
+    chunker = StructureChunker(max_tokens=max_tokens)
+    chunks = []
+    for section in sections:
+        chunks.extend(chunker.split_text(section.text, section.section_path))
+    return chunks
+
+
+def evaluate(chunks, embedding, k):
+    from tokenizer import count_tokens
+
+    matrix = np.array(embedding.embed_documents(chunks), dtype=np.float32)
+    normalized = [normalize(chunk) for chunk in chunks]
+    hits = 0
+    reciprocal_ranks = []
+    context_tokens = []
+    for query, answer in QUERIES:
+        scores = matrix @ np.array(embedding.embed_query(query), dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        rank = next((i + 1 for i, index in enumerate(top) if normalize(answer) in normalized[index]), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        context_tokens.append(sum(count_tokens(chunks[index]) for index in top))
+
+    chunk_tokens = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "chunks": len(chunks),
+        "embedded_tokens": sum(chunk_tokens),
+        "mean_chunk_tokens": round(float(np.mean(chunk_tokens)), 1),
+        f"hit@{k}": round(hits / len(QUERIES), 3),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 3),
+        "mean_context_tokens": round(float(np.mean(context_tokens)), 1),
+    }
+
+
+def table_rows_intact(sections, chunks):
+    # 원문의 표 행 중 하나의 chunk 안에 온전히 들어간 비율
+    from chunker import TABLE_ROW_PATTERN
+
+    rows = [normalize(line) for section in sections for line in section.text.splitlines()
+            if TABLE_ROW_PATTERN.match(line.strip())]
+    normalized = [normalize(chunk) for chunk in chunks]
+    intact = sum(any(row in chunk for chunk in normalized) for row in rows)
+    return round(intact / len(rows), 3) if rows else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--openai", action="store_true", help="OpenAI 임베딩 사용 (API_KEY 필요)")
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    from section_parser import iter_dataset_sections
+
+    if args.openai:
+        from langchain.embeddings.openai import OpenAIEmbeddings
+
+        embedding = OpenAIEmbeddings(openai_api_key=os.environ["API_KEY"])
+    else:
+        embedding = NgramEmbeddings()
+
+    sections = list(iter_dataset_sections("../dataset/"))
+    result = {}
+    for name, chunks in [("recursive_100", baseline_chunks(sections)),
+                         ("structure", structure_chunks(sections, args.max_tokens))]:
+        result[name] = evaluate(chunks, embedding, args.k)
+        result[name]["table_rows_intact"] = table_rows_intact(sections, chunks)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
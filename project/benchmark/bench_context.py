@@ -0,0 +1,62 @@
+# 검색 결과를 리스트 repr 그대로 넣는 방식(before)과 context 조립(after)의 prompt 토큰 수 비교
+# chatbot_3 (구조 chunk) 와 chatbot_1 (섹션 통째) 검색 결과에 대해 정답 문구가 context 에 남는지도 같이 본다.
+# 실행: python bench_context.py --max-tokens 500
+import argparse
+import json
+import numpy as np
+from bench_chunking import QUERIES, normalize, structure_chunks
+from common import NgramEmbeddings, use_chatbot_dir
+
+
+def top_k(chunks, matrix, embedding, query, k):
+    scores = matrix @ np.array(embedding.embed_query(query), dtype=np.float32)
+    return [(chunks[index], float(scores[index])) for index in np.argsort(-scores)[:k]]
+
+
+def compare(chunks, embedding, template, before_k, after_k, max_tokens):
+    from context_builder import assemble_context
+    from tokenizer import count_tokens
+
+    matrix = np.array(embedding.embed_documents(chunks), dtype=np.float32)
+    result = {"before": {"tokens": [], "hits": 0}, "after": {"tokens": [], "hits": 0}}
+    for query, answer in QUERIES:
+        before = str([text for text, _ in top_k(chunks, matrix, embedding, query, before_k)])
+        after = assemble_context(top_k(chunks, matrix, embedding, query, after_k), max_tokens)
+        for name, context in [("before", before), ("after", after)]:
+            prompt = template.format(intent_desc="", chat_history="", user_message=query, related_documents=context)
+            result[name]["tokens"].append(count_tokens(prompt))
+            result[name]["hits"] += normalize(answer) in normalize(context.replace("\\n", "\n"))
+    return {
+        name: {
+            "mean_prompt_tokens": round(float(np.mean(value["tokens"])), 1),
+            "max_prompt_tokens": int(np.max(value["tokens"])),
+            "answer_in_context": round(value["hits"] / len(QUERIES), 3),
+        }
+        for name, value in result.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-tokens", type=int, default=500)
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    from section_parser import iter_dataset_sections
+
+    with open("../template/bot_prompt_1.txt", "r") as f:
+        template = f.read()
+    embedding = NgramEmbeddings()
+    sections = list(iter_dataset_sections("../dataset/"))
+    result = {
+        # chatbot_3: 기존 top-4 리스트 vs 후보 6개에서 예산만큼
+        "chunks": compare(structure_chunks(sections, 300), embedding, template, 4, 6, args.max_tokens),
+        # chatbot_1: 섹션 통째로 top-3
+        "sections": compare([f"{section.section_path}:{section.text}" for section in sections],
+                            embedding, template, 3, 3, args.max_tokens),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+# OpenAI / Google 검색 / 카카오 callback 을 로컬 fake 서버로 대신해서 세 챗봇을 끝까지 실행하는 벤치마크
+# 챗봇 폴더마다 같은 이름의 모듈(llm_client, tokenizer ...)이 있어서 대상마다 별도 프로세스로 실행한다.
+# 실행: python bench_e2e.py --requests 50 --concurrency 20 --output result.json
+#       python bench_e2e.py --baseline result.json --max-regression 0.2   (p95 가 20% 넘게 느려지면 exit 1)
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from common import PROJECT_DIR, FakeEmbeddings, copy_chroma, summarize, use_chatbot_dir
+from fake_servers import FakeCallbackReceiver, FakeGoogleSearch, FakeOpenAI, fake_reply, start_server
+
+QUESTIONS = [
+    "카카오싱크 기능이 무엇이 있는지 설명해주세요",
+    "카카오싱크 도입 절차를 알려주세요",
+    "카카오톡 채널 고객 관리에 대해 알려주세요",
+    "카카오 소셜 로그인 설정 방법은?",
+]
+# 대상 이름: (챗봇 폴더, 실행 함수 이름)
+TARGETS = {
+    "callback": ("chatbot_3", "run_callback"),
+    "generate_answer": ("chatbot_3", "run_generate_answer"),
+    "generate_sync_bot": ("chatbot_2", "run_generate_sync_bot"),
+    "kakao_chatbot": ("chatbot_1", "run_kakao_chatbot"),
+}
+
+
+class FakeEmbeddingFunction:
+    # chroma 기본 임베딩(onnx 모델 다운로드) 대신 쓰는 고정 벡터
+    def __init__(self, dim):
+        self.embeddings = FakeEmbeddings(dim)
+
+    def __call__(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+
+def question(i):
+    # 같은 질문이 합쳐지거나 캐시되지 않도록 번호를 붙인다.
+    return f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"
+
+
+def intent_reply(intent):
+    def reply(prompt):
+        if prompt.rstrip().endswith("Intent:"):
+            return intent
+        return fake_reply(prompt)
+    return reply
+
+
+def timed(owner, name, timings, label=None):
+    # owner.name 함수를 감싸서 실행 시간을 timings[label] 에 모은다.
+    func = getattr(owner, name)
+    label = label or name
+    if asyncio.iscoroutinefunction(func):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = await func(*args, **kwargs)
+            timings[label].append(time.perf_counter() - start)
+            return result
+    else:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            timings[label].append(time.perf_counter() - start)
+            return result
+    setattr(owner, name, wrapper)
+
+
+def time_stages(timings):
+    # chatbot_3 파이프라인 stage 별 실행 시간 (취소된 투기적 실행은 제외)
+    import pipeline
+
+    run = pipeline.Stage.run
+
+    async def wrapper(self, context):
+        start = time.perf_counter()
+        result = await run(self, context)
+        timings[self.name].append(time.perf_counter() - start)
+        return result
+
+    pipeline.Stage.run = wrapper
+
+
+def open_collection(module, getter, chatbot_dir, name, dim=384):
+    # 임시로 복사한 chroma 를 fake 임베딩으로 열어서 챗봇의 collection getter 를 바꿔치기한다.
+    import chromadb
+
+    client = chromadb.PersistentClient(path=copy_chroma(os.path.join(chatbot_dir, "chroma")))
+    collection = client.get_or_create_collection(name=name, embedding_function=FakeEmbeddingFunction(dim))
+    setattr(module, getter, lambda name=name: collection)
+    return collection
+
+
+async def drive_async(func, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latency = []
+    errors = []
+
+    async def call(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await func(i)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            latency.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    return latency, errors, time.perf_counter() - start
+
+
+async def drive_threads(func, requests, concurrency):
+    # 동기 챗봇 함수는 concurrency 개의 스레드에서 동시에 호출한다.
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def call(i):
+            await loop.run_in_executor(executor, func, i)
+
+        return await drive_async(call, requests, concurrency)
+
+
+async def run_callback(args, chatbot_dir, timings, servers):
+    # api.app 을 uvicorn 으로 띄우고 /callback 요청 -> callback 도착까지의 시간
+    import aiohttp
+    import uvicorn
+    from load_test import chatbot_request, free_port, wait_ready
+
+    receiver = FakeCallbackReceiver()
+    receiver_runner, receiver_url = await start_server(receiver.app)
+    servers.append(receiver_runner)
+    os.environ["CHROMA_PERSIST_DIR"] = copy_chroma(os.path.join(chatbot_dir, "chroma"))
+    use_chatbot_dir(chatbot_dir)
+    time_stages(timings)
+    import callback
+    from api import app
+
+    timed(callback, "post_callback", timings, "callback_post")
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, workers=1, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    skill_latency = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        # warm-up 은 background 에서 하므로 ready 가 된 뒤부터 잰다.
+        await wait_ready(session, port, args.timeout)
+        async def send(i):
+            body = chatbot_request(question(i), f"{receiver_url}/callback/{i}")
+            body["userRequest"]["user"]["id"] = f"bench-{i}"
+            start = time.perf_counter()
+            async with session.post(f"http://127.0.0.1:{port}/callback", json=body) as resp:
+                payload = await resp.json()
+            skill_latency.append(time.perf_counter() - start)
+            if not payload.get("useCallback"):
+                raise RuntimeError("queue full")
+            # callback 이 도착할 때까지를 요청 하나의 시간으로 본다.
+            deadline = time.perf_counter() + args.timeout
+            while str(i) not in receiver.received:
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("callback 이 오지 않음")
+                await asyncio.sleep(0.01)
+
+        result = await drive_async(send, args.requests, args.concurrency)
+        async with session.get(f"http://127.0.0.1:{port}/metrics?format=json") as resp:
+            metrics = await resp.json()
+
+    server.should_exit = True
+    await server_task
+    return result, {"skill_response": summarize(skill_latency) if skill_latency else None,
+                    "job_queue": metrics.get("job_queue")}
+
+
+async def run_generate_answer(args, chatbot_dir, timings, servers):
+    os.environ["CHROMA_PERSIST_DIR"] = copy_chroma(os.path.join(chatbot_dir, "chroma"))
+    use_chatbot_dir(chatbot_dir)
+    time_stages(timings)
+    import chatbot_3
+
+    chatbot_3.get_registry().open()
+    await chatbot_3.warm_up()
+    result = await drive_async(lambda i: chatbot_3.generate_answer_async(question(i)), args.requests,
+                               args.concurrency)
+    chatbot_3.get_runtime().stop_watching()
+    return result, {}
+
+
+async def run_generate_sync_bot(args, chatbot_dir, timings, servers):
+    use_chatbot_dir(chatbot_dir)
+    import chatbot_2
+    import llm_client
+
+    open_collection(chatbot_2, "get_collection", chatbot_dir, "kakao_sync_bot")
+    chatbot_2.generate_vector_db(chatbot_2.load_sections("../dataset/project_data_kakao_sync.txt"))
+    timed(chatbot_2, "call_db", timings, "vector_search")
+    timed(chatbot_2, "get_extra_link", timings, "extra_link")
+    timed(chatbot_2, "run_prompt", timings, "prompt")
+    timed(llm_client.LLMClient, "chat", timings, "llm")
+    result = await drive_threads(lambda i: chatbot_2.generate_sync_bot(question(i)), args.requests,
+                                 args.concurrency)
+    return result, {}
+
+
+async def run_kakao_chatbot(args, chatbot_dir, timings, servers):
+    use_chatbot_dir(chatbot_dir)
+    import chatbot_1
+    import llm_client
+
+    collection = open_collection(chatbot_1, "getCollection", chatbot_dir, "kakao_chatbot")
+    timed(type(collection), "query", timings, "vector_search")
+    timed(chatbot_1, "assemble_context", timings, "context_assembly")
+    timed(llm_client.LLMClient, "chat", timings, "llm")
+    result = await drive_threads(lambda i: chatbot_1.kakao_chatbot(question(i)), args.requests, args.concurrency)
+    return result, {}
+
+
+async def worker(args):
+    fake_openai = FakeOpenAI(latency=args.llm_latency, embedding_latency=args.embedding_latency,
+                             token_latency=args.token_latency, reply=intent_reply(args.intent))
+    fake_search = FakeGoogleSearch(latency=args.search_latency)
+    openai_runner, openai_url = await start_server(fake_openai.app)
+    search_runner, search_url = await start_server(fake_search.app)
+    servers = [openai_runner, search_runner]
+
+    # 챗봇 모듈 import 전에 설정해야 fake 서버를 사용한다.
+    os.environ["OPENAI_API_BASE"] = f"{openai_url}/v1"
+    os.environ["GOOGLE_CSE_ENDPOINT"] = f"{search_url}/customsearch/v1"
+    os.environ.setdefault("ANSWER_CACHE_THRESHOLD", "1.01")
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+
+    chatbot_dir, func = TARGETS[args.worker]
+    timings = defaultdict(list)
+    (latency, errors, elapsed), extra = await globals()[func](
+        args, os.path.join(PROJECT_DIR, chatbot_dir), timings, servers)
+    result = {
+        "chatbot": chatbot_dir,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "completed": len(latency),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latency) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latency) if latency else None,
+        "stages": {name: summarize(samples) for name, samples in sorted(timings.items())},
+        "upstream_requests": {"openai": fake_openai.requests, "google_search": fake_search.requests},
+        **extra,
+    }
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    for runner in servers:
+        await runner.cleanup()
+
+
+def run_target(args, target):
+    # 대상 하나를 새 프로세스에서 실행하고 결과 JSON 을 읽는다.
+    result_file = tempfile.mktemp(prefix=f"bench_e2e_{target}_", suffix=".json")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", target, "--result-file", result_file]
+    for key in ["requests", "concurrency", "llm_latency", "token_latency", "embedding_latency", "search_latency",
+                "intent", "timeout"]:
+        command += [f"--{key.replace('_', '-')}", str(getattr(args, key))]
+    try:
+        process = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True,
+                                 text=True, timeout=args.timeout + 120)
+    except subprocess.TimeoutExpired as e:
+        # 멈춘 대상 하나 때문에 전체 측정이 죽지 않도록 실패로 기록하고 다음 대상으로 넘어간다.
+        stderr = e.stderr.decode("utf-8", "replace") if isinstance(e.stderr, bytes) else e.stderr or ""
+        return {"failed": True, "reason": f"timeout ({e.timeout:.0f}s)", "stderr": stderr[-2000:]}
+    if process.returncode != 0 or not os.path.exists(result_file):
+        return {"failed": True, "reason": f"exit code {process.returncode}", "stderr": process.stderr[-2000:]}
+    with open(result_file, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    os.remove(result_file)
+    return result
+
+
+def find_regressions(results, baseline, max_regression):
+    # baseline 보다 p95 가 max_regression 비율 넘게 늘었거나 처리량이 그만큼 줄어든 대상
+    regressions = []
+    for target, result in results.items():
+        before = baseline.get("targets", {}).get(target)
+        if not before or not before.get("latency") or not result.get("latency"):
+            continue
+        p95, before_p95 = result["latency"]["p95_ms"], before["latency"]["p95_ms"]
+        if p95 > before_p95 * (1 + max_regression):
+            regressions.append(f"{target}: p95 {before_p95:.1f}ms -> {p95:.1f}ms")
+        throughput, before_throughput = result["throughput_rps"], before["throughput_rps"]
+        if throughput < before_throughput * (1 - max_regression):
+            regressions.append(f"{target}: throughput {before_throughput} -> {throughput} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--intent", default="sync", help="LLM 인텐트 판단 응답 (None 이면 web 검색 경로)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--worker", choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(worker(args))
+        return
+
+    report = {
+        "config": {key: getattr(args, key) for key in ["requests", "concurrency", "llm_latency", "token_latency",
+                                                        "embedding_latency", "search_latency", "intent"]},
+        "targets": {target: run_target(args, target) for target in args.targets.split(",")},
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failed = [f"{target}: {result.get('reason', 'failed')}" for target, result in report["targets"].items()
+              if result.get("failed")]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(report["targets"], json.load(f), args.max_regression)
+    for message in failed + regressions:
+        print(f"FAIL {message}", file=sys.stderr)
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# dataset 을 N 배로 늘린 합성 corpus 로 bulk ingestion 처리량(chunks/sec)과 최대 메모리 측정
+# 임베딩 API 는 지연시간을 흉내내는 FakeEmbeddings 로 대체하고 worker 수별로 비교한다.
+# 실행: python bench_ingest.py --copies 100 --latency 0.2 --workers 1 4 8
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import redirect_stdout
+from common import FakeEmbeddings, use_chatbot_dir
+
+
+class SlowEmbeddings(FakeEmbeddings):
+    # batch 한번 호출할 때마다 네트워크 왕복 시간만큼 기다린다.
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+
+def iter_corpus(chatbot_3, copies):
+    # 같은 dataset 을 copy 번호만 바꿔서 반복 (id 가 겹치지 않도록 source 를 다르게 둔다)
+    for copy in range(copies):
+        for document in chatbot_3.iter_dataset_documents():
+            document.metadata["source"] = f"{copy}_{document.metadata['source']}"
+            yield document
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    import chatbot_3
+    from ingest import ingest_documents
+
+    results = {}
+    for workers in args.workers:
+        persist_directory = tempfile.mkdtemp(prefix="bench_ingest_")
+        try:
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                result = ingest_documents(
+                    iter_corpus(chatbot_3, args.copies),
+                    persist_directory=persist_directory,
+                    embedding=SlowEmbeddings(args.latency),
+                    batch_size=args.batch_size,
+                    max_workers=workers,
+                )
+        finally:
+            shutil.rmtree(persist_directory, ignore_errors=True)
+        results[f"workers_{workers}"] = result
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# 매 요청마다 Chroma 를 새로 여는 방식(cold)과 registry 를 재사용하는 방식(warm)의 조회 시간 비교
+# 실행: python bench_retrieval.py --iterations 50
+import argparse
+import json
+import os
+import time
+from common import CHATBOT_3_DIR, FakeEmbeddings, copy_chroma, summarize, use_chatbot_dir
+
+QUERIES = [
+    "카카오싱크 기능이 무엇이 있는지 설명해주세요",
+    "카카오톡 채널 고객 관리에 대해 알려주세요",
+    "기능은 뭐야?",
+    "간편가입은 어떻게 하나요?",
+]
+
+
+def bench_cold(persist_directory, embedding, names, iterations):
+    import chromadb
+    from langchain.vectorstores import Chroma
+
+    samples = []
+    for i in range(iterations):
+        name = names[i % len(names)]
+        start = time.perf_counter()
+        # 기존 call_db 와 동일하게 요청마다 client, collection 을 새로 연다.
+        client = chromadb.PersistentClient(path=persist_directory)
+        db = Chroma(client=client, collection_name=name, embedding_function=embedding)
+        db.similarity_search(QUERIES[i % len(QUERIES)])
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_warm(persist_directory, embedding, names, iterations):
+    from retrieval import RetrievalRegistry
+
+    registry = RetrievalRegistry(persist_directory=persist_directory, embedding=embedding,
+                                 collection_names=names).open()
+    samples = []
+    for i in range(iterations):
+        name = names[i % len(names)]
+        start = time.perf_counter()
+        registry.get(name).similarity_search(QUERIES[i % len(QUERIES)])
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    persist_directory = copy_chroma(os.path.join(CHATBOT_3_DIR, "chroma"))
+    embedding = FakeEmbeddings()
+    names = ["sync", "channel", "social"]
+
+    result = {
+        "cold": summarize(bench_cold(persist_directory, embedding, names, args.iterations)),
+        "warm": summarize(bench_warm(persist_directory, embedding, names, args.iterations)),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# 요청마다 chain / 템플릿 / 인텐트 목록을 새로 만드는 방식(before)과
+# 시작할 때 한번 만든 runtime 을 재사용하는 방식(after)의 요청당 준비 시간 비교
+# 실행: python bench_runtime.py --iterations 200
+import argparse
+import json
+import time
+from common import summarize, use_chatbot_dir
+
+
+def create_chain(llm, template, output_key):
+    # 이전 chatbot_3.create_chain 과 같은 방식
+    from langchain.chains import LLMChain
+    from langchain.prompts.chat import ChatPromptTemplate
+
+    return LLMChain(llm=llm, prompt=ChatPromptTemplate.from_template(template=template),
+                    output_key=output_key, verbose=True)
+
+
+def setup_per_request(chatbot_3):
+    # 기존 generate_answer / query_web_search 가 매 요청마다 하던 준비 작업
+    from langchain.chat_models import ChatOpenAI
+
+    llm = ChatOpenAI(temperature=0.1, max_tokens=300, model="gpt-3.5-turbo")
+    search_llm = ChatOpenAI(temperature=0.1, max_tokens=200, model="gpt-3.5-turbo")
+    template = chatbot_3.read_prompt_template
+    create_chain(llm, template("../template/parse_intent.txt"), "intent")
+    create_chain(llm, template("../template/bot_prompt_1.txt"), "bot_output")
+    create_chain(llm, template("../template/bot_prompt_1.txt"), "output")
+    template("../template/intent_list.txt")
+    chatbot_3.read_intent_list("../template/intent_list.txt")
+    create_chain(search_llm, template("../template/search_value_check.txt"), "output")
+    create_chain(search_llm, template("../template/search_compress.txt"), "output")
+
+
+def bench(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    import chatbot_3
+
+    runtime = chatbot_3.get_runtime()
+    start = time.perf_counter()
+    runtime.load()
+    load_time = time.perf_counter() - start
+
+    result = {
+        "before_per_request": summarize(bench(lambda: setup_per_request(chatbot_3), args.iterations)),
+        "after_per_request": summarize(bench(runtime.current, args.iterations)),
+        "runtime_load_ms": round(load_time * 1000, 3),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
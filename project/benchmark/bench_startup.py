@@ -0,0 +1,155 @@
+# 서버 cold start 측정
+# - import: 새 프로세스에서 api 모듈 import 시간 (지금 구조 vs langchain/chromadb/openai 까지 모두 import 했을 때)
+# - cold start: uvicorn 프로세스를 띄운 시점부터 포트가 열릴 때까지, /ready 가 200 이 될 때까지,
+#   포트가 열리자마자 보낸 첫 /callback 의 답변이 도착할 때까지, ready 이후 요청의 답변 시간
+# OpenAI / callback 은 fake 서버를 쓴다.
+# 실행: python bench_startup.py --runs 3
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+from common import CHATBOT_3_DIR, copy_chroma, summarize
+from fake_servers import FakeCallbackReceiver, FakeOpenAI, start_server
+from load_test import chatbot_request, free_port
+
+# 예전에는 api import 시점에 모두 불러오던 모듈
+INTEGRATIONS = ["openai", "chromadb", "langchain.schema", "langchain.prompts.chat", "langchain.vectorstores",
+                "langchain.embeddings.openai"]
+IMPORT_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import api
+for name in {integrations!r}:
+    __import__(name)
+print(json.dumps({{"import_s": time.perf_counter() - start,
+                  "loaded": [name for name in ("langchain", "chromadb", "openai") if name in sys.modules]}}))
+"""
+
+
+def server_env(openai_url):
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_BASE": f"{openai_url}/v1",
+        "CHROMA_PERSIST_DIR": copy_chroma(os.path.join(CHATBOT_3_DIR, "chroma")),
+        "ANSWER_CACHE_THRESHOLD": "1.01",
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_TOKENS_PER_MINUTE": "0",
+    })
+    for key, value in [("API_KEY", "sk-benchmark"), ("GOOGLE_API_KEY", "benchmark"), ("GOOGLE_CSE_ID", "benchmark")]:
+        env.setdefault(key, value)
+    env.setdefault("OPENAI_API_KEY", env["API_KEY"])
+    return env
+
+
+def measure_import(env, integrations):
+    code = IMPORT_CODE.format(integrations=integrations)
+    process = subprocess.run([sys.executable, "-c", code], cwd=CHATBOT_3_DIR, env=env, capture_output=True,
+                             text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+async def wait_for(session, url, timeout, status=200):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with session.get(url) as resp:
+                if resp.status == status:
+                    return time.perf_counter()
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.01)
+    raise TimeoutError(url)
+
+
+async def ask(session, port, receiver, receiver_url, request_id, timeout):
+    # /callback 을 보내고 답변(fake LLM 응답)이 callback 으로 도착할 때까지 기다린다.
+    body = chatbot_request("카카오싱크 기능이 무엇이 있는지 설명해주세요", f"{receiver_url}/callback/{request_id}")
+    body["userRequest"]["user"]["id"] = f"startup-{request_id}"
+    async with session.post(f"http://127.0.0.1:{port}/callback", json=body) as resp:
+        await resp.json()
+    deadline = time.perf_counter() + timeout
+    while request_id not in receiver.received:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("callback 이 오지 않음")
+        await asyncio.sleep(0.005)
+    arrived, payload = receiver.received[request_id]
+    if "카카오싱크는" not in json.dumps(payload, ensure_ascii=False):
+        raise RuntimeError(f"정상 답변이 아님: {payload}")
+    return arrived
+
+
+async def cold_start(args, env, receiver, receiver_url, index):
+    port = free_port()
+    log = tempfile.NamedTemporaryFile(prefix="bench_startup_", suffix=".log", delete=False)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port",
+                                str(port), "--log-level", "warning"], cwd=CHATBOT_3_DIR, env=env, stdout=log,
+                               stderr=subprocess.STDOUT)
+    try:
+        async with aiohttp.ClientSession() as session:
+            listening = await wait_for(session, f"http://127.0.0.1:{port}/", args.timeout)
+            # 포트가 열리자마자 첫 요청을 보낸다. (warm-up 이 끝나기 전)
+            first = asyncio.ensure_future(ask(session, port, receiver, receiver_url, f"{index}-first", args.timeout))
+            ready = await wait_for(session, f"http://127.0.0.1:{port}/ready", args.timeout)
+            first_answer = await first
+            sent = time.perf_counter()
+            warm_answer = await ask(session, port, receiver, receiver_url, f"{index}-warm", args.timeout)
+            async with session.get(f"http://127.0.0.1:{port}/ready") as resp:
+                readiness = await resp.json()
+    except Exception:
+        with open(log.name, "r", encoding="utf-8", errors="replace") as f:
+            print(f.read()[-2000:], file=sys.stderr)
+        raise
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        os.remove(log.name)
+    return {
+        "listen_s": listening - start,
+        "ready_s": ready - start,
+        "warm_up_s": readiness["warm_up_s"],
+        "first_answer_s": first_answer - start,
+        "warm_request_s": warm_answer - sent,
+    }
+
+
+async def run(args):
+    fake_openai = FakeOpenAI(latency=args.llm_latency, embedding_latency=args.embedding_latency)
+    receiver = FakeCallbackReceiver()
+    openai_runner, openai_url = await start_server(fake_openai.app)
+    receiver_runner, receiver_url = await start_server(receiver.app)
+    env = server_env(openai_url)
+
+    imports = {"lazy": [], "eager": []}
+    for _ in range(args.runs):
+        imports["lazy"].append(measure_import(env, []))
+        imports["eager"].append(measure_import(env, INTEGRATIONS))
+    runs = [await cold_start(args, env, receiver, receiver_url, index) for index in range(args.runs)]
+
+    await openai_runner.cleanup()
+    await receiver_runner.cleanup()
+    return {
+        "runs": args.runs,
+        "import": {mode: {**summarize([sample["import_s"] for sample in samples]),
+                          "loaded": samples[0]["loaded"]} for mode, samples in imports.items()},
+        "cold_start": {key: summarize([sample[key] for sample in runs]) for key in runs[0]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
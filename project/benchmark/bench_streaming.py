@@ -0,0 +1,120 @@
+# 스트리밍 생성 + 조기 callback 전송의 체감 지연 비교
+# 답변 전체를 기다렸다가 보내는 방식(before, CALLBACK_MIN_CHARS 무한대)과
+# 문장 경계에서 먼저 보내는 방식(after)의 callback 도착 시간을 fake 스트리밍 LLM 서버로 측정한다.
+# 나머지는 "이어서 보기" 요청으로 받아서 전체 답변과 같은지 확인한다.
+# 실행: python bench_streaming.py --requests 50 --token-latency 0.03
+import argparse
+import asyncio
+import json
+import os
+import time
+import aiohttp
+import uvicorn
+from common import CHATBOT_3_DIR, copy_chroma, summarize, use_chatbot_dir
+from fake_servers import FakeCallbackReceiver, FakeOpenAI, fake_reply, start_server
+from load_test import chatbot_request, free_port
+
+LONG_ANSWER = " ".join([
+    "카카오싱크는 카카오 로그인을 통해 서비스에 간편하게 가입할 수 있도록 돕는 비즈니스 설루션입니다.",
+    "사용자는 동의 화면에서 정보 제공 동의와 서비스 약관 동의를 한 번에 마칠 수 있습니다.",
+    "서비스는 이름, 이메일, 전화번호, 배송지 등 회원 가입에 필요한 정보를 카카오로부터 제공받을 수 있습니다.",
+    "도입하려면 카카오비즈니스 관리자센터에서 카카오싱크를 신청하고 개인정보제공 항목 검수를 받아야 합니다.",
+    "검수에는 영업일 기준 3~5일이 걸리며, 완료 후 간편가입, 대표 채널, 동의 항목 등을 설정합니다.",
+    "설정이 끝나면 카카오 로그인과 같은 방식으로 연동 개발을 진행하면 됩니다.",
+])
+
+
+def long_reply(prompt):
+    reply = fake_reply(prompt)
+    return LONG_ANSWER if reply == fake_reply("") else reply
+
+
+async def run_round(args, port, receiver, receiver_url, label):
+    receiver.received.clear()
+    sent_at = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def send(session, i):
+        request_id = f"{label}-{i}"
+        body = chatbot_request(f"카카오싱크 도입 방법을 자세히 알려주세요 {label} {i}", f"{receiver_url}/callback/{request_id}")
+        body["userRequest"]["user"]["id"] = request_id
+        async with semaphore:
+            sent_at[request_id] = time.perf_counter()
+            async with session.post(f"http://127.0.0.1:{port}/callback", json=body) as resp:
+                await resp.read()
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        await asyncio.gather(*(send(session, i) for i in range(args.requests)))
+        deadline = time.perf_counter() + args.timeout
+        while len(receiver.received) < args.requests and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        # 이어서 보기로 나머지를 받아서 합친다.
+        complete = 0
+        for request_id, (_, payload) in list(receiver.received.items()):
+            text = payload["template"]["outputs"][0]["simpleText"]["text"]
+            while "quickReplies" in payload["template"]:
+                body = chatbot_request("이어서 보기", None)
+                body["userRequest"]["user"]["id"] = request_id
+                async with session.post(f"http://127.0.0.1:{port}/callback", json=body) as resp:
+                    payload = await resp.json()
+                text += payload["template"]["outputs"][0]["simpleText"]["text"]
+            complete += text.strip() == LONG_ANSWER
+
+    latency = [received_at - sent_at[request_id] for request_id, (received_at, _) in receiver.received.items()]
+    first_lengths = [len(payload["template"]["outputs"][0]["simpleText"]["text"])
+                     for _, payload in receiver.received.values()]
+    return {
+        "completed": len(receiver.received),
+        "callback": summarize(latency) if latency else None,
+        "mean_first_part_chars": round(sum(first_lengths) / len(first_lengths), 1) if first_lengths else 0,
+        "full_answer_reassembled": complete,
+    }
+
+
+async def run(args):
+    fake_openai = FakeOpenAI(latency=args.llm_latency, token_latency=args.token_latency, reply=long_reply)
+    receiver = FakeCallbackReceiver()
+    openai_runner, openai_url = await start_server(fake_openai.app)
+    receiver_runner, receiver_url = await start_server(receiver.app)
+
+    os.environ["OPENAI_API_BASE"] = f"{openai_url}/v1"
+    os.environ["CHROMA_PERSIST_DIR"] = copy_chroma(os.path.join(CHATBOT_3_DIR, "chroma"))
+    os.environ.setdefault("ANSWER_CACHE_THRESHOLD", "1.01")
+    use_chatbot_dir()
+
+    import callback
+    from api import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, workers=1, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    result = {"answer_chars": len(LONG_ANSWER), "token_latency_s": args.token_latency}
+    callback.CALLBACK_MIN_CHARS = 10 ** 9
+    result["before_wait_full_answer"] = await run_round(args, port, receiver, receiver_url, "before")
+    callback.CALLBACK_MIN_CHARS = args.min_chars
+    result["after_early_callback"] = await run_round(args, port, receiver, receiver_url, "after")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    server.should_exit = True
+    await server_task
+    await openai_runner.cleanup()
+    await receiver_runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.03)
+    parser.add_argument("--min-chars", type=int, default=80)
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# chroma(sqlite + HNSW) 와 numpy mmap store(float16 / int8)의 open 시간, 조회 시간, recall, 메모리 비교
+# backend 마다 새 프로세스 --workers 개를 띄워서 측정한다. (uvicorn worker 처럼 같은 파일을 여러 프로세스가 여는 상황)
+# 실행: python bench_vector_store.py --queries 200 --scale 5000
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from common import CHATBOT_3_DIR, FakeEmbeddings, copy_chroma, summarize, use_chatbot_dir
+
+COLLECTION_NAME = "bench"
+BACKENDS = ["chroma", "numpy:float16", "numpy:int8"]
+
+
+def memory_kb() -> dict:
+    # linux 전용. RssFile 은 mmap 한 파일 페이지(프로세스끼리 공유), Pss 는 공유 페이지를 나눠서 센 값
+    result = {}
+    for path, names in [("/proc/self/status", ("VmRSS", "RssAnon", "RssFile")), ("/proc/self/smaps_rollup", ("Pss",))]:
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name in names:
+                        result[name] = int(value.split()[0])
+        except OSError:
+            pass
+    return result
+
+
+def load_corpus(scale, seed=0):
+    # chatbot_3 chroma 의 카테고리별 chunk 를 읽고, scale 이 더 크면 노이즈를 섞어서 늘린다.
+    import chromadb
+
+    client = chromadb.PersistentClient(path=copy_chroma(os.path.join(CHATBOT_3_DIR, "chroma")))
+    documents, metadatas, embeddings = [], [], []
+    for name in ["sync", "channel", "social"]:
+        result = client.get_collection(name).get(include=["embeddings", "documents", "metadatas"])
+        documents.extend(result["documents"])
+        metadatas.extend({**(metadata or {}), "category": name} for metadata in result["metadatas"])
+        embeddings.extend(result["embeddings"])
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    base = len(matrix)
+    if scale > base:
+        picks = rng.integers(0, base, scale - base)
+        noise = rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32) * 0.01
+        matrix = np.vstack([matrix, matrix[picks] + noise])
+        documents += [documents[i] for i in picks]
+        metadatas += [metadatas[i] for i in picks]
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    metadatas = [{**metadata, "row": row} for row, metadata in enumerate(metadatas)]
+    return documents, metadatas, matrix
+
+
+def build_stores(workdir, documents, metadatas, matrix):
+    import chromadb
+    from vector_store import numpy_store_path, write_store
+
+    ids = [str(row) for row in range(len(documents))]
+    stores = {"chroma": os.path.join(workdir, "chroma")}
+    collection = chromadb.PersistentClient(path=stores["chroma"]).get_or_create_collection(
+        name=COLLECTION_NAME, embedding_function=None)
+    for start in range(0, len(ids), 1000):
+        end = start + 1000
+        collection.add(ids=ids[start:end], embeddings=matrix[start:end].tolist(),
+                       documents=documents[start:end], metadatas=metadatas[start:end])
+    for dtype in ["float16", "int8"]:
+        stores[f"numpy:{dtype}"] = os.path.join(workdir, f"numpy_{dtype}")
+        write_store(numpy_store_path(stores[f"numpy:{dtype}"], COLLECTION_NAME), ids, documents, metadatas,
+                    matrix, dtype)
+    return stores
+
+
+def worker(backend, persist_directory, queries_path, k, barrier, results):
+    # spawn 된 프로세스. 환경 변수로 backend 를 고른 뒤 retrieval 을 import 한다.
+    os.environ["VECTOR_BACKEND"] = backend.split(":")[0]
+    use_chatbot_dir()
+    from retrieval import RetrievalRegistry
+
+    data = np.load(queries_path)
+    queries, truth = data["queries"], data["truth"]
+    before = memory_kb()
+    start = time.perf_counter()
+    registry = RetrievalRegistry(persist_directory=persist_directory, embedding=FakeEmbeddings(),
+                                 collection_names=[COLLECTION_NAME])
+    handle = registry.get(COLLECTION_NAME)
+    handle.search_with_score_by_vector(queries[0].tolist(), k=k)
+    open_time = time.perf_counter() - start
+
+    samples, hits = [], 0
+    for query, expected in zip(queries, truth):
+        vector = query.tolist()
+        start = time.perf_counter()
+        found = handle.search_with_score_by_vector(vector, k=k)
+        samples.append(time.perf_counter() - start)
+        hits += len({doc.metadata["row"] for doc, _ in found} & set(expected.tolist()))
+    # 모든 worker 가 store 를 열어둔 상태에서 메모리를 잰다.
+    barrier.wait()
+    after = memory_kb()
+    barrier.wait()
+    results.put({
+        "open_ms": round(open_time * 1000, 2),
+        "query": summarize(samples),
+        "recall": round(hits / (len(queries) * k), 4),
+        "memory_kb": {name: after.get(name, 0) - before.get(name, 0) for name in after},
+    })
+
+
+def run_backend(backend, persist_directory, queries_path, k, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(backend, persist_directory, queries_path, k, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    first = outputs[0]
+    return {
+        "open_ms": first["open_ms"],
+        "query": first["query"],
+        "recall": first["recall"],
+        # 프로세스 하나당 증가분과 전체 Pss 합 (공유 페이지는 나눠서 셈)
+        "memory_kb_per_worker": first["memory_kb"],
+        "pss_kb_total": sum(output["memory_kb"].get("Pss", 0) for output in outputs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--scale", type=int, default=0, help="corpus 를 이 개수까지 늘림 (0 이면 실제 chunk 만)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    use_chatbot_dir()
+    documents, metadatas, matrix = load_corpus(args.scale)
+    workdir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    stores = build_stores(workdir, documents, metadatas, matrix)
+
+    # 저장된 chunk 에 노이즈를 섞은 질문 벡터와 float32 brute-force 정답
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.integers(0, len(matrix), args.queries)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ matrix.T), axis=1)[:, :args.k]
+    queries_path = os.path.join(workdir, "queries.npz")
+    np.savez(queries_path, queries=queries, truth=truth)
+
+    result = {"corpus": len(documents), "dim": int(matrix.shape[1]), "k": args.k, "workers": args.workers,
+              "backends": {}}
+    for backend in args.backends.split(","):
+        result["backends"][backend] = run_backend(backend, stores[backend], queries_path, args.k, args.workers)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
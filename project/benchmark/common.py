@@ -0,0 +1,86 @@
+import hashlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHATBOT_3_DIR = os.path.join(PROJECT_DIR, "chatbot_3")
+SHARED_DIR = os.path.join(PROJECT_DIR, "shared")
+EMBEDDING_DIM = 1536
+
+
+def use_chatbot_dir(chatbot_dir=CHATBOT_3_DIR):
+    # 챗봇 모듈은 해당 폴더에서 실행되는 것을 가정한다. (../template, from dto import ...)
+    if chatbot_dir not in sys.path:
+        sys.path.insert(0, chatbot_dir)
+    # 챗봇들이 같이 쓰는 모듈 (tokenizer, chunker, llm_client 등)
+    if SHARED_DIR not in sys.path:
+        sys.path.append(SHARED_DIR)
+    os.chdir(chatbot_dir)
+    os.environ.setdefault("API_KEY", "sk-benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", os.environ["API_KEY"])
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ.setdefault("GOOGLE_CSE_ID", "benchmark")
+
+
+def copy_chroma(src):
+    # chroma 는 열기만 해도 segment 파일을 갱신하므로 임시 폴더에 복사해서 쓴다.
+    dst = os.path.join(tempfile.mkdtemp(prefix="bench_chroma_"), "chroma")
+    shutil.copytree(src, dst)
+    return dst
+
+
+class FakeEmbeddings(Embeddings):
+    # OpenAI 호출 없이 텍스트마다 고정된 벡터를 만들어주는 임베딩
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class NgramEmbeddings(Embeddings):
+    # 글자 2-gram 을 해시해서 만든 bag-of-ngram 벡터. API 없이 검색 품질을 비교할 때 쓰는 대용품
+    def __init__(self, dim=EMBEDDING_DIM, n=2):
+        self.dim = dim
+        self.n = n
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim)
+        text = " ".join(text.lower().split())
+        for i in range(len(text) - self.n + 1):
+            gram = text[i:i + self.n].encode("utf-8")
+            vector[int.from_bytes(hashlib.md5(gram).digest()[:4], "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def summarize(samples):
+    # 초 단위 측정값을 ms 단위 통계로 변환
+    samples = sorted(samples)
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.mean(ms), 4),
+        "p50_ms": round(ms[int(len(ms) * 0.50)], 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "p99_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 4),
+    }
@@ -0,0 +1,140 @@
+# 실제 OpenAI / 카카오 callback 대신 사용하는 로컬 서버
+import asyncio
+import hashlib
+import json
+import re
+import time
+import numpy as np
+from aiohttp import web
+from common import EMBEDDING_DIM
+
+
+def fake_reply(prompt: str) -> str:
+    # 템플릿에 따라 파이프라인이 기대하는 형태로 답한다.
+    if prompt.rstrip().endswith("Intent:"):
+        return "sync"
+    if "You must answer Y or N" in prompt:
+        return "Y"
+    return "카카오싱크는 카카오 로그인을 통해 간편하게 가입할 수 있는 서비스입니다. 간편가입과 다양한 사용자 정보 활용 기능을 제공합니다."
+
+
+def fake_vector(value, dim=EMBEDDING_DIM):
+    seed = int.from_bytes(hashlib.sha256(json.dumps(value).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def split_tokens(text: str) -> list:
+    # 스트리밍 응답용. 공백을 앞에 붙인 단어 단위로 나눈다.
+    return [token for token in re.split(r"(?=\s)", text) if token]
+
+
+class FakeOpenAI:
+    # OpenAI 호환 chat completion(stream 포함), embedding API
+    # latency 는 첫 토큰까지, token_latency 는 토큰 하나를 만드는 시간
+    def __init__(self, latency=0.5, embedding_latency=0.05, token_latency=0.0, reply=None):
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.token_latency = token_latency
+        self.reply = reply or fake_reply
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.app.router.add_post("/v1/embeddings", self.embeddings)
+
+    async def chat_completions(self, request):
+        self.requests += 1
+        body = await request.json()
+        prompt = "\n".join(message.get("content") or "" for message in body["messages"])
+        await asyncio.sleep(self.latency)
+        content = self.reply(prompt)
+        if body.get("stream"):
+            return await self.stream(request, body, content)
+        await asyncio.sleep(self.token_latency * len(split_tokens(content)))
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content),
+                      "total_tokens": len(prompt) + len(content)},
+        })
+
+    async def stream(self, request, body, content):
+        # server-sent events 형식으로 토큰을 하나씩 보낸다.
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunk = {"id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": body.get("model", "gpt-3.5-turbo")}
+        deltas = [{"role": "assistant"}] + [{"content": token} for token in split_tokens(content)] + [{}]
+        for index, delta in enumerate(deltas):
+            if "content" in delta:
+                await asyncio.sleep(self.token_latency)
+            finish_reason = "stop" if index == len(deltas) - 1 else None
+            data = {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request):
+        self.requests += 1
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        await asyncio.sleep(self.embedding_latency)
+        return web.json_response({
+            "object": "list",
+            "model": body.get("model", "text-embedding-ada-002"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_vector(value)}
+                     for i, value in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+
+class FakeGoogleSearch:
+    # Google Custom Search JSON API (GET /customsearch/v1)
+    def __init__(self, latency=0.3, results=10):
+        self.latency = latency
+        self.results = results
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_get("/customsearch/v1", self.search)
+
+    async def search(self, request):
+        self.requests += 1
+        query = request.query.get("q", "")
+        num = min(int(request.query.get("num", self.results)), self.results)
+        await asyncio.sleep(self.latency)
+        return web.json_response({
+            "kind": "customsearch#search",
+            "items": [{
+                "kind": "customsearch#result",
+                "title": f"{query} - 검색 결과 {i + 1}",
+                "link": f"https://example.com/search/{i + 1}",
+                "snippet": f"{query} 에 대한 검색 결과 {i + 1} 입니다. 카카오싱크와 카카오톡 채널 관련 안내를 확인하세요.",
+            } for i in range(num)],
+        })
+
+
+class FakeCallbackReceiver:
+    # 카카오 callbackUrl 역할. 도착 시각을 기록한다.
+    def __init__(self):
+        self.received = {}
+        self.app = web.Application()
+        self.app.router.add_post("/callback/{request_id}", self.callback)
+
+    async def callback(self, request):
+        self.received[request.match_info["request_id"]] = (time.perf_counter(), await request.json())
+        return web.json_response({"status": "SUCCESS"})
+
+
+async def start_server(app, host="127.0.0.1"):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
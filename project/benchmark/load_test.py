@@ -0,0 +1,134 @@
+# 로컬 fake LLM / callback 서버를 띄우고 chatbot_3 api 의 /callback 에 동시 요청을 보내는 부하 테스트
+# 실행: python load_test.py --requests 300 --concurrency 300 --llm-latency 0.5
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+import aiohttp
+from common import CHATBOT_3_DIR, copy_chroma, summarize, use_chatbot_dir
+from fake_servers import FakeCallbackReceiver, FakeOpenAI, start_server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(session, port, timeout=120.0):
+    # warm-up 은 서버 시작 후 background 에서 하므로 /ready 가 200 이 될 때까지 기다린다.
+    # 측정 환경에서 warm-up 실패(서버는 계속 다시 시도함)는 설정 문제이므로 기다리지 않고 바로 실패한다.
+    deadline = time.perf_counter() + timeout
+    while True:
+        async with session.get(f"http://127.0.0.1:{port}/ready") as resp:
+            if resp.status == 200:
+                return
+            readiness = await resp.json()
+        if readiness.get("error"):
+            raise RuntimeError(f"서버 warm-up 실패: {readiness['error']}")
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{timeout}s 안에 ready 가 되지 않음")
+        await asyncio.sleep(0.05)
+
+
+def chatbot_request(utterance, callback_url):
+    return {
+        "userRequest": {
+            "utterance": utterance,
+            "callbackUrl": callback_url,
+            "user": {"id": "load-test", "properties": {}},
+        },
+        "intent": {"name": "load-test"},
+        "action": {},
+    }
+
+
+async def run(args):
+    fake_openai = FakeOpenAI(latency=args.llm_latency)
+    receiver = FakeCallbackReceiver()
+    openai_runner, openai_url = await start_server(fake_openai.app)
+    receiver_runner, receiver_url = await start_server(receiver.app)
+
+    # 모듈 import 전에 설정해야 openai / registry 가 fake 서버와 임시 chroma 를 사용한다.
+    os.environ["OPENAI_API_BASE"] = f"{openai_url}/v1"
+    os.environ["CHROMA_PERSIST_DIR"] = copy_chroma(os.path.join(CHATBOT_3_DIR, "chroma"))
+    os.environ.setdefault("ANSWER_CACHE_THRESHOLD", "1.01")
+    # fake 서버라 분당 요청/토큰 한도는 끈다. (0 이면 제한 없음)
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    use_chatbot_dir()
+
+    import uvicorn
+    from api import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, workers=1, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    sent_at = {}
+    skill_latency = []
+    rejected = []
+
+    async def send(session, i):
+        request_id = str(i)
+        body = chatbot_request(f"카카오싱크 기능이 무엇이 있는지 설명해주세요 {i}", f"{receiver_url}/callback/{request_id}")
+        body["userRequest"]["user"]["id"] = f"load-test-{request_id}"
+        async with semaphore:
+            sent_at[request_id] = time.perf_counter()
+            async with session.post(f"http://127.0.0.1:{port}/callback", json=body) as resp:
+                payload = await resp.json()
+            skill_latency.append(time.perf_counter() - sent_at[request_id])
+            # 큐가 가득 차서 바로 대체 답변을 받은 요청은 callback 이 오지 않는다.
+            if not payload.get("useCallback"):
+                rejected.append(request_id)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        await wait_ready(session, port, args.timeout)
+        start = time.perf_counter()
+        await asyncio.gather(*(send(session, i) for i in range(args.requests)))
+
+        deadline = time.perf_counter() + args.timeout
+        while len(receiver.received) < args.requests - len(rejected) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        async with session.get(f"http://127.0.0.1:{port}/metrics?format=json") as resp:
+            metrics = await resp.json()
+
+    callback_latency = [received_at - sent_at[request_id]
+                        for request_id, (received_at, _) in receiver.received.items()]
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_latency_s": args.llm_latency,
+        "completed": len(receiver.received),
+        "rejected": len(rejected),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(receiver.received) / elapsed, 2),
+        "skill_response": summarize(skill_latency),
+        "callback": summarize(callback_latency) if callback_latency else None,
+        "job_queue": metrics["job_queue"],
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    server.should_exit = True
+    await server_task
+    await openai_runner.cleanup()
+    await receiver_runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
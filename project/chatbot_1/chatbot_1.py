@@ -1,13 +1,28 @@
+import hashlib
 import json
-import openai
 import os
 import re
 import tkinter as tk
 from tkinter import scrolledtext
 import chromadb
+from functools import lru_cache
+from langchain.prompts.chat import ChatPromptTemplate
+import shared_path
+from context_builder import assemble_context
+from llm_client import get_llm_client
+from memory import get_memory
 
-openai.api_key = os.environ['API_KEY']
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
+# 창 하나가 사용자 한 명
+LOCAL_USER_ID = "local"
+
+
+@lru_cache(maxsize=None)
+def getCollection(name="kakao_chatbot"):
+    # client, collection 은 프로세스당 한번만 열어서 재사용
+    client = chromadb.PersistentClient()
+    return client.get_or_create_collection(name=name)
+
 
 def prompt():
     message_log = [
@@ -65,22 +80,17 @@ def generateFormatData(data):
 
 
 def kakao_chatbot(command):
-    client = chromadb.PersistentClient()
-    collection = client.get_or_create_collection(
-        name="kakao_chatbot")
+    collection = getCollection()
     searchResult = collection.query(
         query_texts=[command],
-        n_results=3)
-
-    completion = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "user", "content": f"{searchResult['documents']}"},
-        ],
-        max_tokens=1024
-    )
+        n_results=3,
+        include=["documents", "distances"])
+    # 리스트 repr 대신 중복을 뺀 문서를 거리 순으로 토큰 예산 안에서만 넣는다.
+    context = assemble_context(
+        zip(searchResult['documents'][0], [-distance for distance in searchResult['distances'][0]]),
+        int(os.getenv("CONTEXT_MAX_TOKENS", "500")))
 
-    return completion["choices"][0]["message"]["content"]
+    return get_llm_client().complete(f"{context}\n\n질문: {command}", max_tokens=1024)
 
 
 def show_popup_message(window, message):
@@ -115,16 +125,16 @@ def show_popup_message(window, message):
 
 
 def send_message_to_gpt(message_log, functions, gpt_model="gpt-3.5-turbo", temperature=0.1):
-    response = openai.ChatCompletion.create(
+    # 연결 재사용, 분당 한도, 재시도는 공용 llm client 가 맡는다.
+    client = get_llm_client()
+    response_message = client.chat(
+        message_log,
         model=gpt_model,
-        messages=message_log,
         temperature=temperature,
         functions=functions,
         function_call='auto',
     )
 
-    response_message = response["choices"][0]["message"]
-
     if response_message.get("function_call"):
         available_functions = {
             "kakao_chatbot": kakao_chatbot,
@@ -145,12 +155,23 @@ def send_message_to_gpt(message_log, functions, gpt_model="gpt-3.5-turbo", tempe
                 "content": function_response,
             }
         )  # 함수 실행 결과도 GPT messages에 추가하기
-        response = openai.ChatCompletion.create(
+        response_message = client.chat(
+            message_log,
             model=gpt_model,
-            messages=message_log,
             temperature=temperature,
         )  # 함수 실행 결과를 GPT에 보내 새로운 답변 받아오기
-    return response.choices[0].message.content
+    return response_message.get("content") or ""
+
+
+@lru_cache(maxsize=None)
+def get_summary_prompt():
+    with open("../template/summarize_history.txt", "r") as f:
+        return ChatPromptTemplate.from_template(template=f.read())
+
+
+def summarize_history(summary, history):
+    messages = get_summary_prompt().format_messages(summary=summary, history=history)
+    return get_llm_client().complete(messages[0].content, max_tokens=200)
 
 
 def on_send(message_log, user_entry, window, conversation, functions):
@@ -161,16 +182,18 @@ def on_send(message_log, user_entry, window, conversation, functions):
         window.destroy()
         return
 
-    message_log.append({"role": "user", "content": user_input})
+    # 대화 기록은 memory 가 토큰 예산 안에서 들고 있고(오래된 턴은 요약), message_log 는 system prompt 만 둔다.
+    memory = get_memory(summarize_history)
     conversation.config(state=tk.NORMAL)  # 이동
     conversation.insert(tk.END, f"You: {user_input}\n", "user")  # 이동
     thinking_popup = show_popup_message(window, "처리중...")
     window.update_idletasks()
     # '생각 중...' 팝업 창이 반드시 화면에 나타나도록 강제로 설정하기
-    response = send_message_to_gpt(message_log, functions)
+    messages = message_log + memory.messages(LOCAL_USER_ID) + [{"role": "user", "content": user_input}]
+    response = send_message_to_gpt(messages, functions)
     thinking_popup.destroy()
 
-    message_log.append({"role": "assistant", "content": response})
+    memory.record(LOCAL_USER_ID, user_input, response)
 
     # 태그를 추가한 부분(1)
     conversation.insert(tk.END, f"gpt assistant: {response}\n", "assistant")
@@ -207,19 +230,33 @@ def chatbot_window():
 
 def generateVectorDB(dataset):
     # 한글이라 잘 안되는 것일까?
-    client = chromadb.PersistentClient()
-    collection = client.get_or_create_collection(
-        name="kakao_chatbot")
+    collection = getCollection()
     ids = []
     documents = []
     for key in dataset:
-        ids.append(key.lower().replace(' ', '-'))
         document = f"{key}:{dataset[key].strip().lower()}"
+        # 내용이 같으면 같은 id (다시 실행해도 중복으로 들어가지 않음)
+        ids.append(f"{key.lower().replace(' ', '-')}_{hashlib.sha256(document.encode('utf-8')).hexdigest()[:16]}")
         documents.append(document)
-    collection.add(
-        documents=documents,
-        ids=ids,
-    )
+    syncCollection(collection, ids, documents)
+
+
+def syncCollection(collection, ids, documents):
+    # 새로 생긴 문서만 추가하고 원문에서 사라진 문서는 지운다.
+    existing = set(collection.get(include=[])["ids"])
+    new = {}
+    for id, document in zip(ids, documents):
+        if id not in existing:
+            new[id] = document
+    stale = existing - set(ids)
+
+    if stale:
+        collection.delete(ids=list(stale))
+    if new:
+        collection.add(
+            documents=list(new.values()),
+            ids=list(new.keys()),
+        )
 
 
 def main():
@@ -1,11 +1,30 @@
 # -*- coding: utf-8 -*-
+import logging
+import threading
 from fastapi import FastAPI
 from fastapi import BackgroundTasks
 from fastapi.responses import HTMLResponse
 from dto import ChatbotRequest
 from callback import callback_handler
+from chatbot_2 import get_extra_link
 
 app = FastAPI()
+logger = logging.getLogger("API")
+
+
+def prefetch_extra_link():
+    try:
+        get_extra_link()
+    except Exception:
+        # 실패한 결과는 캐시되지 않으므로 첫 요청에서 다시 받아온다.
+        logger.warning("대표 링크 미리 받기 실패", exc_info=True)
+
+
+@app.on_event("startup")
+def startup():
+    # 요청마다 같은 값인 대표 링크는 시작할 때 미리 받아둔다.
+    # LLM 이 느리거나 안 될 때도 서버는 바로 뜨도록 background 에서 받는다.
+    threading.Thread(target=prefetch_extra_link, name="extra-link-prefetch", daemon=True).start()
 
 
 @app.get("/")
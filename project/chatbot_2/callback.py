@@ -9,20 +9,11 @@ from chatbot_2 import generate_sync_bot
 
 # 환경 변수 처리 필요!
 openai.api_key = os.environ['API_KEY']
-SYSTEM_MSG = "당신은 카카오 서비스 제공자입니다."
 logger = logging.getLogger("Callback")
 
 
 def callback_handler(request: ChatbotRequest) -> dict:
     # ===================== start =================================
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": SYSTEM_MSG},
-            {"role": "user", "content": request.userRequest.utterance},
-        ],
-        temperature=0,
-    )
     # focus
     output_text = generate_sync_bot(request.userRequest.utterance)
     print(output_text)
@@ -1,65 +1,73 @@
-import openai
+import hashlib
 import os
-import re
 import chromadb
-from langchain.chat_models import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from functools import lru_cache
 from langchain.prompts.chat import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain.chains import SequentialChain
+import shared_path
+from chunker import StructureChunker
+from context_builder import assemble_context
+from llm_client import get_llm_client
+from section_parser import DEFAULT_SECTION, iter_sections
 
-openai.api_key = os.environ['API_KEY']
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
-def load_data(filepath):
-    # txt 파일을 읽어서 데이터를 생성한다.
-    file = open(filepath, "r", encoding="utf-8")
-    data = file.read()
-    file.close()
-
-    return data
-
+@lru_cache(maxsize=None)
+def get_collection(name="kakao_sync_bot"):
+    # client, collection 은 프로세스당 한번만 열어서 재사용
+    client = chromadb.PersistentClient()
+    return client.get_or_create_collection(name=name)
 
-def generate_format_data(data):
-    # 테이블, json 형태가 좋음
-    splitData = re.split(r'#([ㄱ-ㅣ가-힣\s]+\n)', data.strip())
-    dataset = {}
 
-    subTitle = '제목'  # default 제목
-    for i in range(len(splitData)):
-        data = splitData[i]
-        if "\n\n" not in data:
-            subTitle = data.strip()
-        else:
-            dataset[subTitle] = data.strip()
-    return dataset
+def load_sections(filepath):
+    # txt 파일을 한 줄씩 읽으면서 섹션 단위로 흘려보낸다. (파일 전체를 메모리에 올리지 않음)
+    # 같은 제목이 여러 번 나와도 덮어쓰지 않고 각각 따로 나온다.
+    for section in iter_sections(filepath):
+        if section.section_path == DEFAULT_SECTION and section.text.endswith(":") and "\n" not in section.text:
+            # 파일 첫 줄("카카오싱크:")은 문서 제목이라 넣지 않는다.
+            continue
+        yield section
 
 
-def generate_vector_db(dataset):
-    # TODO 한글이라 잘 안되는 것일까?
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=50)
-    client = chromadb.PersistentClient()
-    collection = client.get_or_create_collection(
-        name="kakao_sync_bot")
+def generate_vector_db(sections):
+    # 표의 행, 목록 항목은 자르지 않고 토큰 예산 단위로 묶는다. (섹션 제목 breadcrumb 포함)
+    chunker = StructureChunker(max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "300")))
+    collection = get_collection()
     ids = []
     documents = []
 
-    for key in dataset:
+    for section in sections:
+        key = section.section_path
         k = key.lower().replace(' ', '-')
-        texts = text_splitter.split_text(dataset[key])
+        texts = chunker.split_text(section.text, key)
         for text_index in range(len(texts)):
-            ids.append(f"{k}_{text_index}")
-            documents.append(f"{texts[text_index].strip().lower()}")
-
-    collection.add(
-        documents=documents,
-        ids=ids,
-    )
+            document = f"{texts[text_index].strip().lower()}"
+            # 내용이 같으면 같은 id (다시 실행해도 중복으로 들어가지 않음)
+            ids.append(f"{k}_{hashlib.sha256(document.encode('utf-8')).hexdigest()[:16]}")
+            documents.append(document)
 
+    sync_collection(collection, ids, documents)
     print("DB 생성 완료")
 
 
+def sync_collection(collection, ids, documents):
+    # 새로 생긴 chunk 만 추가하고 원문에서 사라진 chunk 는 지운다.
+    existing = set(collection.get(include=[])["ids"])
+    new = {}
+    for id, document in zip(ids, documents):
+        if id not in existing:
+            new[id] = document
+    stale = existing - set(ids)
+
+    if stale:
+        collection.delete(ids=list(stale))
+    if new:
+        collection.add(
+            documents=list(new.values()),
+            ids=list(new.keys()),
+        )
+
+
 def read_prompt_template(file_path: str) -> str:
     with open(file_path, "r") as f:
         prompt_template = f.read()
@@ -68,49 +76,38 @@ def read_prompt_template(file_path: str) -> str:
 
 
 def call_db(param):
-    client = chromadb.PersistentClient()
-    collection = client.get_or_create_collection(
-        name="kakao_sync_bot")
+    collection = get_collection()
     searchResult = collection.query(
         query_texts=[param],
-        n_results=3)
+        n_results=3,
+        include=["documents", "distances"])
 
-    return searchResult['documents']
+    # 중복을 뺀 chunk 를 거리 순으로 토큰 예산 안에서만 prompt 에 넣는다.
+    return assemble_context(
+        zip(searchResult['documents'][0], [-distance for distance in searchResult['distances'][0]]),
+        int(os.getenv("CONTEXT_MAX_TOKENS", "500")))
 
 
 def request_gpt_api(prompt: str, gpt_model="gpt-3.5-turbo", max_token: int = 500, temperature=0.1) -> str:
-    response = openai.ChatCompletion.create(
-        model=gpt_model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=max_token,
-        temperature=temperature,
-    )
-    return response.choices[0].message.content
+    return get_llm_client().complete(prompt, model=gpt_model, max_tokens=max_token, temperature=temperature)
 
 
-def generate_sync_bot(param):
-    # ----------------- langchain 방식 -----------------##
-    lim = ChatOpenAI(temperature=0.8, max_tokens=300, model="gpt-3.5-turbo")
-
-    context_chain = create_chain(lim, '../template/kakao_sync_prompt_1.txt', 'context_output')
-    extra_info_chain = create_chain(lim, '../template/kakao_sync_prompt_2.txt', 'extra_output')
-
-    preprocess_chain = SequentialChain(
-        chains=[
-            context_chain,
-            extra_info_chain,
-        ],
-        input_variables=["kakao_sync_data", "command", "extra_link"],
-        output_variables=["context_output", "extra_output"],
-        verbose=True,
-    )
+@lru_cache(maxsize=None)
+def get_extra_link():
+    # 질문과 상관없이 항상 같은 답이라 처음 한번만 호출하고 기억해둔다.
+    return request_gpt_api("카카오 싱크 대표 링크 알려줘")
+
 
+def generate_sync_bot(param):
+    # ----------------- prompt chain 방식 -----------------##
+    # SequentialChain 과 같은 순서로 부르되 호출은 공용 llm client 로 보낸다.
     context = dict(
         kakao_sync_data=call_db(param),
         command=param,
-        extra_link=request_gpt_api("카카오 싱크 대표 링크 알려줘"),
+        extra_link=get_extra_link(),
     )
-    context = preprocess_chain(context)
+    context["context_output"] = run_prompt(get_prompt('../template/kakao_sync_prompt_1.txt'), context)
+    context["extra_output"] = run_prompt(get_prompt('../template/kakao_sync_prompt_2.txt'), context)
     return context["extra_output"]
 
 
@@ -123,22 +120,23 @@ def generate_sync_bot(param):
 # return request_gpt_api(prompt)
 
 
-def create_chain(llm, template_path, output_key):
-    return LLMChain(
-        llm=llm,
-        prompt=ChatPromptTemplate.from_template(
-            template=read_prompt_template(template_path),
-        ),
-        output_key=output_key,
-        verbose=True,
-    )
+@lru_cache(maxsize=None)
+def get_prompt(template_path):
+    return ChatPromptTemplate.from_template(template=read_prompt_template(template_path))
+
+
+def run_prompt(prompt, context, temperature=0.8, max_tokens=300):
+    messages = prompt.format_messages(**{key: context[key] for key in prompt.input_variables})
+    return get_llm_client().chat(
+        [{"role": "user", "content": message.content} for message in messages],
+        temperature=temperature,
+        max_tokens=max_tokens,
+    ).get("content") or ""
 
 
 def main():
     print("프로젝트 2단계")
-    data = load_data("../dataset/project_data_kakao_sync.txt")
-    dataset = generate_format_data(data)
-    generate_vector_db(dataset)
+    generate_vector_db(load_sections("../dataset/project_data_kakao_sync.txt"))
     result = generate_sync_bot("기능은 뭐야?")
     print(result)
 
@@ -0,0 +1,123 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset")
+
+
+def dataset_path(intent: str) -> str:
+    return os.path.join(DATASET_DIR, f"project_data_kakao_{intent}.txt")
+
+
+def dataset_version(intent: str):
+    # 데이터 파일이 다시 들어오면(수정) 버전이 바뀐다.
+    try:
+        stat = os.stat(dataset_path(intent))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SemanticAnswerCache:
+    # (intent, 질문 임베딩) 으로 답변을 저장하고
+    # 코사인 유사도가 threshold 이상인 질문이 오면 저장된 답변을 돌려준다.
+    def __init__(self, threshold=0.95, max_entries=256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = {}
+        self._matrix = {}
+        self._versions = {}
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    def _check_version(self, intent):
+        version = dataset_version(intent)
+        if self._versions.get(intent) != version:
+            if intent in self._entries:
+                self._invalidate(intent)
+            self._versions[intent] = version
+
+    def _invalidate(self, intent):
+        self._entries.pop(intent, None)
+        self._matrix.pop(intent, None)
+        self.invalidations += 1
+
+    def lookup(self, intent: str, vector):
+        with self._lock:
+            self._check_version(intent)
+            entries = self._entries.get(intent)
+            if not entries:
+                self.misses += 1
+                return None
+
+            # 행렬은 (벡터 행렬, 행마다의 key) 로 저장/삭제 때만 다시 만든다.
+            # hit 으로 LRU 순서가 바뀌어도 행과 key 의 대응은 그대로라서 버리지 않는다.
+            cached = self._matrix.get(intent)
+            if cached is None:
+                cached = (np.stack([v for v, _ in entries.values()]), list(entries))
+                self._matrix[intent] = cached
+            matrix, keys = cached
+            scores = matrix @ _normalize(vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key][1]
+
+    def store(self, intent: str, vector, answer: str):
+        with self._lock:
+            self._check_version(intent)
+            entries = self._entries.setdefault(intent, OrderedDict())
+            entries[next(self._keys)] = (_normalize(vector), answer)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix.pop(intent, None)
+
+    def invalidate(self, intent=None):
+        # 데이터 재적재 시 호출 (intent 가 없으면 전체)
+        with self._lock:
+            for name in [intent] if intent else list(self._entries):
+                self._invalidate(name)
+                self._versions.pop(name, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": sum(len(entries) for entries in self._entries.values()),
+        }
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache(
+                    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+                )
+    return _answer_cache
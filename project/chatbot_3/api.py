@@ -1,11 +1,93 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+import time
 from fastapi import FastAPI
-from fastapi import BackgroundTasks
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+import shared_path
 from dto import ChatbotRequest
-from callback import callback_handler
+from callback import BUSY_MESSAGE, callback_handler, close_session, continue_handler, expired_handler, open_session
+from job_queue import get_job_queue
+from retrieval import get_registry
+from chatbot_3 import run_blocking, warm_up
+from streaming import CONTINUE_UTTERANCE, simple_text_payload
+from llm_client import get_llm_client
+from memory import get_memory
+from answer_cache import get_answer_cache
+from precomputed import get_precomputed_answers
+from tracing import REGISTRY, render_metrics
 
 app = FastAPI()
+logger = logging.getLogger("API")
+# warm-up 이 끝나야 ready. (/ready 가 200 을 돌려주기 전까지 load balancer 가 요청을 보내지 않는다.)
+readiness = {"ready": False, "warm_up_s": None, "attempts": 0, "error": None}
+WARM_UP_MAX_BACKOFF = float(os.getenv("WARM_UP_MAX_BACKOFF", "30"))
+_warm_up_task = None
+
+
+@app.on_event("startup")
+async def startup():
+    # 포트는 바로 열고, 무거운 준비는 background 에서 한다.
+    global _warm_up_task
+    await open_session()
+    get_job_queue(callback_handler, on_expired=expired_handler).start()
+    REGISTRY.gauge("chatbot_ready", "warm-up 완료 여부", lambda: int(readiness["ready"]))
+    _warm_up_task = asyncio.create_task(prepare())
+
+
+async def prepare():
+    # langchain / chromadb import, vector db 와 BM25 index, 템플릿과 파이프라인, LLM 연결 pool 을 미리 준비한다.
+    # 꼭 필요한 준비(vector db, index, 파이프라인)는 성공할 때까지 backoff 하며 다시 시도한다. (그동안 /ready 는 503 + error)
+    # LLM 연결 warm-up 은 실패해도 첫 요청이 연결을 맺으면 되므로 ready 로 본다.
+    start = time.perf_counter()
+    delay = 1.0
+    while True:
+        readiness["attempts"] += 1
+        try:
+            await run_blocking(lambda: get_registry().open())
+            await warm_up()
+            break
+        except Exception as e:
+            logger.exception("warm-up 실패, %.0fs 후 다시 시도합니다.", delay)
+            readiness["error"] = repr(e)
+            # 반쯤 열린 vector db / index 는 버리고 다음 시도에서 처음부터 연다.
+            await run_blocking(get_registry().close)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_UP_MAX_BACKOFF)
+    try:
+        await get_llm_client().warm_up()
+    except Exception:
+        logger.warning("LLM 연결 warm-up 실패", exc_info=True)
+    register_metrics()
+    readiness["error"] = None
+    readiness["warm_up_s"] = round(time.perf_counter() - start, 3)
+    readiness["ready"] = True
+    logger.info("warm-up 완료 (%.2fs)", readiness["warm_up_s"])
+
+
+def register_metrics():
+    # 캐시 / 큐 / LLM 클라이언트 상태는 /metrics 를 읽을 때 값을 가져온다.
+    job_queue = get_job_queue()
+    embedding = get_registry().embedding
+    REGISTRY.gauge("chatbot_job_queue_depth", "작업 큐에서 기다리는 요청 수", lambda: job_queue.depth)
+    REGISTRY.gauge("chatbot_job_queue_running", "처리 중인 요청 수", lambda: job_queue.running)
+    REGISTRY.gauge("chatbot_job_queue_requests", "작업 큐 요청 수 (결과별 누적)", lambda: job_queue.counts)
+    REGISTRY.gauge("chatbot_answer_cache", "semantic 답변 캐시 상태", lambda: get_answer_cache().stats())
+    REGISTRY.gauge("chatbot_precomputed_answers", "미리 만든 답변 조회 상태", lambda: get_precomputed_answers().stats())
+    if hasattr(embedding, "stats"):
+        REGISTRY.gauge("chatbot_embedding_cache", "질문 임베딩 캐시 상태", embedding.stats)
+    REGISTRY.gauge("chatbot_llm_client", "LLM 클라이언트 요청 / 재시도 / 합치기 / 대기 시간", lambda: get_llm_client().stats)
+    REGISTRY.gauge("chatbot_memory", "대화 memory 상태", lambda: get_memory().stats())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _warm_up_task is not None and not _warm_up_task.done():
+        _warm_up_task.cancel()
+    await get_job_queue().stop()
+    await close_session()
+    await get_llm_client().aclose()
 
 
 @app.get("/")
@@ -22,9 +104,16 @@ async def home():
 
 # callback.py 로 연결
 @app.post("/callback")
-async def skill(req: ChatbotRequest, background_tasks: BackgroundTasks):
-    # 핸들러 호출 / background_tasks 변경가능
-    background_tasks.add_task(callback_handler, req)
+async def skill(req: ChatbotRequest):
+    # 앞서 보낸 답변의 "이어서 보기" 면 callback 없이 바로 답한다.
+    if req.userRequest.utterance.strip() == CONTINUE_UTTERANCE:
+        out = await continue_handler(req)
+        if out is not None:
+            return out
+    # 작업 큐에 넣고 worker 가 callback_handler 를 실행한다.
+    # 큐가 가득 차면 callback 약속 대신 바로 대체 답변을 돌려준다.
+    if not get_job_queue().submit(req.userRequest.user.id, req):
+        return simple_text_payload(BUSY_MESSAGE, has_more=False)
     out = {
         "version": "2.0",
         "useCallback": True,
@@ -33,3 +122,22 @@ async def skill(req: ChatbotRequest, background_tasks: BackgroundTasks):
         }
     }
     return out
+
+
+@app.get("/ready")
+async def ready():
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics(format: str = "prometheus"):
+    # 기본은 Prometheus text 형식, ?format=json 이면 요약 JSON
+    if format == "json":
+        return {
+            "job_queue": get_job_queue().metrics(),
+            "llm_client": get_llm_client().stats,
+            "memory": get_memory().stats(),
+            "answer_cache": get_answer_cache().stats(),
+            "precomputed_answers": get_precomputed_answers().stats(),
+        }
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
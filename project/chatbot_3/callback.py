@@ -1,55 +1,112 @@
 from dto import ChatbotRequest
 import aiohttp
-import time
+import asyncio
 import logging
-import openai
 import os
-import requests
-from chatbot_2 import generate_sync_bot
+from chatbot_3 import generate_answer_async
+from streaming import SIMPLE_TEXT_MAX_LENGTH, AnswerStream, get_continuations, simple_text_payload
+from tracing import span
 
 # 환경 변수 처리 필요!
-openai.api_key = os.environ['API_KEY']
-SYSTEM_MSG = "당신은 카카오 서비스 제공자입니다."
 logger = logging.getLogger("Callback")
+# 첫 callback 은 이 길이 이상 쌓인 뒤 문장이 끝나면 보낸다. (callbackUrl 유효시간 1분 안에)
+CALLBACK_MIN_CHARS = int(os.getenv("CALLBACK_MIN_CHARS", "80"))
+CALLBACK_DEADLINE = float(os.getenv("CALLBACK_DEADLINE", "50"))
+# 스킬 응답은 5초 안에 해야 한다.
+CONTINUE_WAIT = float(os.getenv("CONTINUE_WAIT", "4"))
+BUSY_MESSAGE = "지금 질문이 많아서 바로 답하기 어려워요😢 잠시 후에 다시 질문해 주세요."
+PENDING_MESSAGE = "답변을 준비 중입니다… 잠시 후 '이어서 보기' 를 눌러주세요."
+EMPTY_ANSWER_MESSAGE = "답변을 만들지 못했어요. 질문을 조금 바꿔서 다시 물어봐 주세요."
+ERROR_MESSAGE = "답변을 만드는 중에 문제가 생겼어요. 다시 질문해 주세요."
 
+# callback 전송용 세션은 서버 시작 시 한번 만들어서 공유한다.
+_session = None
 
-def callback_handler(request: ChatbotRequest) -> dict:
+
+async def open_session():
+    global _session
+    if _session is None:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=int(os.getenv("CALLBACK_CONNECTIONS", "100")), ssl=False),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def callback_handler(request: ChatbotRequest) -> dict:
     # ===================== start =================================
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": SYSTEM_MSG},
-            {"role": "user", "content": request.userRequest.utterance},
-        ],
-        temperature=0,
-    )
     # focus
-    output_text = generate_sync_bot(request.userRequest.utterance)
-    print(output_text)
+    # 답변을 스트리밍으로 받다가 앞부분이 문장 단위로 준비되면 바로 callback 을 보낸다.
+    # callbackUrl 은 한번만 쓸 수 있어서 나머지는 "이어서 보기" 로 받아가도록 보관한다.
+    answer_stream = AnswerStream()
+    task = asyncio.ensure_future(generate_answer_async(
+        request.userRequest.utterance, answer_stream=answer_stream, user_id=request.userRequest.user.id))
+    try:
+        output_text, complete = await answer_stream.next_part(min_chars=CALLBACK_MIN_CHARS, timeout=CALLBACK_DEADLINE)
+    except Exception:
+        # 스킬 응답에서 useCallback 으로 기다리게 했으므로 실패해도 callback 은 보낸다.
+        # (보내지 않으면 callbackUrl 이 만료될 때까지 "생각하고 있는 중" 으로 남는다)
+        try:
+            await post_callback(request, simple_text_payload(ERROR_MESSAGE, has_more=False))
+        except Exception:
+            logger.exception("실패 안내 callback 전송 실패")
+        await task
+        raise
+    if not complete:
+        get_continuations().put(request.userRequest.user.id, answer_stream, len(output_text))
+    logger.debug("callback 답변 %d자 (complete=%s)", len(output_text), complete)
 
+    # 빈 simpleText 는 카카오가 거절한다. 마감까지 생성된 글자가 없으면 안내 문구를 보내고
+    # 답변은 "이어서 보기" 로 처음부터 받아가게 한다. (보관한 offset 은 0)
+    if not output_text:
+        output_text = EMPTY_ANSWER_MESSAGE if complete else PENDING_MESSAGE
     # 참고링크 통해 payload 구조 확인 가능
-    payload = {
-        "version": "2.0",
-        "template": {
-            "outputs": [
-                {
-                    "simpleText": {
-                        "text": output_text
-                    }
-                }
-            ]
-        }
-    }
+    payload = simple_text_payload(output_text, has_more=not complete)
     # ===================== end =================================
     # 참고링크1 : https://kakaobusiness.gitbook.io/main/tool/chatbot/skill_guide/ai_chatbot_callback_guide
     # 참고링크1 : https://kakaobusiness.gitbook.io/main/tool/chatbot/skill_guide/answer_json_format
 
-    time.sleep(0.1)
+    await asyncio.sleep(0.1)
+
+    await post_callback(request, payload)
+    await task
 
+
+async def post_callback(request: ChatbotRequest, payload: dict):
     url = request.userRequest.callbackUrl
 
     if url:
-        # async with aiohttp.ClientSession() as session:
-        #     async with session.post(url=url, json=payload, ssl=False) as resp:
-        #         await resp.json()
-        requests.post(url, json=payload)
+        session = await open_session()
+        with span("callback_post"):
+            async with session.post(url=url, json=payload) as resp:
+                await resp.read()
+
+
+async def expired_handler(request: ChatbotRequest):
+    # 큐에서 너무 오래 기다린 요청은 답변을 만들지 않고 callback 으로 양해를 구한다.
+    await post_callback(request, simple_text_payload(BUSY_MESSAGE, has_more=False))
+
+
+async def continue_handler(request: ChatbotRequest):
+    # "이어서 보기" 요청이면 보관해둔 나머지를 스킬 응답으로 바로 돌려준다. 없으면 None
+    continuation = get_continuations().pop(request.userRequest.user.id)
+    if continuation is None:
+        return None
+    answer_stream, offset = continuation
+    try:
+        # 스킬 응답 제한 시간 안에 아직 생성 중인 부분은 된 만큼만 보낸다.
+        text, complete = await answer_stream.next_part(
+            offset, min_chars=SIMPLE_TEXT_MAX_LENGTH, timeout=CONTINUE_WAIT)
+    except Exception:
+        logger.exception("이어서 보기 실패")
+        return simple_text_payload(ERROR_MESSAGE, has_more=False)
+    if not complete:
+        get_continuations().put(request.userRequest.user.id, answer_stream, offset + len(text))
+    return simple_text_payload(text or "아직 답변을 만들고 있어요. 잠시 후 다시 눌러주세요.", has_more=not complete)
@@ -1,71 +1,99 @@
-import openai
+import asyncio
+import contextvars
+import logging
 import os
 import re
-from langchain.chat_models import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts.chat import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.tools import Tool
-from langchain.utilities import GoogleSearchAPIWrapper
-
-openai.api_key = os.environ['API_KEY']
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+import shared_path
+from retrieval import CHROMA_PERSIST_DIR, RETRIEVAL_MODE, get_registry
+from answer_cache import get_answer_cache
+from pipeline import PipelinePlan, Stage
+from runtime import BotRuntime
+from intent_classifier import create_intent_classifier
+from section_parser import DEFAULT_SECTION, iter_dataset_sections
+from chunker import StructureChunker
+from context_builder import assemble_context
+from llm_client import get_llm_client, run_sync
+from memory import get_memory
+from precomputed import get_precomputed_answers
+from ingest import chunk_id
+from tracing import annotate, span
+
+os.environ["API_KEY"]
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["GOOGLE_API_KEY"]
 os.environ["GOOGLE_CSE_ID"]
 
-
-def load_data(filepath):
-    # txt 파일을 읽어서 데이터를 생성한다.
-    file = open(filepath, "r", encoding="utf-8")
-    data = file.read()
-    file.close()
-
-    return data
-
-
-def generate_format_data(data):
-    # 테이블, json 형태가 좋음
-    splitData = re.split(r'#([ㄱ-ㅣ가-힣\s]+\n)', data.strip())
-    dataset = {}
-
-    subTitle = '제목'  # default 제목
-    for i in range(len(splitData)):
-        data = splitData[i]
-        if "\n\n" not in data:
-            subTitle = data.strip()
-        else:
-            dataset[subTitle] = data.strip()
-    return dataset
+logger = logging.getLogger("Chatbot")
+BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("BLOCKING_WORKERS", "8")))
+# 정규화된 임베딩 기준 squared L2 거리 (0.4 = 코사인 유사도 0.8)
+LOCAL_MATCH_DISTANCE = float(os.getenv("LOCAL_MATCH_DISTANCE", "0.4"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+# 검색 후보 수와 prompt 에 넣을 참고 문서 토큰 예산
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "6"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "500"))
+# Google Custom Search JSON API (벤치마크에서는 로컬 fake 서버 주소로 바꾼다)
+GOOGLE_CSE_ENDPOINT = os.getenv("GOOGLE_CSE_ENDPOINT", "https://www.googleapis.com/customsearch/v1")
+SEARCH_RESULTS_K = int(os.getenv("SEARCH_RESULTS_K", "10"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+# 이전 대화에 기대는 질문: 지시어, 이어서 묻기, 아주 짧은 되묻기 ("얼마야?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"(?<![가-힣])(그것|그거|그건|그게|그걸|이것|이거|이건|이게|이걸|저것|저거|저건|거기|그럼|그러면|그렇다면"
+    r"|아까|방금|위에서|앞에서|그중|그 중|둘 다|나머지|다른 건|다른 거|더 자세히|계속)"
+)
+FOLLOW_UP_MAX_CHARS = int(os.getenv("FOLLOW_UP_MAX_CHARS", "6"))
+# 대화 요약(LLM 호출)은 답변 경로와 스레드를 나눠 쓰지 않도록 따로 돌린다.
+MEMORY_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("MEMORY_WORKERS", "1")))
+
+
+def iter_dataset_documents(dir_path="../dataset/"):
+    # 섹션 parser -> chunker 로 이어지는 generator. 파일 전체를 메모리에 올리지 않는다.
+    # (category, section, source metadata 포함)
+    from langchain.schema import Document
+
+    chunker = StructureChunker(max_tokens=CHUNK_MAX_TOKENS)
+
+    source = None
+    title = None
+    for section in iter_dataset_sections(dir_path):
+        category = section.file.split(".txt")[0].split("_")[3]
+        if section.file != source:
+            source = section.file
+            title = None
+            logger.info("DB 생성 중... %s", category)
+        if section.section_path == DEFAULT_SECTION and section.text.endswith(":") and "\n" not in section.text:
+            # 파일 첫 줄("카카오싱크:")은 문서 제목으로 breadcrumb 에만 쓴다.
+            title = section.text.rstrip(":").strip()
+            continue
+        breadcrumb = f"{title} > {section.section_path}" if title else section.section_path
+        metadata = {"category": category, "section": section.section_path, "source": section.file}
+        for text in chunker.split_text(section.text, breadcrumb):
+            yield Document(page_content=text, metadata=metadata)
 
 
 def generate_vector_db():
-    dir_path = "../dataset/"
-    datasets = {}
-    persist_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma")
-    embedding = OpenAIEmbeddings()
-    _db = None
-
-    for file in os.listdir(dir_path):
-        if file.endswith(".txt"):
-            category = file.split(".txt")[0].split("_")[3]
-            data = load_data(os.path.join(dir_path, file))
-            datasets[category] = generate_format_data(data)
+    # 모든 카테고리를 하나의 collection 에 넣는다.
+    # 바뀐 chunk 만 batch 로 묶어서 동시에 임베딩한다. (다시 실행해도 중복되지 않음)
+    from ingest import ingest_documents
 
-    for category in datasets:
-        print(f"DB 생성 중... {category}")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0)
-
-        for key in datasets[category]:
-            pages = text_splitter.split_text(datasets[category][key])
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=10)
-            texts = text_splitter.create_documents(pages)
-
-        _db = Chroma.from_documents(texts, embedding, collection_name=category,
-                                    persist_directory=persist_directory)
-    _db.persist()
-    print("DB 생성 완료")
+    result = ingest_documents(
+        iter_dataset_documents(),
+        persist_directory=CHROMA_PERSIST_DIR,
+        batch_size=int(os.getenv("INGEST_BATCH_SIZE", "64")),
+        max_workers=int(os.getenv("INGEST_WORKERS", "4")),
+    )
+    logger.info("추가 %s / 삭제 %s / 유지 %s", result["added"], result["removed"], result["unchanged"])
+    logger.info("%s chunks/sec, 최대 메모리 %s MB", result["chunks_per_sec"], result["peak_memory_mb"])
+    # 데이터가 바뀐 intent 의 캐시된 답변은 버리고 registry 는 통합 index 를 다시 확인한다.
+    for category in result["categories"]:
+        get_answer_cache().invalidate(category)
+    get_registry().close()
+    # 데이터 버전이 바뀌었으면 미리 만든 답변도 더 이상 쓰지 않는다.
+    get_precomputed_answers().load()
+    logger.info("DB 생성 완료")
 
 
 def read_prompt_template(file_path: str) -> str:
@@ -78,7 +106,10 @@ def read_intent_list(file_path: str) -> dict:
     data = ""
     with open(file_path, "r") as f:
         data = f.read()
+    return parse_intent_list(data)
+
 
+def parse_intent_list(data: str) -> dict:
     intent_dict = {}
     for line in data.strip().split("\n"):
         kv = line.strip().split(":")
@@ -88,118 +119,398 @@ def read_intent_list(file_path: str) -> dict:
     return intent_dict
 
 
-def call_db(intent, param):
-    DATA_DIR = os.path.dirname(os.path.abspath('./chroma'))
-    CHROMA_PERSIST_DIR = os.path.join(DATA_DIR, "chroma")
-    CHROMA_COLLECTION_NAME = intent
-    _db = Chroma(
-        persist_directory=CHROMA_PERSIST_DIR,
-        embedding_function=OpenAIEmbeddings(),
-        collection_name=CHROMA_COLLECTION_NAME,
-    )
+def call_db(intent, param, k=RETRIEVAL_K):
+    # collection 은 registry 에서 한번만 열어두고 재사용
+    # BM25 + vector 를 합친 결과 (RETRIEVAL_MODE 로 변경 가능), (chunk, 점수) 목록
+    docs = get_registry().hybrid_search(param, category=intent, k=k)
+    annotate("retrieved_chunks", [chunk_id(doc.metadata or {}, doc.page_content) for doc, _ in docs])
+    return [(doc.page_content, score) for doc, score in docs]
+
+
+def search_local_documents(param, max_distance=LOCAL_MATCH_DISTANCE):
+    # 인텐트를 모를 때 전체 카테고리에서 충분히 가까운 chunk 만 가져온다.
+    # 거리 기준이 vector 라서 lexical 모드이거나 임베딩이 실패하면 찾지 않은 것으로 본다.
+    vector = embed_query_or_none(param)
+    if vector is None:
+        return []
+    docs = [(doc, distance) for doc, distance in get_registry().search_by_vector(vector, k=RETRIEVAL_K)
+            if distance <= max_distance]
+    annotate("retrieved_chunks", [chunk_id(doc.metadata or {}, doc.page_content) for doc, _ in docs])
+    return [(doc.page_content, -distance) for doc, distance in docs]
+
+
+def embed_query_or_none(param):
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    try:
+        with span("embedding"):
+            return get_registry().embedding.embed_query(param)
+    except Exception:
+        logger.exception("질문 임베딩 실패")
+        return None
+
+
+async def run_blocking(func, *args):
+    # 동기 함수(vector db 조회, 임베딩, google 검색)는 제한된 스레드풀에서 실행
+    # (요청 trace 가 스레드 안의 span 에도 이어지도록 context 를 복사해서 넘긴다)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BLOCKING_EXECUTOR, contextvars.copy_context().run, func, *args)
+
+
+async def request_gpt_api(prompt: str, gpt_model="gpt-3.5-turbo", max_token: int = 500, temperature=0.1,
+                          call="request_gpt_api") -> str:
+    # 모든 LLM 호출은 공용 클라이언트(연결 재사용, 분당 한도, 재시도, 동일 요청 합치기)를 거친다.
+    messages = [{"role": "user", "content": prompt}]
+    return await chat_completion(messages, call, model=gpt_model, max_tokens=max_token, temperature=temperature)
+
+
+async def chat_completion(messages, call, **params) -> str:
+    with span("llm", call=call) as llm_span:
+        message = await get_llm_client().achat(messages, **params)
+        content = message.get("content") or ""
+        llm_span.add_tokens(messages, content)
+    return content
+
+
+async def stream_completion(messages, answer_stream=None, gpt_model="gpt-3.5-turbo", max_tokens: int = 300,
+                            temperature=0.1, call="stream_completion") -> str:
+    # 토큰이 도착하는 대로 answer_stream 에 이어 붙이고, 전체 답변을 돌려준다.
+    parts = []
+    with span("llm", call=call) as llm_span:
+        async for delta in get_llm_client().astream(messages, model=gpt_model, max_tokens=max_tokens,
+                                                    temperature=temperature):
+            parts.append(delta)
+            if answer_stream is not None:
+                answer_stream.feed(delta)
+        answer = "".join(parts)
+        llm_span.add_tokens(messages, answer)
+    return answer
 
-    docs = _db.similarity_search(param)
-    str_docs = [doc.page_content for doc in docs]
-    return str_docs
 
+@lru_cache(maxsize=None)
+def get_search_session() -> requests.Session:
+    # 검색 요청마다 연결을 새로 맺지 않도록 세션을 재사용한다.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=BLOCKING_EXECUTOR._max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-def request_gpt_api(prompt: str, gpt_model="gpt-3.5-turbo", max_token: int = 500, temperature=0.1) -> str:
-    response = openai.ChatCompletion.create(
-        model=gpt_model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=max_token,
-        temperature=temperature,
-    )
-    return response.choices[0].message.content
 
+def search_google(query: str) -> str:
+    # GoogleSearchAPIWrapper.run 과 같은 결과(검색 결과 snippet 을 이어 붙인 문자열)
+    # discovery 문서를 받아 client 를 만드는 과정 없이 JSON API 를 바로 호출한다.
+    response = get_search_session().get(GOOGLE_CSE_ENDPOINT, params={
+        "key": os.getenv("GOOGLE_API_KEY"),
+        "cx": os.getenv("GOOGLE_CSE_ID"),
+        "q": query,
+        "num": SEARCH_RESULTS_K,
+    }, timeout=SEARCH_TIMEOUT)
+    response.raise_for_status()
+    snippets = [item["snippet"] for item in response.json().get("items", []) if "snippet" in item]
+    if not snippets:
+        return "No good Google Search Result was found"
+    return " ".join(snippets)
 
-def query_web_search(user_message: str) -> str:
-    llm = ChatOpenAI(temperature=0.1, max_tokens=200, model="gpt-3.5-turbo")
-    SEARCH_VALUE_CHECK_PROMPT_TEMPLATE = os.path.join("../template/search_value_check.txt")
-    SEARCH_COMPRESSION_PROMPT_TEMPLATE = os.path.join("../template/search_compress.txt")
 
-    search = GoogleSearchAPIWrapper(
-        google_api_key=os.getenv("GOOGLE_API_KEY"),
-        google_cse_id=os.getenv("GOOGLE_CSE_ID")
-    )
+async def google_search(user_message: str) -> str:
+    return await run_blocking(search_google, user_message)
 
-    search_tool = Tool(
-        name="Google Search",
-        description="Search Google for recent results.",
-        func=search.run,
-    )
 
-    context = {"user_message": user_message}
-    context["related_web_search_results"] = search_tool.run(user_message)
+def is_valuable(has_value: str) -> bool:
+    return has_value.strip() == "Y"
 
-    search_value_check_chain = create_chain(llm, SEARCH_VALUE_CHECK_PROMPT_TEMPLATE, "output")
-    search_compression_chain = create_chain(llm, SEARCH_COMPRESSION_PROMPT_TEMPLATE, "output")
 
-    has_value = search_value_check_chain.run(context)
+INTENT_PROMPT_TEMPLATE = "parse_intent.txt"
+BOT_PROMPT_TEMPLATE = "bot_prompt_1.txt"
+DEFAULT_PROMPT_TEMPLATE = "default_response.txt"
+INTENT_LIST_TXT = "intent_list.txt"
+SEARCH_VALUE_CHECK_PROMPT_TEMPLATE = "search_value_check.txt"
+SEARCH_COMPRESSION_PROMPT_TEMPLATE = "search_compress.txt"
+SUMMARY_PROMPT_TEMPLATE = "summarize_history.txt"
 
-    print(has_value)
-    if has_value == "Y":
-        return search_compression_chain.run(context)
-    else:
-        return ""
 
+def chat_prompt(template):
+    # langchain 은 import 만 몇 초 걸려서 runtime 을 처음 만들 때(warm-up) 불러온다.
+    from langchain.prompts.chat import ChatPromptTemplate
 
-def generate_answer(param):
-    INTENT_PROMPT_TEMPLATE = os.path.join("../template/parse_intent.txt")
-    BOT_PROMPT_TEMPLATE = os.path.join("../template/bot_prompt_1.txt")
-    DEFAULT_PROMPT_TEMPLATE = os.path.join("../template/bot_prompt_1.txt")
-    INTENT_LIST_TXT = os.path.join("../template/intent_list.txt")
+    return ChatPromptTemplate.from_template(template=template)
 
-    # ----------------- langchain 방식 -----------------##
-    llm = ChatOpenAI(temperature=0.1, max_tokens=300, model="gpt-3.5-turbo")
 
-    # TODO
-    # 인텐트 생성
-    # memory 구성
-    # web search 붙여보기(default)
+def prompt_messages(prompt, inputs):
+    return [{"role": "user", "content": message.content} for message in prompt.format_messages(**inputs)]
 
-    # 인텐트 맞는 템플릿으로 연결되게 함
-    parse_intent_chain = create_chain(llm, INTENT_PROMPT_TEMPLATE, "intent")
-    bot_prompt_chain = create_chain(llm, BOT_PROMPT_TEMPLATE, 'bot_output')
-    # extra_info_chain = create_chain(llm, '../template/kakao_sync_prompt_2.txt', 'extra_output')
-    default_chain = create_chain(llm, DEFAULT_PROMPT_TEMPLATE, "output")
-    context = dict(user_message=param)
-    context["intent_list"] = read_prompt_template(INTENT_LIST_TXT)
-    intent = parse_intent_chain.run(context)
+
+def prompt_stage(name, template, output, max_tokens=300, **kwargs):
+    # 템플릿에 들어가는 변수가 곧 stage 의 inputs 가 된다.
+    prompt = chat_prompt(template)
+
+    async def run(**inputs):
+        return await chat_completion(prompt_messages(prompt, inputs), name, max_tokens=max_tokens, temperature=0.1)
+
+    return Stage(name, run, inputs=list(prompt.input_variables), output=output, **kwargs)
+
+
+def parse_intent(raw_intent):
+    intent = raw_intent.strip()
     if intent != 'None' and ":" in intent:
         intent = intent.split(":")[0]
-    intent_list = read_intent_list(INTENT_LIST_TXT)
-    context["intent_desc"] = intent_list[intent]
-    # return intent
+    return intent
 
-    if intent != 'None':
-        context["related_documents"] = call_db(intent, context["user_message"])
-        answer = ""
-        for step in [bot_prompt_chain]:
-            context = step(context)
-            answer += context[step.output_key]
-            answer += "\n\n"
-    else:
-        context["related_documents"] = request_gpt_api(context["user_message"])
-        context["compressed_web_search_results"] = query_web_search(context["user_message"])
-        answer = default_chain.run(context)
+
+async def classify_intent(classifier, user_message):
+    if RETRIEVAL_MODE == "lexical":
+        # 임베딩을 쓰지 않는 모드: 분류기(질문 임베딩) 없이 바로 LLM 으로 인텐트를 판단한다.
+        return None, 0.0, False
+    try:
+        return await run_blocking(classifier.classify, user_message)
+    except Exception:
+        # 임베딩 실패 시 LLM 으로 인텐트를 판단한다.
+        logger.exception("인텐트 분류 실패")
+        return None, 0.0, False
+
+
+def needs_llm_intent(classified) -> bool:
+    return not classified[2]
+
+
+def resolve_intent(classified, raw_intent, intent_table):
+    if raw_intent is None:
+        return classified[0]
+    intent = parse_intent(raw_intent)
+    # 목록에 없는 답이 오면 web 검색으로 보낸다.
+    return intent if intent in intent_table else 'None'
+
+
+async def search_db(intent, user_message):
+    return await run_blocking(call_db, intent, user_message)
+
+
+def stream_stage(name, template, output, max_tokens=300, **kwargs):
+    # 답변 생성 단계. 요청에 answer_stream 이 있으면 생성 중인 토큰을 바로 넘겨준다.
+    prompt = chat_prompt(template)
+
+    async def generate(answer_stream=None, **inputs):
+        return await stream_completion(prompt_messages(prompt, inputs), answer_stream, max_tokens=max_tokens,
+                                       call=name)
+
+    return Stage(name, generate, inputs=list(prompt.input_variables) + ["answer_stream"], output=output, **kwargs)
+
+
+def build_context(retrieved_documents):
+    # 중복을 빼고 점수 순으로 토큰 예산 안에서만 prompt 에 넣는다.
+    return assemble_context(retrieved_documents, CONTEXT_MAX_TOKENS)
+
+
+async def fallback_documents(user_message, local_documents):
+    # 로컬 지식에서 찾은 게 있으면 그걸 쓰고, 없을 때만 gpt 에게 물어본다.
+    if local_documents:
+        return build_context(retrieved_documents=local_documents)
+    return await request_gpt_api(user_message, call="gpt_answer")
+
+
+def build_intent_classifier(intent_table: dict, previous=None):
+    if previous is not None and previous["intent_table"] == intent_table:
+        # 인텐트 목록이 그대로면 이미 학습한 분류기(중심 벡터)를 그대로 쓴다.
+        return previous["intent_classifier"]
+    intent_classifier = create_intent_classifier(intent_table, get_registry())
+    if previous is not None and RETRIEVAL_MODE != "lexical":
+        # reload: 교체 전에 학습해서 첫 요청이 학습을 기다리지 않게 한다. (처음 load 는 warm_up 에서 학습)
+        try:
+            intent_classifier.fit()
+        except Exception:
+            logger.warning("인텐트 분류기 학습 실패, 요청 처리 중에 다시 시도합니다.", exc_info=True)
+    return intent_classifier
+
+
+def build_runtime(templates: dict, previous=None) -> dict:
+    # 템플릿이 바뀔 때만 호출된다. (요청마다 chain 을 새로 만들지 않음)
+    intent_list = templates[INTENT_LIST_TXT]
+    intent_table = parse_intent_list(intent_list)
+    intent_classifier = build_intent_classifier(intent_table, previous)
+
+    # 인텐트 맞는 템플릿으로 연결되게 함
+    # 임베딩 분류기가 확신하지 못할 때만 LLM 으로 인텐트를 판단한다.
+    intent_plan = PipelinePlan("intent", [
+        Stage("intent_list", lambda: intent_list, constant=True),
+        Stage("intent_table", lambda: intent_table, constant=True),
+        Stage("classified", lambda user_message: classify_intent(intent_classifier, user_message),
+              inputs=["user_message"]),
+        prompt_stage("parse_intent", templates[INTENT_PROMPT_TEMPLATE], "raw_intent",
+                     when=("classified", needs_llm_intent), default=None, speculative=False),
+        Stage("intent", resolve_intent, inputs=["classified", "raw_intent", "intent_table"]),
+        Stage("intent_desc", lambda intent, intent_table: intent_table.get(intent, ""),
+              inputs=["intent", "intent_table"]),
+    ], outputs=["intent", "intent_desc"])
+
+    document_plan = PipelinePlan("document", [
+        Stage("retrieval", search_db, inputs=["intent", "user_message"], output="retrieved_documents"),
+        Stage("context_assembly", build_context, inputs=["retrieved_documents"], output="related_documents"),
+        stream_stage("generation", templates[BOT_PROMPT_TEMPLATE], "bot_output"),
+    ], outputs=["bot_output"])
+
+    # 로컬 문서 검색(없으면 gpt 답변)과 web 검색은 서로 독립이라 동시에 실행되고,
+    # 검색 결과 요약은 Y/N 판단을 기다리지 않고 미리 시작했다가 N 이면 취소한다.
+    web_plan = PipelinePlan("web", [
+        Stage("local_search", lambda user_message: run_blocking(search_local_documents, user_message),
+              inputs=["user_message"], output="local_documents"),
+        Stage("gpt_answer", fallback_documents, inputs=["user_message", "local_documents"],
+              output="related_documents"),
+        Stage("command", lambda user_message: user_message, inputs=["user_message"]),
+        Stage("web_search", google_search, inputs=["user_message"], output="related_web_search_results"),
+        prompt_stage("search_value_check", templates[SEARCH_VALUE_CHECK_PROMPT_TEMPLATE], "has_value",
+                     max_tokens=200),
+        prompt_stage("search_compression", templates[SEARCH_COMPRESSION_PROMPT_TEMPLATE],
+                     "compressed_web_search_results", max_tokens=200,
+                     when=("has_value", is_valuable), default=""),
+        stream_stage("generation", templates[DEFAULT_PROMPT_TEMPLATE], "output"),
+    ], outputs=["output"])
+
+    return {
+        "intent_table": intent_table,
+        "intent_classifier": intent_classifier,
+        "plans": {"intent": intent_plan, "document": document_plan, "web": web_plan},
+        "summary_prompt": chat_prompt(templates[SUMMARY_PROMPT_TEMPLATE]),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_runtime() -> BotRuntime:
+    return BotRuntime(build_runtime)
+
+
+async def warm_up():
+    # 서버 시작 시 호출: 템플릿, 파이프라인을 미리 만들고(langchain import 포함) 템플릿 변경을 감시한다.
+    runtime = get_runtime()
+    snapshot = runtime.current()
+    for plan in snapshot["plans"].values():
+        await plan.warm_up()
+    # 아래는 실패해도 요청은 처리할 수 있다. (분류기는 첫 요청에서 다시 학습하거나 LLM 으로 인텐트 판단)
+    prepare = [("미리 만든 답변", get_precomputed_answers)]
+    if RETRIEVAL_MODE != "lexical":
+        prepare.append(("인텐트 분류기", snapshot["intent_classifier"].fit))
+    for name, func in prepare:
+        try:
+            await run_blocking(func)
+        except Exception:
+            logger.warning("%s 준비 실패, 요청 처리 중에 다시 시도합니다.", name, exc_info=True)
+    get_memory(summarize_history)
+    get_search_session()
+    runtime.start_watching()
+
+
+def summarize_history(summary, history) -> str:
+    # 대화가 길어지면 memory 가 오래된 턴을 요약할 때 부른다. (답변을 보낸 뒤, MEMORY_EXECUTOR 에서)
+    prompt = get_runtime().current()["summary_prompt"]
+    messages = prompt_messages(prompt, {"summary": summary, "history": history})
+    with span("llm", call="summarize_history") as llm_span:
+        content = get_llm_client().chat(messages, max_tokens=200, temperature=0.1).get("content") or ""
+        llm_span.add_tokens(messages, content)
+    return content
+
+
+def generate_answer(param, user_id=None):
+    return run_sync(generate_answer_async(param, user_id=user_id))
+
+
+async def generate_answer_async(param, answer_stream=None, user_id=None):
+    # answer_stream 을 넘기면 생성되는 답변을 토큰 단위로 받아볼 수 있다. (callback 조기 전송)
+    # user_id 가 있으면 그 사용자의 이전 대화를 prompt 에 넣고, 답변 후 이번 대화를 기록한다.
+    memory = get_memory(summarize_history)
+    chat_history = await run_blocking(memory.render, user_id) if user_id else ""
+    try:
+        answer = await _generate_answer(param, answer_stream, chat_history)
+    except BaseException as e:
+        # 취소(서버 종료 등)도 stream 에 알려서 callback 이 deadline 까지 기다리지 않게 한다.
+        # (CancelledError 를 그대로 넘기면 기다리던 callback task 가 취소된 것처럼 보이므로 바꿔서 넘긴다)
+        if answer_stream is not None:
+            answer_stream.fail(e if isinstance(e, Exception) else RuntimeError("답변 생성이 취소되었습니다."))
+        raise
+    if answer_stream is not None:
+        answer_stream.finish(answer)
+    if user_id:
+        await run_blocking(memory.record, user_id, param, answer, False)
+        compact_memory_later(memory, user_id)
     return answer
 
 
-def create_chain(llm, template_path, output_key):
-    return LLMChain(
-        llm=llm,
-        prompt=ChatPromptTemplate.from_template(
-            template=read_prompt_template(template_path),
-        ),
-        output_key=output_key,
-        verbose=True,
-    )
+def compact_memory_later(memory, user_id):
+    # 요약은 기다리지 않는다. (job queue worker 를 잡고 있지 않도록)
+    # 끝나기 전에 같은 사용자가 다시 물으면 요약 전 대화가 그대로 prompt 에 들어간다.
+    # 요청 trace 가 끝난 뒤에 돌 수 있으므로 context 는 넘기지 않는다.
+    def done(future):
+        if future.exception() is not None:
+            logger.error("대화 요약 실패", exc_info=future.exception())
+
+    MEMORY_EXECUTOR.submit(memory.compact, user_id).add_done_callback(done)
+
+
+def depends_on_history(param) -> bool:
+    text = param.strip()
+    return len(re.sub(r"\W", "", text)) <= FOLLOW_UP_MAX_CHARS or FOLLOW_UP_PATTERN.search(text) is not None
+
+
+async def _generate_answer(param, answer_stream, chat_history=""):
+    result = await run_pipeline(param, answer_stream, chat_history)
+    return result["answer"]
+
+
+async def lookup_precomputed(param):
+    # 배치로 미리 만든 답변: 같은 질문(key)이 있거나 질문 벡터가 충분히 가까우면 LLM 없이 바로 답한다.
+    precomputed = get_precomputed_answers()
+    if not len(precomputed):
+        return None
+    with span("precomputed_lookup"):
+        hit = precomputed.get(param)
+        if hit is None and precomputed.has_vectors:
+            # 인텐트 분류에서도 같은 임베딩을 쓰므로 (임베딩 캐시) 추가 호출은 없다.
+            vector = await run_blocking(embed_query_or_none, param)
+            if vector is not None:
+                hit = precomputed.nearest(vector)
+    return hit
+
+
+async def run_pipeline(param, answer_stream=None, chat_history="", use_precomputed=True) -> dict:
+    # 답변과 함께 인텐트, 답변 출처(precomputed / answer_cache / document / web), 파이프라인 context 를 돌려준다.
+    # 요청 하나는 처음 가져온 runtime 으로 끝까지 처리한다. (reload 와 섞이지 않음)
+    # 이전 대화가 있어도 질문만으로 뜻이 통하면 미리 만든 답변과 답변 캐시를 그대로 쓴다.
+    # 이전 대화에 기대는 질문(depends_on_history)만 건너뛴다. 판단이 빗나가면 대화 맥락이 빠진 답이 나갈 수
+    # 있지만, 대화가 있는 사용자가 MEMORY_IDLE_TTL 동안 캐시를 전혀 못 쓰는 것보다 낫다고 본다.
+    # 이전 대화를 넣어서 만든 답변은 그 대화에 맞춰졌을 수 있으므로 답변 캐시에 저장하지는 않는다.
+    use_cache = not chat_history or not depends_on_history(param)
+    if use_precomputed and use_cache:
+        hit = await lookup_precomputed(param)
+        if hit is not None:
+            return {"intent": hit.intent, "answer": hit.answer, "source": "precomputed", "context": {}}
+
+    plans = get_runtime().current()["plans"]
+    context = await plans["intent"].run(user_message=param)
+    context["chat_history"] = chat_history
+    intent = context["intent"]
+
+    if intent != 'None':
+        # 비슷한 질문에 이미 답변한 적이 있으면 그대로 돌려준다.
+        answer_cache = get_answer_cache()
+        query_vector = await run_blocking(embed_query_or_none, context["user_message"]) if use_cache else None
+        if query_vector is not None:
+            answer = answer_cache.lookup(intent, query_vector)
+            if answer is not None:
+                return {"intent": intent, "answer": answer, "source": "answer_cache", "context": context}
+
+        context = await plans["document"].run(**context, answer_stream=answer_stream)
+        answer = context["bot_output"] + "\n\n"
+        if query_vector is not None and not chat_history:
+            answer_cache.store(intent, query_vector, answer)
+        return {"intent": intent, "answer": answer, "source": "document", "context": context}
+
+    context = await plans["web"].run(**context, answer_stream=answer_stream)
+    return {"intent": intent, "answer": context["output"], "source": "web", "context": context}
 
 
 def main():
+    logging.basicConfig(level=logging.INFO)
     print("프로젝트 3단계")
-    # generate_vector_db() // DB 생성할때만 사용하는 함수 (한번만 실행)
+    # generate_vector_db() // DB 생성/갱신 (바뀐 chunk 만 다시 임베딩)
     # call_db("social","기능은 뭐야?")
     result = generate_answer("카카오싱크 기능이 무엇이 있는지 설명해주세요")
     # result = generate_answer("카카오톡 채널 고객 관리에 대해 알려주세요")
@@ -0,0 +1,191 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from langchain.embeddings.base import Embeddings
+
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite3")
+
+
+def normalize_text(text: str) -> str:
+    # 한글 NFC 정규화 + 대소문자/공백 정리
+    text = unicodedata.normalize("NFC", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.casefold()
+
+
+class LRUCache:
+    # 크기 제한과 TTL 이 있는 메모리 캐시
+    def __init__(self, max_size=2048, ttl=60 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if self.ttl and expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl or 0))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    # 재시작 후에도 유지되는 sqlite 캐시 (chroma 폴더 옆에 저장)
+    # ttl 이 지난 것은 읽지 않고, prune_interval 번 쓸 때마다 만료된 것과 max_entries 를 넘는 오래된 것을 지운다.
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=100000, ttl=30 * 24 * 60 * 60, prune_interval=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embedding_created_at ON embedding (created_at)")
+        self._conn.commit()
+        with self._lock:
+            self._prune()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT vector, created_at FROM embedding WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.ttl and row[1] < time.time() - self.ttl):
+            return None
+        return array("f", row[0]).tolist()
+
+    def set(self, key, vector):
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embedding (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._writes += 1
+            if self._writes % self.prune_interval == 0:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        # lock 을 잡고 호출한다.
+        removed = 0
+        if self.ttl:
+            removed += self._conn.execute(
+                "DELETE FROM embedding WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        if self.max_entries:
+            count = self._conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM embedding WHERE key IN (SELECT key FROM embedding ORDER BY created_at LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        self.evictions += removed
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    # 임베딩 함수를 감싸서 같은 질문은 다시 임베딩하지 않는다.
+    # 메모리(LRU) -> 디스크(optional) -> 실제 임베딩 순서로 조회
+    def __init__(self, embedding, max_size=2048, ttl=60 * 60, disk_path=None, namespace="",
+                 disk_max_entries=100000, disk_ttl=30 * 24 * 60 * 60):
+        self.embedding = embedding
+        self.namespace = namespace
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk = DiskCache(disk_path, max_entries=disk_max_entries, ttl=disk_ttl) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # 여러 스레드(run_blocking)에서 동시에 조회하므로 카운터는 lock 안에서 올린다.
+        self._lock = threading.Lock()
+
+    def _key(self, text):
+        return f"{self.namespace}:{normalize_text(text)}"
+
+    def _lookup(self, key):
+        vector = self.memory.get(key)
+        if vector is not None:
+            with self._lock:
+                self.hits += 1
+            return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.memory.set(key, vector)
+                return vector
+        return None
+
+    def _store(self, key, vector):
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.set(key, vector)
+
+    def embed_query(self, text: str) -> list:
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+            vector = self.embedding.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [self._key(text) for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            # 캐시에 없는 것만 한번에 임베딩
+            embedded = self.embedding.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self._store(keys[i], vector)
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+        stats.update(evictions=self.memory.evictions, size=len(self.memory))
+        if self.disk is not None:
+            stats["disk_evictions"] = self.disk.evictions
+        return stats
@@ -0,0 +1,259 @@
+# 질문 JSONL 파일을 generate_answer 파이프라인(run_pipeline)으로 끝까지 돌려서 결과를 JSONL 로 남기는 배치 평가
+# 입력 한 줄: {"id": ..., "utterance": "..."} (question / user_message 키, 카카오 요청 body 의 userRequest.utterance 도 됨)
+#            또는 질문 문자열 하나. id 가 없으면 줄 번호
+# 출력 한 줄: id, 질문, 인텐트, 답변 출처, 검색된 chunk id, 답변, 토큰 수, stage 별 시간(ms), 전체 시간(ms), 에러
+# 실행: python evaluate.py questions.jsonl --output results.jsonl --concurrency 16 --processes 4
+# - 결과는 끝난 순서대로 바로 쓴다. --resume 이면 출력 파일에 이미 있는 id 는 건너뛴다.
+# - --processes 가 2 이상이면 질문을 프로세스마다 나눠서 돌린다. (BM25, context 조립, 토큰 계산 같은 CPU 작업이
+#   한 프로세스의 GIL 을 나눠 쓰지 않게) LLM 분당 한도는 프로세스 수로 나눈다.
+# - 나머지 설정은 서버와 같은 환경 변수를 쓴다. (OPENAI_API_BASE 로 로컬 LLM, ANSWER_CACHE_THRESHOLD=1.01 로 답변 캐시 끄기 등)
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import shared_path
+from chatbot_3 import run_pipeline, warm_up
+from job_queue import LatencyWindow
+from llm_client import get_llm_client
+from retrieval import get_registry
+from tracing import trace_request
+
+logger = logging.getLogger("Evaluate")
+
+
+def parse_record(line: str, line_number: int):
+    record = json.loads(line)
+    if isinstance(record, str):
+        return {"id": line_number, "utterance": record}
+    utterance = record.get("utterance") or record.get("question") or record.get("user_message")
+    if utterance is None:
+        utterance = (record.get("userRequest") or {}).get("utterance")
+    if not utterance:
+        raise ValueError("질문이 없음")
+    return {"id": record.get("id", line_number), "utterance": utterance}
+
+
+def iter_records(path, skip_ids=()):
+    # 한 줄씩 읽는다. (수만 줄짜리 로그도 메모리에 올리지 않음)
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = parse_record(line, line_number)
+            except ValueError as e:
+                logger.warning("%d 번째 줄 건너뜀: %s", line_number, e)
+                continue
+            if record["id"] not in skip_ids:
+                yield record
+
+
+def read_done_ids(path) -> set:
+    # 이어서 쓰기 전에 중단될 때 쓰다 만 마지막 줄은 잘라낸다.
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                pass
+            end += len(line)
+        f.truncate(end)
+    return done
+
+
+async def evaluate_record(record, use_precomputed=True) -> dict:
+    result = {"id": record["id"], "utterance": record["utterance"], "intent": None, "source": None, "answer": None}
+    start = time.perf_counter()
+    with trace_request() as trace:
+        try:
+            output = await run_pipeline(record["utterance"], use_precomputed=use_precomputed)
+            result.update(intent=output["intent"], source=output["source"], answer=output["answer"])
+            error = None
+        except Exception as e:
+            logger.exception("답변 생성 실패: %s", record["id"])
+            error = f"{type(e).__name__}: {e}"
+    result.update({
+        "retrieved_chunks": trace.values.get("retrieved_chunks", []),
+        "tokens": {"prompt": trace.tokens.get("prompt", 0), "completion": trace.tokens.get("completion", 0)},
+        "stages_ms": {key: round(value * 1000, 2) for key, value in trace.stages.items()},
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        "error": error,
+    })
+    return result
+
+
+async def evaluate_stream(next_record, write, concurrency=8, use_precomputed=True):
+    # next_record() 는 다음 질문(없으면 None)을 돌려주는 blocking 함수. (파일 읽기 또는 프로세스 큐)
+    # 읽는 task 하나가 큐를 채우고 concurrency 개의 worker 가 꺼내서 평가한다.
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def feed():
+        while True:
+            record = await loop.run_in_executor(None, next_record)
+            if record is None:
+                break
+            await pending.put(record)
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def worker():
+        while True:
+            record = await pending.get()
+            if record is None:
+                return
+            write(await evaluate_record(record, use_precomputed))
+
+    await warm_up()
+    try:
+        await asyncio.gather(feed(), *(worker() for _ in range(concurrency)))
+    finally:
+        await get_llm_client().aclose()
+
+
+class EvaluationReport:
+    # 결과 파일과 별도로 stdout 에 출력할 요약 (처리량, 지연 시간, 출처별 개수, stage 별 평균 시간)
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.sources = {}
+        self.stage_ms = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.latency = LatencyWindow(max_samples=100000)
+        self.start = time.perf_counter()
+
+    def add(self, result):
+        self.count += 1
+        self.errors += result["error"] is not None
+        self.sources[result["source"]] = self.sources.get(result["source"], 0) + 1
+        for key, value in result["stages_ms"].items():
+            self.stage_ms[key] = self.stage_ms.get(key, 0.0) + value
+        for kind, value in result["tokens"].items():
+            self.tokens[kind] += value
+        self.latency.add(result["latency_ms"] / 1000)
+        if self.count % 100 == 0:
+            logger.info("%d 개 (%.2f 질문/초)", self.count, self.count / (time.perf_counter() - self.start))
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        count = self.count or 1
+        stages = sorted(self.stage_ms.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "questions": self.count,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "questions_per_sec": round(self.count / elapsed, 2) if elapsed else 0.0,
+            "latency": self.latency.summary(),
+            "sources": self.sources,
+            "tokens": self.tokens,
+            # 질문 하나당 평균 (큰 순서). 동시에 실행된 stage 는 겹쳐서 합이 latency 보다 클 수 있다.
+            "stage_mean_ms": {key: round(value / count, 2) for key, value in stages},
+        }
+
+
+def process_worker(tasks, results, concurrency, use_precomputed):
+    # spawn 된 프로세스. 자기 event loop 에서 부모가 넣어주는 질문을 평가하고 결과를 돌려보낸다.
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        asyncio.run(evaluate_stream(tasks.get, results.put, concurrency, use_precomputed))
+    finally:
+        results.put(None)
+
+
+def run_processes(records, write, args):
+    # 프로세스마다 llm client 를 따로 가지므로 분당 한도를 나눠서 넘겨준다. (spawn 된 프로세스는 환경 변수를 새로 읽음)
+    client = get_llm_client()
+    for name, bucket in [("LLM_REQUESTS_PER_MINUTE", client.request_bucket),
+                         ("LLM_TOKENS_PER_MINUTE", client.token_bucket)]:
+        if bucket.capacity > 0:
+            os.environ[name] = str(max(1, int(bucket.capacity) // args.processes))
+    # 여러 프로세스가 같은 chroma 폴더를 처음 열면서 동시에 collection 을 만들면 서로 덜 만들어진 것을 보고 실패한다.
+    # (numpy store 내보내기도 마찬가지) 부모가 먼저 한번 열어두면 프로세스들은 이미 있는 것을 열기만 한다.
+    get_registry().open()
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue(maxsize=args.processes * args.concurrency * 2)
+    results = context.Queue()
+    processes = [context.Process(target=process_worker, daemon=True,
+                                 args=(tasks, results, args.concurrency, not args.no_precomputed))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def feed():
+        for record in records:
+            tasks.put(record)
+        for _ in processes:
+            tasks.put(None)
+
+    threading.Thread(target=feed, name="evaluate-feeder", daemon=True).start()
+    running = len(processes)
+    while running:
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            # 종료 표시(None)를 보내지 못하고 죽은 프로세스가 있으면 기다리지 않는다.
+            if not any(process.is_alive() for process in processes):
+                raise RuntimeError("평가 프로세스가 모두 종료되었습니다.")
+            continue
+        if result is None:
+            running -= 1
+        else:
+            write(result)
+    for process in processes:
+        process.join()
+
+
+def run(args) -> dict:
+    skip_ids = read_done_ids(args.output) if args.resume else set()
+    records = iter_records(args.input, skip_ids)
+    if args.limit:
+        records = (record for _, record in zip(range(args.limit), records))
+    report = EvaluationReport()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as f:
+        def write(result):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            report.add(result)
+
+        if args.processes > 1:
+            run_processes(records, write, args)
+        else:
+            asyncio.run(evaluate_stream(lambda: next(records, None), write, args.concurrency,
+                                        not args.no_precomputed))
+    return {"input": args.input, "output": args.output, "resumed": len(skip_ids), "processes": args.processes,
+            "concurrency": args.concurrency, **report.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="질문 JSONL 파일")
+    parser.add_argument("--output", default="evaluation.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8, help="프로세스 하나에서 동시에 처리할 질문 수")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--resume", action="store_true", help="출력 파일에 이미 있는 id 는 건너뛰고 이어서 쓴다.")
+    parser.add_argument("--no-precomputed", action="store_true", help="미리 만든 답변을 쓰지 않고 파이프라인을 끝까지 실행")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = run(args)
+    except KeyboardInterrupt:
+        logger.warning("중단됨. --resume 으로 다시 실행하면 이어서 합니다.")
+        raise SystemExit(130)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
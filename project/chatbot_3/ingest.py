@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from lexical_index import LEXICAL_INDEX_NAME, LexicalIndex
+from retrieval import CHROMA_PERSIST_DIR, UNIFIED_COLLECTION_NAME, VECTOR_BACKEND
+from vector_store import export_collection, numpy_store_path
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+MANIFEST_NAME = "ingest_manifest.json"
+logger = logging.getLogger("Ingest")
+
+
+def chunk_id(metadata: dict, text: str) -> str:
+    # 같은 파일/섹션의 같은 내용이면 항상 같은 id
+    key = f"{metadata.get('source')}\x00{metadata.get('section')}\x00{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class IngestManifest:
+    # 이미 임베딩해서 넣어둔 chunk id 목록 (chroma 폴더에 json 으로 저장)
+    def __init__(self, path):
+        self.path = path
+        self.chunks = {}
+
+    def load(self, collection):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.chunks = json.load(f)["chunks"]
+        else:
+            # manifest 가 없으면 collection 에 있는 id 를 기준으로 시작한다.
+            result = collection.get(include=["metadatas"])
+            self.chunks = {id: metadata or {} for id, metadata in zip(result["ids"], result["metadatas"])}
+        return self
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class EmbeddingEngine:
+    # chunk 를 batch 단위로 묶어서 여러 스레드로 동시에 임베딩한다.
+    # 실패한 batch 는 지수 백오프(+jitter)로 다시 시도한다.
+    def __init__(self, embedding, max_workers=4, max_retries=5, backoff=1.0):
+        self.embedding = embedding
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def embed_batch(self, batch):
+        texts = [document.page_content for _, document in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                return batch, self.embedding.embed_documents(texts)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning("임베딩 실패, %.1f초 후 다시 시도 (%d/%d)", delay, attempt + 1, self.max_retries)
+                time.sleep(delay)
+
+    def run(self, batches, write):
+        # 동시에 처리 중인 batch 수를 제한해서 메모리가 일정하게 유지되도록 한다.
+        # write 는 호출한 스레드에서만 실행된다. (저장소 쓰기는 순서대로)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= self.max_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(*future.result())
+                pending.add(pool.submit(self.embed_batch, batch))
+            for future in as_completed(pending):
+                write(*future.result())
+
+
+def load_lexical_index(persist_directory, collection) -> LexicalIndex:
+    # vector db 와 같은 chunk 로 BM25 index 를 유지한다. 파일이 없으면 collection 내용으로 시작
+    index = LexicalIndex(os.path.join(persist_directory, LEXICAL_INDEX_NAME))
+    if os.path.exists(index.path):
+        return index.load()
+    result = collection.get(include=["documents", "metadatas"])
+    for id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+        index.add(id, text, metadata)
+    return index
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    # linux 는 KB 단위
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def ingest_documents(documents, persist_directory=CHROMA_PERSIST_DIR, collection_name=UNIFIED_COLLECTION_NAME,
+                     embedding=None, batch_size=64, max_workers=4) -> dict:
+    # 새로 생기거나 바뀐 chunk 만 임베딩하고, 원문에서 사라진 chunk 는 지운다.
+    # documents 는 generator 여도 된다. (전체를 메모리에 올리지 않고 batch 단위로 처리)
+    import chromadb
+    from langchain.embeddings.openai import OpenAIEmbeddings
+
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_or_create_collection(name=collection_name, embedding_function=None)
+    manifest = IngestManifest(os.path.join(persist_directory, MANIFEST_NAME)).load(collection)
+    lexical_index = load_lexical_index(persist_directory, collection)
+    engine = EmbeddingEngine(embedding or OpenAIEmbeddings(), max_workers=max_workers)
+
+    seen = set()
+    touched = set()
+    added = 0
+
+    def new_chunks():
+        for document in documents:
+            id = chunk_id(document.metadata, document.page_content)
+            if id in seen:
+                continue
+            seen.add(id)
+            if id not in manifest.chunks:
+                yield id, document
+
+    def write(batch, vectors):
+        nonlocal added
+        collection.upsert(
+            ids=[id for id, _ in batch],
+            embeddings=vectors,
+            metadatas=[document.metadata for _, document in batch],
+            documents=[document.page_content for _, document in batch],
+        )
+        for id, document in batch:
+            manifest.chunks[id] = document.metadata
+            lexical_index.add(id, document.page_content, document.metadata)
+            touched.add(document.metadata.get("category"))
+        added += len(batch)
+
+    try:
+        engine.run(iter_batches(new_chunks(), batch_size), write)
+    finally:
+        # 중간에 실패해도 저장된 chunk 까지는 manifest 에 남겨서 다음 실행 때 이어서 한다.
+        manifest.save()
+        lexical_index.save()
+
+    removed = [id for id in manifest.chunks if id not in seen]
+    for batch in iter_batches(removed, batch_size * 16):
+        collection.delete(ids=batch)
+        for id in batch:
+            touched.add(manifest.chunks.pop(id).get("category"))
+            lexical_index.remove(id)
+    manifest.save()
+    lexical_index.save()
+    if VECTOR_BACKEND == "numpy" and (added or removed):
+        # numpy store 는 통째로 다시 쓴다. (수백 chunk 라 금방 끝남)
+        export_collection(collection, numpy_store_path(persist_directory, collection_name))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "added": added,
+        "removed": len(removed),
+        "unchanged": len(seen) - added,
+        "categories": sorted(category for category in touched if category),
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_sec": round(added / elapsed, 1) if elapsed else 0.0,
+        "peak_memory_mb": peak_memory_mb(),
+    }
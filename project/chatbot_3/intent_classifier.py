@@ -0,0 +1,93 @@
+import os
+import threading
+import numpy as np
+
+NONE_INTENT = "None"
+# 어느 인텐트에도 속하지 않는 질문 예시. ada-002 는 관계없는 문장끼리도 유사도가 0.7~0.85 라서
+# 인텐트 점수만 보면 엉뚱한 질문도 확신하게 된다. 가장 가까운 예시의 점수를 'None' 점수로 같이 비교한다.
+OFF_DOMAIN_EXAMPLES = [
+    "오늘 날씨 어때?",
+    "점심 메뉴 추천해줘",
+    "김치찌개 맛있게 끓이는 법 알려줘",
+    "주말에 볼 만한 영화 추천해줘",
+    "어제 축구 경기 결과 알려줘",
+    "비트코인 시세가 얼마야?",
+    "서울에서 부산까지 KTX 로 얼마나 걸려?",
+    "파이썬으로 리스트 정렬하는 방법",
+    "감기 걸렸을 때 좋은 음식",
+    "너는 이름이 뭐야?",
+    "안녕하세요 반갑습니다",
+    "What is the capital of France?",
+]
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class IntentClassifier:
+    # 인텐트 설명(intent_list.txt)과 인텐트별 collection chunk 임베딩으로 중심 벡터를 만들어두고
+    # 질문 임베딩과 가장 가까운 인텐트를 고른다. (LLM 호출 없이 인텐트 결정)
+    # 도메인 밖 예시와 가장 가까우면 'None' (web 검색) 으로 보낸다.
+    def __init__(self, intent_table: dict, registry, threshold=0.8, margin=0.02,
+                 off_domain_examples=OFF_DOMAIN_EXAMPLES):
+        self.intent_table = intent_table
+        self.registry = registry
+        self.threshold = threshold
+        self.margin = margin
+        self.intents = list(intent_table)
+        self.off_domain_examples = list(off_domain_examples)
+        self._centroids = None
+        self._off_domain = None
+        self._lock = threading.Lock()
+
+    def fit(self):
+        with self._lock:
+            if self._centroids is not None:
+                return self._centroids
+            embedding = self.registry.embedding
+            texts = [self.intent_table[intent] for intent in self.intents] + self.off_domain_examples
+            vectors = embedding.embed_documents(texts)
+            descriptions = vectors[:len(self.intents)]
+            centroids = []
+            for intent, description in zip(self.intents, descriptions):
+                centroid = _normalize(description)
+                chunks = self.registry.category_embeddings(intent)
+                if chunks:
+                    # 설명 벡터와 chunk 평균 벡터를 같은 비중으로 섞는다.
+                    chunk_mean = _normalize(np.mean([_normalize(chunk) for chunk in chunks], axis=0))
+                    centroid = _normalize(centroid + chunk_mean)
+                centroids.append(centroid)
+            # 도메인 밖 예시는 주제가 제각각이라 평균 내지 않고 하나씩 비교한다.
+            off_domain = [_normalize(vector) for vector in vectors[len(self.intents):]]
+            self._off_domain = np.stack(off_domain) if off_domain else None
+            self._centroids = np.stack(centroids)
+            return self._centroids
+
+    def scores(self, text: str) -> dict:
+        centroids = self.fit()
+        vector = _normalize(self.registry.embedding.embed_query(text))
+        scores = dict(zip(self.intents, (centroids @ vector).tolist()))
+        if self._off_domain is not None:
+            scores[NONE_INTENT] = float(np.max(self._off_domain @ vector))
+        return scores
+
+    def classify(self, text: str):
+        # (인텐트, 점수, 확신 여부) 를 돌려준다. 확신이 없으면 LLM 으로 다시 판단한다.
+        # 'None' 도 다른 인텐트와 같이 순위를 매기므로, 인텐트 점수가 높아도 도메인 밖 예시보다 margin 이상 높아야 확신한다.
+        ranked = sorted(self.scores(text).items(), key=lambda item: item[1], reverse=True)
+        intent, score = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else -1.0
+        confident = score >= self.threshold and score - second >= self.margin
+        return intent, score, confident
+
+
+def create_intent_classifier(intent_table: dict, registry) -> IntentClassifier:
+    return IntentClassifier(
+        intent_table,
+        registry,
+        threshold=float(os.getenv("INTENT_THRESHOLD", "0.8")),
+        margin=float(os.getenv("INTENT_MARGIN", "0.02")),
+    )
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from tracing import REGISTRY, TRACING_ENABLED
+
+logger = logging.getLogger("JobQueue")
+JOB_WAIT_SECONDS = REGISTRY.histogram("chatbot_job_wait_seconds", "작업 큐 대기 시간(초)")
+JOB_SERVICE_SECONDS = REGISTRY.histogram("chatbot_job_service_seconds", "작업 처리 시간(초)")
+
+
+class LatencyWindow:
+    # 최근 max_samples 개의 소요 시간(초)만 들고 있다가 분위수로 요약한다.
+    def __init__(self, max_samples=1000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1)
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+class JobQueue:
+    # 깊이 제한이 있는 작업 큐 + 고정 개수 worker
+    # - 사용자별로 줄을 따로 세우고 worker 는 사용자를 돌아가며 하나씩 꺼낸다. (한 사용자가 몰아서 보내도 다른 사용자가 밀리지 않음)
+    # - 큐가 가득 찼거나 사용자당 대기 한도를 넘으면 submit 이 False 를 돌려준다. (호출한 쪽에서 바로 대체 답변)
+    # - max_wait 보다 오래 기다린 작업은 실행하지 않고 on_expired 로 넘긴다. (callbackUrl 유효시간 1분)
+    def __init__(self, handler, max_depth=100, workers=16, max_per_user=2, max_wait=40.0, on_expired=None):
+        self.handler = handler
+        self.max_depth = max_depth
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.max_wait = max_wait
+        self.on_expired = on_expired
+        self.depth = 0
+        self.running = 0
+        self.counts = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "expired": 0}
+        self.wait_time = LatencyWindow()
+        self.service_time = LatencyWindow()
+        self._queues = OrderedDict()
+        self._ready = None
+        self._tasks = []
+
+    def start(self):
+        # event loop 안에서 호출 (서버 시작 시)
+        if not self._tasks:
+            self._ready = asyncio.Event()
+            if self.depth:
+                self._ready.set()
+            self._tasks = [asyncio.ensure_future(self._worker(index)) for index in range(self.workers)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, user_id: str, job) -> bool:
+        queue = self._queues.get(user_id)
+        if self.depth >= self.max_depth or (queue is not None and len(queue) >= self.max_per_user):
+            self.counts["rejected"] += 1
+            return False
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        queue.append((job, time.monotonic()))
+        self.depth += 1
+        self.counts["submitted"] += 1
+        if self._ready is not None:
+            self._ready.set()
+        return True
+
+    def _next(self):
+        # 맨 앞 사용자의 작업을 하나 꺼내고, 남은 작업이 있으면 그 사용자를 맨 뒤로 보낸다.
+        user_id, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(user_id)
+        else:
+            del self._queues[user_id]
+        self.depth -= 1
+        if not self.depth:
+            self._ready.clear()
+        return job
+
+    async def _worker(self, index):
+        while True:
+            await self._ready.wait()
+            if not self.depth:
+                continue
+            job, enqueued = self._next()
+            waited = time.monotonic() - enqueued
+            self.wait_time.add(waited)
+            if TRACING_ENABLED:
+                JOB_WAIT_SECONDS.observe(waited)
+            if waited > self.max_wait:
+                self.counts["expired"] += 1
+                if self.on_expired is not None:
+                    await self._run(self.on_expired, job)
+                continue
+
+            self.running += 1
+            started = time.monotonic()
+            try:
+                if await self._run(self.handler, job):
+                    self.counts["completed"] += 1
+                else:
+                    self.counts["failed"] += 1
+            finally:
+                self.running -= 1
+                served = time.monotonic() - started
+                self.service_time.add(served)
+                if TRACING_ENABLED:
+                    JOB_SERVICE_SECONDS.observe(served)
+
+    async def _run(self, handler, job) -> bool:
+        try:
+            await handler(job)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("작업 처리 실패")
+            return False
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "users_waiting": len(self._queues),
+            "workers": self.workers,
+            "running": self.running,
+            **self.counts,
+            "wait_time": self.wait_time.summary(),
+            "service_time": self.service_time.summary(),
+        }
+
+
+_job_queue = None
+
+
+def get_job_queue(handler=None, on_expired=None) -> JobQueue:
+    # api 시작 시 handler 를 넘긴다. 인자 없이 먼저 부른 곳(/metrics 등)이 있어도 넘긴 handler 로 바꾼다.
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            handler,
+            max_depth=int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100")),
+            workers=int(os.getenv("JOB_WORKERS", "16")),
+            max_per_user=int(os.getenv("JOB_MAX_PER_USER", "2")),
+            max_wait=float(os.getenv("JOB_MAX_WAIT", "40")),
+            on_expired=on_expired,
+        )
+    if handler is not None:
+        _job_queue.handler = handler
+    if on_expired is not None:
+        _job_queue.on_expired = on_expired
+    return _job_queue
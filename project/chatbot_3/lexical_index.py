@@ -0,0 +1,121 @@
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+LEXICAL_INDEX_NAME = "lexical_index.json"
+WORD_PATTERN = re.compile(r"[가-힣]+|[0-9a-z]+")
+
+
+def tokenize(text: str) -> list:
+    # 한글은 조사가 붙어도 맞도록 글자 2-gram 으로, 영문/숫자는 단어 그대로 쓴다.
+    # "카카오싱크는" -> 카카, 카오, 오싱, 싱크, 크는
+    tokens = []
+    for word in WORD_PATTERN.findall(unicodedata.normalize("NFC", text).lower()):
+        if "가" <= word[0] <= "힣" and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class LexicalIndex:
+    # vector db 와 같은 chunk 로 만든 BM25 역색인. 임베딩 호출 없이 메모리에서 바로 찾는다.
+    def __init__(self, path=None, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.documents = {}
+        self._postings = defaultdict(dict)
+        self._lengths = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, id: str, text: str, metadata: dict):
+        with self._lock:
+            if id in self.documents:
+                self._remove(id)
+            self.documents[id] = (text, metadata or {})
+            terms = Counter(tokenize(text))
+            for term, frequency in terms.items():
+                self._postings[term][id] = frequency
+            self._lengths[id] = sum(terms.values())
+            self._total_length += self._lengths[id]
+
+    def remove(self, id: str):
+        with self._lock:
+            if id in self.documents:
+                self._remove(id)
+
+    def _remove(self, id):
+        text, _ = self.documents.pop(id)
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(id)
+
+    def search(self, query: str, k: int = 4, category=None) -> list:
+        # (Document, BM25 점수) 목록. 점수가 클수록 가깝다.
+        from langchain.schema import Document
+
+        with self._lock:
+            if not self.documents:
+                return []
+            count = len(self.documents)
+            average_length = self._total_length / count
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[id] / average_length)
+                    scores[id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            results = []
+            for id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                text, metadata = self.documents[id]
+                if category and metadata.get("category") != category:
+                    continue
+                results.append((Document(page_content=text, metadata=dict(metadata)), score))
+                if len(results) >= k:
+                    break
+            return results
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            documents = json.load(f)["documents"]
+        for id, (text, metadata) in documents.items():
+            self.add(id, text, metadata)
+        return self
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"documents": self.documents}, ensure_ascii=False)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 4, rrf_k: int = 60) -> list:
+    # 여러 검색 결과의 순위만 보고 합친다. (점수 단위가 달라도 됨)
+    # 같은 chunk 는 page_content 로 판단하고, 결과는 (Document, 융합 점수) 목록
+    scores = defaultdict(float)
+    documents = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results):
+            scores[doc.page_content] += 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(doc.page_content, doc)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(documents[text], score) for text, score in ranked]
@@ -0,0 +1,140 @@
+import asyncio
+import inspect
+import logging
+from tracing import span
+
+logger = logging.getLogger("Pipeline")
+
+
+class Stage:
+    # 파이프라인의 한 단계. inputs 로 필요한 값을 받아서 output 하나를 만든다.
+    # constant=True 이면 요청과 상관없는 값이라 처음 한번만 계산하고 기억해둔다.
+    # when=(key, 조건) 이 있으면 key 결과를 기다리지 않고 미리(투기적으로) 시작했다가
+    # 조건이 거짓이면 취소하고 default 를 결과로 쓴다.
+    # speculative=False 이면 조건을 먼저 확인하고 참일 때만 실행한다. (비용이 드는 LLM 호출 등)
+    def __init__(self, name, func, inputs=(), output=None, constant=False, when=None, default=None,
+                 speculative=True):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.output = output or name
+        self.constant = constant
+        self.when = when
+        self.default = default
+        self.speculative = speculative
+
+    @property
+    def depends_on(self):
+        return self.inputs + ([self.when[0]] if self.when else [])
+
+    async def run(self, context):
+        with span(self.name):
+            result = self.func(**{key: context[key] for key in self.inputs})
+            if inspect.isawaitable(result):
+                result = await result
+        return result
+
+
+class PipelinePlan:
+    # stage 들을 선언해두면 outputs 를 만드는 데 필요한 stage 만 남겨서 의존 순서에 맞게 실행한다.
+    # 결과가 쓰이지 않는 stage 는 실행하지 않는다.
+    def __init__(self, name, stages, outputs):
+        self.name = name
+        self.outputs = list(outputs)
+        producers = {stage.output: stage for stage in stages}
+        self.stages = self._resolve(producers)
+        self.pruned = [stage.name for stage in stages if stage not in self.stages]
+        self.inputs = sorted({key for stage in self.stages for key in stage.depends_on if key not in producers})
+        self._constants = None
+        if self.pruned:
+            logger.info("%s: 사용되지 않는 stage 제외 %s", name, self.pruned)
+
+    def _resolve(self, producers):
+        # outputs 에서부터 inputs 를 거꾸로 따라가며 필요한 stage 를 실행 순서대로 모은다.
+        ordered = []
+        visiting = set()
+
+        def visit(key):
+            stage = producers.get(key)
+            if stage is None or stage in ordered:
+                return
+            if key in visiting:
+                raise ValueError(f"{self.name}: stage 순환 의존 ({key})")
+            visiting.add(key)
+            for input_key in stage.depends_on:
+                visit(input_key)
+            ordered.append(stage)
+
+        for key in self.outputs:
+            visit(key)
+        return ordered
+
+    async def warm_up(self) -> dict:
+        # 서버 시작 시 호출해서 constant stage 를 미리 계산해둔다.
+        if self._constants is None:
+            constants = {}
+            for stage in self.stages:
+                if stage.constant:
+                    constants[stage.output] = await stage.run(constants)
+            self._constants = constants
+        return self._constants
+
+    async def run(self, **inputs) -> dict:
+        # 서로 의존하지 않는 stage 는 동시에 실행된다.
+        context = dict(await self.warm_up())
+        context.update(inputs)
+        missing = [key for key in self.inputs if key not in context]
+        if missing:
+            raise ValueError(f"{self.name}: 입력값 누락 {missing}")
+
+        tasks = {}
+        for stage in self.stages:
+            if stage.output not in context:
+                tasks[stage.output] = asyncio.ensure_future(self._run_stage(stage, context, tasks))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return context
+
+    async def _run_stage(self, stage, context, tasks):
+        deps = [tasks[key] for key in stage.inputs if key in tasks]
+        if deps:
+            await asyncio.gather(*deps)
+        if stage.when is None:
+            context[stage.output] = await stage.run(context)
+            return
+
+        key, condition = stage.when
+        if not stage.speculative:
+            if key in tasks:
+                await tasks[key]
+            context[stage.output] = await stage.run(context) if condition(context[key]) else stage.default
+            return
+
+        work = asyncio.ensure_future(stage.run(context))
+        try:
+            if key in tasks:
+                await tasks[key]
+            if condition(context[key]):
+                context[stage.output] = await work
+                return
+        except BaseException:
+            _discard(work)
+            raise
+        _discard(work)
+        context[stage.output] = stage.default
+
+
+def _discard(task):
+    # 필요 없어진 미리 시작한 stage 를 취소한다. 취소 전에 이미 실패했을 수도 있으니
+    # 끝날 때 예외를 꺼내서 "Task exception was never retrieved" 경고가 남지 않게 한다.
+    task.cancel()
+    task.add_done_callback(_retrieve_exception)
+
+
+def _retrieve_exception(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug("취소한 stage 의 예외 무시: %r", task.exception())
@@ -0,0 +1,136 @@
+# 데이터 섹션 제목으로 대표 질문을 만들어서 generate_answer 파이프라인으로 미리 답변을 만들어두는 배치
+# 실행: python precompute.py --concurrency 4 --rate 120
+# 중간에 멈춰도 저장된 답변은 남아 있어서 다시 실행하면 이어서 한다. (데이터가 바뀌면 처음부터)
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import namedtuple
+import shared_path
+from chatbot_3 import embed_query_or_none, run_blocking, run_pipeline
+from job_queue import LatencyWindow
+from llm_client import TokenBucket, get_llm_client
+from precomputed import DATASET_DIR, PRECOMPUTED_PATH, PrecomputedAnswers, dataset_hash, question_key
+from section_parser import DEFAULT_SECTION, iter_dataset_sections
+
+logger = logging.getLogger("Precompute")
+QUESTION_TEMPLATES = [
+    "{title} {section}",
+    "{title} {section} 알려주세요",
+    "{title} {section}에 대해 설명해주세요",
+]
+
+CanonicalQuestion = namedtuple("CanonicalQuestion", ["category", "section", "question"])
+
+
+def iter_canonical_questions(dir_path=DATASET_DIR):
+    # 파일 첫 줄("카카오싱크:")을 제목으로, 섹션 제목마다 QUESTION_TEMPLATES 질문을 만든다.
+    seen = set()
+    source = None
+    title = None
+    for section in iter_dataset_sections(dir_path):
+        category = section.file.split(".txt")[0].split("_")[3]
+        if section.file != source:
+            source = section.file
+            title = None
+        if section.section_path == DEFAULT_SECTION:
+            if section.text.endswith(":") and "\n" not in section.text:
+                title = section.text.rstrip(":").strip()
+            continue
+        name = section.section_path.split(" > ")[-1]
+        for template in QUESTION_TEMPLATES:
+            question = template.format(title=title or "", section=name).strip()
+            key = question_key(question)
+            if key not in seen:
+                seen.add(key)
+                yield CanonicalQuestion(category, section.section_path, question)
+
+
+async def precompute_answers(questions, store, concurrency=4, rate_per_minute=0) -> dict:
+    # concurrency 개의 worker 가 질문을 하나씩 꺼내서 답변을 만들고 바로 저장한다.
+    # rate_per_minute 가 있으면 분당 그 수만큼만 새 질문을 시작한다. (LLM 호출 한도는 llm_client 가 따로 지킨다)
+    done = await run_blocking(store.done_keys)
+    pending = [question for question in questions if question_key(question.question) not in done]
+    queue = asyncio.Queue()
+    for question in pending:
+        queue.put_nowait(question)
+    bucket = TokenBucket(rate_per_minute)
+    latency = LatencyWindow(max_samples=len(pending) or 1)
+    counts = {"answered": 0, "skipped_web": 0, "failed": 0}
+    start = time.perf_counter()
+
+    async def worker():
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            delay = bucket.reserve(1)
+            if delay:
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+            try:
+                result = await run_pipeline(question.question, use_precomputed=False)
+            except Exception:
+                logger.exception("답변 생성 실패: %s", question.question)
+                counts["failed"] += 1
+                continue
+            latency.add(time.perf_counter() - started)
+            if result["source"] == "web":
+                # 데이터 밖(web 검색) 답변은 데이터 버전으로 관리할 수 없어서 저장하지 않는다.
+                counts["skipped_web"] += 1
+                continue
+            vector = await run_blocking(embed_query_or_none, question.question)
+            await run_blocking(store.put, question.question, result["intent"], result["answer"], vector)
+            counts["answered"] += 1
+            if counts["answered"] % 10 == 0:
+                elapsed = time.perf_counter() - start
+                logger.info("%d / %d (%.2f 질문/초)", counts["answered"], len(pending), counts["answered"] / elapsed)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - start
+    return {
+        "questions": len(questions),
+        "resumed": len(questions) - len(pending),
+        **counts,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_sec": round((counts["answered"] + counts["skipped_web"]) / elapsed, 2) if elapsed else 0.0,
+        "latency": latency.summary(),
+        "llm_requests": get_llm_client().stats["requests"],
+    }
+
+
+async def run(args):
+    version = dataset_hash()
+    store = PrecomputedAnswers(path=args.output)
+    store.begin(version, reset=args.reset)
+    questions = list(iter_canonical_questions())[:args.limit or None]
+    logger.info("대표 질문 %d 개 (dataset %s)", len(questions), version)
+    try:
+        report = await precompute_answers(questions, store, concurrency=args.concurrency, rate_per_minute=args.rate)
+    finally:
+        store.close()
+        await get_llm_client().aclose()
+    return {"dataset_hash": version, "path": args.output, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="분당 시작할 질문 수 (0 이면 제한 없음)")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--output", default=PRECOMPUTED_PATH)
+    parser.add_argument("--reset", action="store_true", help="이어서 하지 않고 처음부터 다시 만든다.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        logger.warning("중단됨. 다시 실행하면 저장된 답변 다음부터 이어서 합니다.")
+        raise SystemExit(130)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
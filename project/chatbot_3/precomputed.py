@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import namedtuple
+import numpy as np
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset")
+PRECOMPUTED_PATH = os.getenv("PRECOMPUTED_ANSWERS_PATH",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "precomputed_answers.sqlite3"))
+logger = logging.getLogger("Precomputed")
+
+Answer = namedtuple("Answer", ["question", "intent", "answer"])
+
+
+def question_key(question: str) -> str:
+    # 공백, 대소문자, 끝의 문장부호만 다른 질문은 같은 key
+    text = unicodedata.normalize("NFC", question)
+    text = re.sub(r"\s+", " ", text).strip().casefold()
+    return text.rstrip("?!.~ ")
+
+
+def dataset_hash(dir_path=DATASET_DIR) -> str:
+    # 데이터 파일 이름과 내용으로 만든 버전. 파일이 하나라도 바뀌면 미리 만든 답변은 모두 버린다.
+    digest = hashlib.sha256()
+    for file in sorted(os.listdir(dir_path)):
+        if file.endswith(".txt"):
+            digest.update(file.encode("utf-8") + b"\x00")
+            with open(os.path.join(dir_path, file), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class PrecomputedAnswers:
+    # 배치(precompute.py)로 미리 만들어둔 질문 -> 답변 sqlite 저장소
+    # - 답변은 zlib, 질문 벡터는 float16 으로 저장한다.
+    # - meta 의 dataset_hash 가 지금 데이터와 다르면 서빙하지 않는다.
+    # - 서빙할 때는 전부 메모리에 올려서 질문 key 로 바로 찾고, 없으면 질문 벡터 코사인 유사도로 찾는다.
+    def __init__(self, path=PRECOMPUTED_PATH, threshold=0.95):
+        self.path = path
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._answers = {}
+        self._keys = []
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answer "
+                "(key TEXT PRIMARY KEY, question TEXT, intent TEXT, answer BLOB, vector BLOB, created_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def stored_version(self):
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE name = 'dataset_hash'").fetchone()
+        return row[0] if row else None
+
+    def begin(self, version, reset=False):
+        # 배치 시작: 버전이 다르거나 reset 이면 이전 답변을 지우고 새 버전으로 시작한다. 같으면 이어서 한다.
+        if not reset and self.stored_version() == version:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM answer")
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dataset_hash', ?)", (version,))
+            conn.commit()
+
+    def done_keys(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._connect().execute("SELECT key FROM answer")}
+
+    def put(self, question, intent, answer, vector=None):
+        blob = np.asarray(vector, dtype=np.float16).tobytes() if vector is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO answer (key, question, intent, answer, vector, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (question_key(question), question, intent, zlib.compress(answer.encode("utf-8")), blob, time.time()),
+            )
+            conn.commit()
+
+    def load(self, version=None):
+        # 서버 시작 시 호출. 저장된 버전이 지금 데이터와 다르면 비워둔다.
+        version = version or dataset_hash()
+        answers, keys, vectors = {}, [], []
+        if os.path.exists(self.path):
+            if self.stored_version() != version:
+                logger.warning("미리 만든 답변의 데이터 버전이 달라서 사용하지 않습니다. (precompute.py 를 다시 실행)")
+            else:
+                with self._lock:
+                    rows = self._connect().execute(
+                        "SELECT key, question, intent, answer, vector FROM answer").fetchall()
+                for key, question, intent, answer, vector in rows:
+                    answers[key] = Answer(question, intent, zlib.decompress(answer).decode("utf-8"))
+                    if vector is not None:
+                        keys.append(key)
+                        vectors.append(np.frombuffer(vector, dtype=np.float16).astype(np.float32))
+        matrix = None
+        if vectors:
+            matrix = np.stack(vectors)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self.version = version
+            self._answers, self._keys, self._matrix = answers, keys, matrix
+        logger.info("미리 만든 답변 %d 개 (dataset %s)", len(answers), version)
+        return self
+
+    def __len__(self):
+        return len(self._answers)
+
+    @property
+    def has_vectors(self) -> bool:
+        return self._matrix is not None
+
+    def get(self, question):
+        answer = self._answers.get(question_key(question))
+        if answer is not None:
+            self.hits += 1
+        elif self._matrix is None:
+            self.misses += 1
+        return answer
+
+    def nearest(self, vector):
+        # 질문 key 가 없을 때: 미리 만든 질문 중 가장 가까운 것이 threshold 이상이면 그 답변
+        matrix, keys = self._matrix, self._keys
+        if matrix is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.semantic_hits += 1
+        return self._answers[keys[best]]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._answers),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+
+_precomputed = None
+_precomputed_lock = threading.Lock()
+
+
+def get_precomputed_answers() -> PrecomputedAnswers:
+    global _precomputed
+    if _precomputed is None:
+        with _precomputed_lock:
+            if _precomputed is None:
+                _precomputed = PrecomputedAnswers(
+                    threshold=float(os.getenv("PRECOMPUTED_THRESHOLD", "0.95")),
+                ).load()
+    return _precomputed
@@ -0,0 +1,249 @@
+import contextvars
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lexical_index import LEXICAL_INDEX_NAME, LexicalIndex, reciprocal_rank_fusion
+from tracing import span
+from vector_store import METADATA_NAME, NumpyVectorStore, export_collection, file_lock, numpy_store_path
+
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma"))
+COLLECTION_NAMES = ["sync", "channel", "social"]
+# 모든 카테고리 chunk 를 metadata(category, section, source) 와 함께 담는 통합 collection
+UNIFIED_COLLECTION_NAME = "kakao"
+# hybrid: BM25 + vector 를 RRF 로 합침, vector: 임베딩 검색만, lexical: BM25 만 (임베딩 호출 없음)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# hybrid 에서 vector 검색이 이 시간(초) 안에 끝나지 않으면 BM25 결과만 쓴다.
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "2.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# chroma: sqlite + HNSW, numpy: chroma 에서 옮겨온 mmap 행렬로 brute-force 검색 (작은 corpus 용)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+logger = logging.getLogger("Retrieval")
+
+
+def default_embedding():
+    # 같은 질문은 다시 임베딩하지 않도록 캐시로 감싼다.
+    # EMBEDDING_CACHE_DISK 가 설정되어 있으면 디스크 캐시도 사용 (개수 / TTL(초) 제한, 0 이면 제한 없음)
+    # langchain 은 import 만 몇 초 걸려서 처음 쓸 때 불러온다. (서버 시작 시 warm-up 에서)
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    from embedding_cache import EMBEDDING_CACHE_PATH, CachedEmbeddings
+
+    embedding = OpenAIEmbeddings()
+    disk_path = EMBEDDING_CACHE_PATH if os.getenv("EMBEDDING_CACHE_DISK") else None
+    return CachedEmbeddings(
+        embedding,
+        disk_path=disk_path,
+        namespace=embedding.model,
+        disk_max_entries=int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "100000")),
+        disk_ttl=float(os.getenv("EMBEDDING_CACHE_DISK_TTL", str(30 * 24 * 60 * 60))),
+    )
+
+
+class CollectionHandle:
+    # collection 하나를 여러 스레드에서 같이 쓰기 위한 핸들
+    # 임베딩(네트워크 호출)은 lock 밖에서, ANN 조회만 lock 안에서 한다.
+    def __init__(self, name, db, embedding):
+        self.name = name
+        self._db = db
+        self._embedding = embedding
+        self._lock = threading.Lock()
+
+    def similarity_search(self, query: str, k: int = 4) -> list:
+        vector = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector(vector, k=k)
+
+    def similarity_search_by_vector(self, vector, k: int = 4, filter=None) -> list:
+        with self._lock:
+            return self._db.similarity_search_by_vector(vector, k=k, filter=filter)
+
+    def search_with_score_by_vector(self, vector, k: int = 4, filter=None) -> list:
+        # (Document, distance) 목록. distance 가 작을수록 가깝다.
+        with self._lock:
+            return self._db.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=filter)
+
+    def get_documents(self) -> dict:
+        with self._lock:
+            return self._db.get(include=["documents", "metadatas"])
+
+    def get_embeddings(self, where=None) -> list:
+        with self._lock:
+            return self._db.get(where=where, include=["embeddings"])["embeddings"] or []
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db._collection.count()
+
+
+class RetrievalRegistry:
+    # chroma client 와 collection 을 프로세스당 한번만 열어두고 재사용한다.
+    def __init__(self, persist_directory=CHROMA_PERSIST_DIR, embedding=None, collection_names=None):
+        self.persist_directory = persist_directory
+        self.collection_names = collection_names or COLLECTION_NAMES
+        self.embedding = embedding or default_embedding()
+        self._client = None
+        self._handles = {}
+        self._unified_ready = None
+        self._lexical = None
+        self._lock = threading.Lock()
+        self._lexical_lock = threading.Lock()
+        self._vector_executor = ThreadPoolExecutor(max_workers=int(os.getenv("VECTOR_SEARCH_WORKERS", "4")))
+
+    def open(self):
+        # 서버 시작 시 호출해서 모든 collection 과 BM25 index 를 미리 열어둔다.
+        if not self.has_unified_index():
+            for name in self.collection_names:
+                self.get(name)
+        self.lexical_index()
+        return self
+
+    def has_unified_index(self) -> bool:
+        # 통합 index 가 아직 만들어지지 않았으면 카테고리별 collection 을 사용한다.
+        if self._unified_ready is None:
+            self._unified_ready = self.get(UNIFIED_COLLECTION_NAME).count() > 0
+        return self._unified_ready
+
+    def search(self, query: str, category=None, k: int = 4) -> list:
+        # category 가 있으면 해당 카테고리 안에서만, 없으면 전체 카테고리에서 찾는다.
+        # 결과는 (Document, distance) 를 distance 순으로 정렬한 목록
+        with span("embedding"):
+            vector = self.embedding.embed_query(query)
+        return self.search_by_vector(vector, category, k)
+
+    def search_by_vector(self, vector, category=None, k: int = 4) -> list:
+        with span("vector_search"):
+            return self._search_by_vector(vector, category, k)
+
+    def _search_by_vector(self, vector, category, k):
+        if self.has_unified_index():
+            where = {"category": category} if category else None
+            return self.get(UNIFIED_COLLECTION_NAME).search_with_score_by_vector(vector, k=k, filter=where)
+
+        results = []
+        for name in [category] if category else self.collection_names:
+            for doc, score in self.get(name).search_with_score_by_vector(vector, k=k):
+                doc.metadata = {**(doc.metadata or {}), "category": name}
+                results.append((doc, score))
+        return sorted(results, key=lambda item: item[1])[:k]
+
+    def hybrid_search(self, query: str, category=None, k: int = 4, mode=None) -> list:
+        # BM25 와 vector 검색을 동시에 돌려서 RRF 로 합친다. 결과는 (Document, 점수) 목록 (클수록 가깝다)
+        # vector 검색이 실패하거나 늦으면 BM25 결과만 쓴다.
+        mode = mode or RETRIEVAL_MODE
+        if mode == "vector":
+            return [(doc, 1.0 / (RRF_K + rank + 1)) for rank, (doc, _) in enumerate(self.search(query, category, k))]
+
+        fetch_k = k * 2
+        vector_future = None
+        if mode != "lexical":
+            vector_future = self._vector_executor.submit(contextvars.copy_context().run, self.search, query, category,
+                                                         fetch_k)
+        with span("lexical_search"):
+            result_lists = [self.lexical_index().search(query, k=fetch_k, category=category)]
+        if vector_future is not None:
+            try:
+                result_lists.append(vector_future.result(timeout=VECTOR_SEARCH_TIMEOUT))
+            except Exception:
+                logger.warning("vector 검색 실패 또는 지연, BM25 결과만 사용합니다.", exc_info=True)
+        return reciprocal_rank_fusion(result_lists, k=k, rrf_k=RRF_K)
+
+    def lexical_index(self) -> LexicalIndex:
+        if self._lexical is not None:
+            return self._lexical
+        with self._lexical_lock:
+            if self._lexical is None:
+                index = LexicalIndex(os.path.join(self.persist_directory, LEXICAL_INDEX_NAME))
+                if os.path.exists(index.path):
+                    index.load()
+                else:
+                    # ingest 전에 만들어진 vector db 라면 collection 내용으로 index 를 만든다.
+                    self._build_lexical_index(index)
+                self._lexical = index
+            return self._lexical
+
+    def _build_lexical_index(self, index):
+        if self.has_unified_index():
+            sources = [(UNIFIED_COLLECTION_NAME, None)]
+        else:
+            sources = [(name, name) for name in self.collection_names]
+        for name, category in sources:
+            result = self.get(name).get_documents()
+            for id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+                metadata = metadata or {}
+                if category:
+                    metadata = {**metadata, "category": category}
+                index.add(id, text, metadata)
+
+    def category_embeddings(self, category: str) -> list:
+        if self.has_unified_index():
+            return self.get(UNIFIED_COLLECTION_NAME).get_embeddings(where={"category": category})
+        return self.get(category).get_embeddings()
+
+    def get(self, name: str) -> CollectionHandle:
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+
+        with self._lock:
+            if name not in self._handles:
+                if VECTOR_BACKEND == "numpy":
+                    self._handles[name] = self._open_numpy_store(name)
+                else:
+                    from langchain.vectorstores import Chroma
+
+                    db = Chroma(
+                        client=self._chroma_client(),
+                        collection_name=name,
+                        embedding_function=self.embedding,
+                        persist_directory=self.persist_directory,
+                    )
+                    self._handles[name] = CollectionHandle(name, db, self.embedding)
+            return self._handles[name]
+
+    def _chroma_client(self):
+        if self._client is None:
+            import chromadb
+
+            self._client = chromadb.PersistentClient(path=self.persist_directory)
+        return self._client
+
+    def _open_numpy_store(self, name) -> NumpyVectorStore:
+        path = numpy_store_path(self.persist_directory, name)
+        if not os.path.exists(os.path.join(path, METADATA_NAME)):
+            # 처음 한번만 chroma collection 내용을 옮겨온다. (이후에는 ingest 가 갱신)
+            # worker 여러 개가 동시에 시작해도 하나만 만들고 나머지는 기다렸다가 만들어진 것을 연다.
+            with file_lock(f"{path}.export.lock"):
+                if not os.path.exists(os.path.join(path, METADATA_NAME)):
+                    collection = self._chroma_client().get_or_create_collection(name=name, embedding_function=None)
+                    count = export_collection(collection, path)
+                    logger.info("numpy vector store 생성: %s (%d chunks)", name, count)
+        return NumpyVectorStore(path, self.embedding)
+
+    def close(self):
+        with self._lock:
+            self._handles = {}
+            self._unified_ready = None
+            self._lexical = None
+            client, self._client = self._client, None
+            # chroma 는 경로마다 client(system)를 프로세스 안에서 캐시한다.
+            # 열다가 실패한 client 가 남아 있으면 다시 열어도 같은 것을 돌려주므로 이 registry 경로의 것만 뺀다.
+            # (전체 캐시를 비우면 다른 경로를 쓰는 client 까지 끊긴다)
+            if "chromadb" in sys.modules:
+                from chromadb.api.client import SharedSystemClient
+
+                systems = getattr(SharedSystemClient, "_identifer_to_system", {})
+                systems.pop(getattr(client, "_identifier", None) or self.persist_directory, None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> RetrievalRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = RetrievalRegistry()
+    return _registry
@@ -0,0 +1,75 @@
+import logging
+import os
+import threading
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template")
+logger = logging.getLogger("Runtime")
+
+
+class BotRuntime:
+    # 템플릿 폴더를 한번 읽어서 build 로 chain, plan, 인텐트 정보 등을 만들어두고 재사용한다.
+    # 템플릿 파일이 바뀌면 새로 만든 뒤 통째로 교체하므로 요청 중간에 섞이지 않는다.
+    # build 는 (템플릿, 이전 snapshot) 을 받는다. (바뀌지 않은 부분은 이전 것을 재사용할 수 있게)
+    def __init__(self, build, template_dir=TEMPLATE_DIR, check_interval=2.0):
+        self.build = build
+        self.template_dir = template_dir
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _read_signature(self):
+        signature = {}
+        for file in sorted(os.listdir(self.template_dir)):
+            stat = os.stat(os.path.join(self.template_dir, file))
+            signature[file] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def load(self):
+        with self._lock:
+            signature = self._read_signature()
+            templates = {}
+            for file in signature:
+                with open(os.path.join(self.template_dir, file), "r") as f:
+                    templates[file] = f.read()
+            snapshot = self.build(templates, self._snapshot)
+            # 완성된 snapshot 으로 한번에 교체
+            self._snapshot = snapshot
+            self._signature = signature
+        return snapshot
+
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.load()
+        return snapshot
+
+    def reload_if_changed(self) -> bool:
+        if self._read_signature() == self._signature:
+            return False
+        try:
+            self.load()
+        except Exception:
+            # 수정 중인 템플릿이 깨져 있으면 이전 snapshot 을 계속 사용
+            logger.exception("템플릿 reload 실패")
+            return False
+        logger.info("템플릿 변경 감지, runtime 을 다시 만들었습니다.")
+        return True
+
+    def start_watching(self):
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="template-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.reload_if_changed()
+
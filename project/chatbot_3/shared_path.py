@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 여러 챗봇이 같이 쓰는 모듈(tokenizer, chunker, context_builder, memory, llm_client)은 project/shared 에 있다.
+# 챗봇 폴더에서 바로 실행해도 import 되도록 sys.path 에 추가한다. (다른 import 보다 먼저)
+SHARED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared")
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
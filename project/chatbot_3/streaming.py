@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# 카카오 simpleText 는 1000자까지
+SIMPLE_TEXT_MAX_LENGTH = 1000
+SENTENCE_END_PATTERN = re.compile(r"[.!?。](?=\s)|[다요죠][.!?]?(?=\n)|\n\n")
+CONTINUE_UTTERANCE = os.getenv("CONTINUE_UTTERANCE", "이어서 보기")
+
+
+class AnswerStream:
+    # 생성 중인 답변. 토큰이 도착할 때마다 이어 붙이고, 기다리는 쪽을 깨운다.
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def feed(self, delta: str):
+        if delta and not self.done:
+            self.text += delta
+            self._notify()
+
+    def finish(self, text=None):
+        # 캐시된 답변처럼 스트리밍 없이 끝난 경우에도 최종 텍스트로 맞춘다.
+        if text is not None:
+            self.text = text
+        self.done = True
+        self._notify()
+
+    def fail(self, error):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, timeout=None):
+        if not self.done:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+
+    async def wait_done(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            try:
+                await self.wait_for_change(remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def next_part(self, offset=0, min_chars=80, max_chars=SIMPLE_TEXT_MAX_LENGTH, timeout=None):
+        # offset 이후 텍스트 중 보낼 수 있는 만큼을 (텍스트, 전부 보냈는지) 로 돌려준다.
+        # min_chars 이상 쌓인 뒤 문장이 끝나면 바로, max_chars 를 넘으면 공백에서 끊는다.
+        # timeout 이 지나면 그때까지 쌓인 만큼(문장 경계 우선)만 보낸다.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.error is not None:
+                raise self.error
+            pending = self.text[offset:]
+            if self.done and len(pending) <= max_chars:
+                return pending, True
+            cut = find_cut(pending, min_chars, max_chars)
+            if cut is not None:
+                return pending[:cut], False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                cut = find_cut(pending, 1, max_chars) or len(pending)
+                return pending[:cut], False
+            try:
+                await self.wait_for_change(remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+def find_cut(text: str, min_chars: int, max_chars: int):
+    # 보낼 위치. min_chars 이후 첫 문장 끝, 없으면 max_chars 를 넘었을 때 마지막 공백
+    for match in SENTENCE_END_PATTERN.finditer(text, min(min_chars, len(text))):
+        if match.end() > max_chars:
+            break
+        return match.end()
+    if len(text) > max_chars:
+        space = text.rfind(" ", 0, max_chars)
+        return space if space > 0 else max_chars
+    return None
+
+
+class ContinuationStore:
+    # 먼저 보낸 답변의 나머지. 사용자가 "이어서 보기" 를 누르면 여기서 꺼내서 바로 답한다.
+    def __init__(self, ttl=600.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, user_id: str, stream: AnswerStream, offset: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (stream, offset, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, user_id: str):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        return entry[0], entry[1]
+
+
+_continuations = ContinuationStore(ttl=float(os.getenv("CONTINUATION_TTL", "600")))
+
+
+def get_continuations() -> ContinuationStore:
+    return _continuations
+
+
+def simple_text_payload(text: str, has_more: bool) -> dict:
+    # 나머지가 있으면 "이어서 보기" 바로가기 버튼을 붙인다.
+    template = {"outputs": [{"simpleText": {"text": text}}]}
+    if has_more:
+        template["quickReplies"] = [
+            {"label": CONTINUE_UTTERANCE, "action": "message", "messageText": CONTINUE_UTTERANCE}
+        ]
+    return {"version": "2.0", "template": template}
@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import shared_path
+from tokenizer import count_tokens
+
+logger = logging.getLogger("Tracing")
+# TRACING=0 이면 span 은 아무것도 하지 않는 공용 객체를 돌려준다. (hot path 비용 거의 없음)
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key) -> str:
+    if not key:
+        return ""
+    pairs = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # label 조합별 [버킷별 개수..., 합계, 전체 개수]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        samples = []
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), counts[-1]))
+            samples.append((f"{self.name}_sum", key, round(counts[-2], 6)))
+            samples.append((f"{self.name}_count", key, counts[-1]))
+        return samples
+
+
+class Gauge:
+    # scrape 할 때 func 를 불러서 값을 읽는다. (캐시 크기, 큐 깊이 등)
+    type = "gauge"
+
+    def __init__(self, name, help, func, type="gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.type = type
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception:
+            logger.exception("%s 값 읽기 실패", self.name)
+            return []
+        # dict 를 돌려주면 {label 값: 값} 으로 본다.
+        if isinstance(value, dict):
+            return [(self.name, (("kind", kind),), number) for kind, number in value.items()
+                    if isinstance(number, (int, float))]
+        return [(self.name, (), value)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def gauge(self, name, help, func, type="gauge"):
+        # 같은 이름으로 다시 등록하면 func 를 바꾼다. (서버 재시작, 싱글턴 교체)
+        metric = Gauge(name, help, func, type)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("chatbot_stage_seconds", "파이프라인 단계별 소요 시간(초)")
+STAGE_ERRORS = REGISTRY.counter("chatbot_stage_errors_total", "단계별 실패 횟수")
+LLM_TOKENS = REGISTRY.counter("chatbot_llm_tokens_total", "LLM 호출 토큰 수 (prompt / completion)")
+
+
+class RequestTrace:
+    # 요청 하나의 stage 별 시간 합계, 토큰 수, 기타 값(검색된 chunk id 등). 배치 평가(evaluate.py)에서 쓴다.
+    # 동시에 실행된 stage(투기적 실행, 스레드풀)도 모두 더한다.
+    def __init__(self):
+        self.stages = {}
+        self.tokens = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, key, duration):
+        with self._lock:
+            self.stages[key] = self.stages.get(key, 0.0) + duration
+
+    def add_tokens(self, kind, count):
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+
+# asyncio task 와 run_blocking 스레드로 이어지도록 contextvar 로 들고 다닌다.
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def trace_request():
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def annotate(name, value):
+    # trace_request 안에서만 기록한다. (서버 요청에서는 아무것도 하지 않음)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.set(name, value)
+
+
+def _trace_key(stage, labels) -> str:
+    return ":".join([stage, *(str(value) for value in labels.values())])
+
+
+class Span:
+    # with span("retrieval"): ... 처럼 감싼 구간의 시간을 stage label 로 기록한다.
+    # 취소(asyncio.CancelledError)된 구간은 기록하지 않는다. (투기적 실행)
+    __slots__ = ("stage", "labels", "start")
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is None:
+            STAGE_SECONDS.observe(duration, stage=self.stage, **self.labels)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add_stage(_trace_key(self.stage, self.labels), duration)
+        elif not issubclass(exc_type, asyncio.CancelledError):
+            STAGE_ERRORS.inc(stage=self.stage, error=exc_type.__name__)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %.1fms %s", self.stage, duration * 1000, self.labels)
+        return False
+
+    def add_tokens(self, messages, completion: str):
+        # 토큰 수는 tracing 이 켜져 있을 때만 센다.
+        prompt = sum(count_tokens(message.get("content") or "") for message in messages)
+        completion = count_tokens(completion)
+        LLM_TOKENS.inc(prompt, stage=self.stage, kind="prompt", **self.labels)
+        LLM_TOKENS.inc(completion, stage=self.stage, kind="completion", **self.labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_tokens("prompt", prompt)
+            trace.add_tokens("completion", completion)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add_tokens(self, messages, completion):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(stage, **labels):
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    return Span(stage, labels)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 에는 없다. (여러 worker 로 띄우는 배포는 linux)
+    fcntl = None
+
+# chroma 폴더 아래에 collection 별로 <NUMPY_STORE_DIR>/<이름> 을 만든다.
+# <이름> 은 실제 파일이 있는 <이름>.v-<pid>-<시각> 폴더를 가리키는 심볼릭 링크라서 링크만 바꾸면 한번에 교체된다.
+NUMPY_STORE_DIR = "numpy_store"
+VECTORS_NAME = "vectors.npy"
+SCALES_NAME = "scales.npy"
+METADATA_NAME = "metadata.json"
+# float16: 정규화 벡터를 그대로 반만 쓰기, int8: 행마다 scale 을 두고 1/4 크기로 양자화
+# float16 -> float32 변환이 느린 CPU 가 많아서 수천 chunk 이상이면 int8 이 더 빠르다. (recall 은 조금 떨어짐)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float16")
+# 한번에 float32 로 바꿔서 곱하는 행 수. 변환한 block 이 CPU cache 에 남아있을 정도로 작게 둔다.
+BLOCK_ROWS = 256
+
+
+def numpy_store_path(persist_directory, name) -> str:
+    return os.path.join(persist_directory, NUMPY_STORE_DIR, name)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@contextmanager
+def file_lock(lock_path):
+    # 여러 프로세스(uvicorn worker, ingest)가 같은 store 를 동시에 만들거나 바꾸지 않도록 lock 파일을 잡는다.
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_store(path, ids, documents, metadatas, embeddings, dtype=VECTOR_STORE_DTYPE):
+    # 새 버전 폴더에 모두 쓴 뒤 path 심볼릭 링크를 바꿔서 교체한다. (rename 이라 읽는 쪽은 예전 것 아니면 새 것만 본다)
+    # 이미 mmap 으로 열어둔 프로세스는 예전 파일을 계속 본다. 바로 전 버전은 지금 여는 중일 수 있어서 하나 남겨둔다.
+    matrix = np.asarray(embeddings, dtype=np.float32) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+    matrix = _normalize_rows(matrix)
+    version = f"{os.getpid()}-{time.time_ns()}"
+    # 다 쓰기 전에는 .tmp- 이름이라서 다른 프로세스의 정리 대상(.v-*)이 되지 않는다.
+    tmp_path = f"{path}.tmp-{version}"
+    version_path = f"{path}.v-{version}"
+    os.makedirs(tmp_path)
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(tmp_path, SCALES_NAME), scales.astype(np.float32))
+        matrix = np.round(matrix / scales[:, None]).astype(np.int8)
+    elif dtype in ("float16", "float32"):
+        matrix = matrix.astype(dtype)
+    else:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise ValueError(f"지원하지 않는 dtype: {dtype}")
+    np.save(os.path.join(tmp_path, VECTORS_NAME), matrix)
+    with open(os.path.join(tmp_path, METADATA_NAME), "w", encoding="utf-8") as f:
+        json.dump({"dtype": dtype, "dim": int(matrix.shape[1]), "ids": list(ids), "documents": list(documents),
+                   "metadatas": [metadata or {} for metadata in metadatas]}, f, ensure_ascii=False)
+
+    with file_lock(f"{path}.swap.lock"):
+        os.replace(tmp_path, version_path)
+        previous = os.path.realpath(path) if os.path.islink(path) else None
+        if os.path.isdir(path) and previous is None:
+            # 예전 방식(폴더 그대로)으로 만든 store 는 한번만 옆으로 옮긴다.
+            previous = f"{path}.v-old-{os.getpid()}"
+            os.replace(path, previous)
+        link_path = f"{path}.link-{os.getpid()}"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        # 상대 경로로 가리켜서 chroma 폴더를 통째로 옮기거나 복사해도 그대로 쓸 수 있다.
+        os.symlink(os.path.basename(version_path), link_path)
+        os.replace(link_path, path)
+        keep = {os.path.realpath(version_path), previous}
+        for old_path in glob.glob(f"{glob.escape(path)}.v-*"):
+            if os.path.realpath(old_path) not in keep:
+                shutil.rmtree(old_path, ignore_errors=True)
+
+
+def export_collection(collection, path, dtype=VECTOR_STORE_DTYPE) -> int:
+    # chroma collection 내용(임베딩, 원문, metadata)을 numpy store 로 옮긴다.
+    result = collection.get(include=["embeddings", "documents", "metadatas"])
+    write_store(path, result["ids"], result["documents"], result["metadatas"], result["embeddings"] or [], dtype)
+    return len(result["ids"])
+
+
+class NumpyVectorStore:
+    # 작은 corpus(수백 chunk)용 brute-force 검색. CollectionHandle 과 같은 메서드를 제공한다.
+    # - 정규화된 임베딩 행렬을 mmap 으로 읽기 전용으로 열어서 uvicorn worker 끼리 page cache 를 같이 쓴다.
+    # - top-k 는 행렬 x 벡터 곱 한번 + argpartition 으로 찾는다. (HNSW index / sqlite 없음)
+    # - 읽기만 하므로 lock 이 필요 없다.
+    def __init__(self, path, embedding):
+        self.name = os.path.basename(path)
+        self.path = path
+        self._embedding = embedding
+        with open(os.path.join(path, METADATA_NAME), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        self.dtype = metadata["dtype"]
+        self.ids = metadata["ids"]
+        self.documents = metadata["documents"]
+        self.metadatas = metadata["metadatas"]
+        # 빈 배열은 mmap 할 수 없다.
+        mmap_mode = "r" if self.ids else None
+        self._matrix = np.load(os.path.join(path, VECTORS_NAME), mmap_mode=mmap_mode)
+        self._scales = np.load(os.path.join(path, SCALES_NAME)) if self.dtype == "int8" else None
+        self._rows = {}
+
+    def _filter_rows(self, filter):
+        # {"category": "sync"} 같은 단순 일치 조건만 지원한다. 결과 행 번호는 filter 별로 기억해둔다.
+        if not filter:
+            return None
+        key = tuple(sorted(filter.items()))
+        rows = self._rows.get(key)
+        if rows is None:
+            rows = np.array([row for row, metadata in enumerate(self.metadatas)
+                             if all(metadata.get(name) == value for name, value in filter.items())], dtype=np.int64)
+            self._rows[key] = rows
+        return rows
+
+    def _scores(self, vector, rows):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        count = len(self.ids) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, count)
+            block = self._matrix[start:end] if rows is None else self._matrix[rows[start:end]]
+            scores[start:end] = block.astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales if rows is None else self._scales[rows]
+        return scores
+
+    def search_with_score_by_vector(self, vector, k: int = 4, filter=None) -> list:
+        # (Document, distance) 목록. chroma 기본값과 같은 squared L2 거리 (정규화 벡터라 2 - 2 * cos)
+        from langchain.schema import Document
+
+        rows = self._filter_rows(filter)
+        count = len(self.ids) if rows is None else len(rows)
+        if not count or k <= 0:
+            return []
+        scores = self._scores(vector, rows)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for index in top:
+            row = int(index) if rows is None else int(rows[index])
+            document = Document(page_content=self.documents[row], metadata=dict(self.metadatas[row]))
+            results.append((document, float(max(0.0, 2.0 - 2.0 * scores[index]))))
+        return results
+
+    def similarity_search_by_vector(self, vector, k: int = 4, filter=None) -> list:
+        return [doc for doc, _ in self.search_with_score_by_vector(vector, k=k, filter=filter)]
+
+    def similarity_search(self, query: str, k: int = 4) -> list:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k=k)
+
+    def get_documents(self) -> dict:
+        return {"ids": list(self.ids), "documents": list(self.documents), "metadatas": list(self.metadatas)}
+
+    def get_embeddings(self, where=None) -> list:
+        rows = self._filter_rows(where)
+        matrix = self._matrix if rows is None else self._matrix[rows]
+        matrix = matrix.astype(np.float32)
+        if self._scales is not None:
+            matrix *= (self._scales if rows is None else self._scales[rows])[:, None]
+        return matrix.tolist()
+
+    def count(self) -> int:
+        return len(self.ids)
@@ -0,0 +1,117 @@
+import re
+from tokenizer import count_tokens, get_encoding
+
+# "기능 | 설명" 과 markdown 의 "| 기능 | 설명 |" 모두 table 행으로 본다.
+TABLE_ROW_PATTERN = re.compile(r"^\|?[^|]+(\|[^|]*)+$")
+LIST_ITEM_PATTERN = re.compile(r"^\s*(\d+[.)]|[-*•])\s*\S")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?다요])\s+")
+HEADER_CELL_MAX_LENGTH = 20
+
+
+def split_blocks(text: str):
+    # 섹션 본문을 (종류, 줄 목록) 블록으로 나눈다.
+    # table: | 로 구분된 연속된 행, item: 번호/기호 목록 한 항목, paragraph: 빈 줄로 구분된 문단
+    blocks = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            if blocks and blocks[-1][0] != "blank":
+                blocks.append(("blank", [""]))
+            continue
+        if TABLE_ROW_PATTERN.match(stripped):
+            kind = "table"
+        elif LIST_ITEM_PATTERN.match(stripped):
+            blocks.append(("item", [stripped]))
+            continue
+        else:
+            kind = "paragraph"
+        if blocks and blocks[-1][0] == kind:
+            blocks[-1][1].append(stripped)
+        elif kind == "paragraph" and blocks and blocks[-1][0] == "item":
+            # 목록 항목 바로 아래 이어지는 줄은 같은 항목으로 본다.
+            blocks[-1][1].append(stripped)
+        else:
+            blocks.append((kind, [stripped]))
+    return blocks
+
+
+def split_long_text(text: str, max_tokens: int):
+    # 하나의 문단/항목이 예산을 넘으면 문장 단위로, 그래도 넘으면 토큰 단위로 자른다.
+    pieces = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        encoding = get_encoding()
+        if encoding is None:
+            pieces.extend(sentence[i:i + max_tokens] for i in range(0, len(sentence), max_tokens))
+        else:
+            tokens = encoding.encode(sentence)
+            pieces.extend(encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens))
+    return pieces
+
+
+def is_table_header(row: str) -> bool:
+    # "기능 | 설명 | 효과" 처럼 칸이 모두 짧으면 헤더 행으로 본다.
+    return all(len(cell.strip()) <= HEADER_CELL_MAX_LENGTH for cell in row.split("|"))
+
+
+def iter_units(blocks, max_tokens: int):
+    # 나눌 수 없는 최소 단위. table 은 행 단위이고, 잘리면 다음 chunk 에 헤더 행을 다시 붙인다.
+    for kind, lines in blocks:
+        if kind == "blank":
+            yield kind, ""
+            continue
+        if kind == "table":
+            for index, row in enumerate(lines):
+                yield "table_header" if index == 0 and is_table_header(row) else "table_row", row
+            continue
+        text = " ".join(lines) if kind == "paragraph" else "\n".join(lines)
+        if count_tokens(text) <= max_tokens:
+            yield kind, text
+        else:
+            for piece in split_long_text(text, max_tokens):
+                yield kind, piece
+
+
+class StructureChunker:
+    # 표의 행과 목록 항목을 자르지 않고 토큰 예산(max_tokens) 안에서 최대한 묶는다.
+    # 각 chunk 앞에는 "문서 > 섹션" breadcrumb 를 붙여서 chunk 만 봐도 어디 내용인지 알 수 있게 한다.
+    def __init__(self, max_tokens=300, min_tokens=60):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+
+    def split_text(self, text: str, breadcrumb: str = "") -> list:
+        prefix = f"[{breadcrumb}]\n" if breadcrumb else ""
+        budget = self.max_tokens - count_tokens(prefix)
+        chunks = []
+        current = []
+        size = 0
+        header = None
+
+        def flush():
+            nonlocal current, size
+            body = "\n".join(current).strip()
+            if body:
+                chunks.append(prefix + body)
+            current, size = [], 0
+
+        for kind, unit in iter_units(split_blocks(text), budget):
+            if kind == "table_header":
+                header = unit
+            elif kind != "table_row":
+                header = None
+            tokens = count_tokens(unit) + 1
+            if current and size + tokens > budget:
+                flush()
+                if kind == "table_row" and header:
+                    current, size = [header], count_tokens(header) + 1
+            # 문단 경계(blank)에서 chunk 가 충분히 크면 끊는다.
+            if kind == "blank":
+                if size >= self.min_tokens:
+                    flush()
+                continue
+            current.append(unit)
+            size += tokens
+        flush()
+        return chunks
@@ -0,0 +1,82 @@
+import re
+from tokenizer import count_tokens, truncate_tokens
+
+# chunker 는 "[문서 > 섹션]\n본문" 으로 만들지만 공백으로 이어진 "[문서 > 섹션] 본문" 도 같이 본다.
+BREADCRUMB_PATTERN = re.compile(r"^\[([^\]\n]+)\]\s+")
+SHINGLE_SIZE = 8
+DUPLICATE_THRESHOLD = 0.8
+MIN_OVERLAP = 10
+MAX_OVERLAP = 200
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def shingles(text: str) -> set:
+    return {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+
+
+def split_breadcrumb(text: str):
+    # "[문서 > 섹션]\n본문" 형태의 chunk 를 (breadcrumb, 본문) 으로 나눈다.
+    match = BREADCRUMB_PATTERN.match(text)
+    if match is None:
+        return "", normalize(text)
+    return match.group(1), normalize(text[match.end():])
+
+
+def trim_overlap(previous: str, text: str) -> str:
+    # 앞 chunk 끝부분과 겹치는 앞부분(chunk_overlap)은 잘라낸다.
+    for size in range(min(len(previous), len(text) - 1, MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].strip()
+    return text
+
+
+def assemble_context(scored_texts, max_tokens: int) -> str:
+    # (텍스트, 점수) 목록을 점수 순으로 보면서 중복/겹치는 chunk 를 빼고 토큰 예산 안에 담는다.
+    # 같은 섹션 chunk 는 breadcrumb 를 한번만 쓰고 본문만 이어 붙여서 짧게 만든다.
+    selected = []
+    used = 0
+    for text, _ in sorted(scored_texts, key=lambda item: item[1], reverse=True):
+        breadcrumb, body = split_breadcrumb(text)
+        if not body:
+            continue
+        body_shingles = shingles(body)
+        duplicate = False
+        for _, other, other_shingles in selected:
+            if body in other or len(body_shingles & other_shingles) / len(body_shingles) >= DUPLICATE_THRESHOLD:
+                duplicate = True
+                break
+            body = trim_overlap(other, body)
+        if duplicate or not body:
+            continue
+
+        cost = count_tokens(body) + (count_tokens(breadcrumb) + 2 if breadcrumb else 0)
+        if used + cost > max_tokens:
+            if selected:
+                continue
+            # 가장 관련 있는 chunk 하나가 예산보다 크면 예산만큼 잘라서라도 넣는다.
+            # breadcrumb 만으로 예산이 차면 breadcrumb 는 빼고 본문만 넣는다. (breadcrumb 일부만 나가지 않게)
+            header_cost = cost - count_tokens(body)
+            if header_cost >= max_tokens:
+                breadcrumb, header_cost = "", 0
+            body = truncate_tokens(body, max_tokens - header_cost)
+            if not body:
+                continue
+            cost = max_tokens
+        selected.append((breadcrumb, body, body_shingles))
+        used += cost
+    return render_context(selected)
+
+
+def render_context(selected) -> str:
+    groups = {}
+    for breadcrumb, body, _ in selected:
+        groups.setdefault(breadcrumb, []).append(body)
+    lines = []
+    for breadcrumb, bodies in groups.items():
+        if breadcrumb:
+            lines.append(f"[{breadcrumb}]")
+        lines.extend(bodies)
+    return "\n".join(lines)
@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from tokenizer import count_tokens
+
+logger = logging.getLogger("LLMClient")
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+class TokenBucket:
+    # 분당 허용량(rate_per_minute)만큼 채워지는 버킷. 부족하면 기다려야 하는 시간을 돌려준다.
+    # 먼저 예약한 요청부터 순서대로 시간이 배정되므로 몰려도 한도를 넘지 않는다.
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class _LoopState:
+    # event loop 마다 따로 가져야 하는 것들 (서버 loop, run_sync, 평가 worker 등 여러 loop 가 같이 쓰는 경우 대비)
+    def __init__(self, loop, max_concurrency, connections):
+        self.loop = loop
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.inflight = {}
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connections))
+
+
+class LLMClient:
+    # 모든 OpenAI chat completion 호출이 거쳐가는 공용 클라이언트
+    # - 연결은 세션 하나로 재사용 (sync: requests, async: aiohttp)
+    # - 요청 수 / 토큰 수 token bucket 으로 분당 한도를 넘지 않게 기다린다.
+    # - 429, 5xx, 연결 오류는 jitter 를 준 지수 백오프로 재시도 (Retry-After 우선)
+    # - deadline(초) 안에 끝나지 않으면 LLMTimeoutError
+    # - 같은 요청이 동시에 들어오면 한번만 호출하고 결과를 나눠준다.
+    def __init__(self, api_key=None, api_base=None, max_concurrency=16, requests_per_minute=3500,
+                 tokens_per_minute=90000, max_retries=5, backoff=0.5, max_backoff=20.0, deadline=60.0):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.stats = {"requests": 0, "retries": 0, "coalesced": 0, "throttled_s": 0.0}
+        self._sync_session = None
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._sync_inflight = {}
+        self._lock = threading.Lock()
+        # loop -> _LoopState. 세션이 loop 를 참조하므로 weak key 로는 지워지지 않는다.
+        # aclose 로 닫거나, 닫힌 loop 의 것은 새 loop 가 생길 때 정리한다.
+        self._loop_states = {}
+
+    @property
+    def url(self):
+        api_base = self.api_base or os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        return f"{api_base.rstrip('/')}/chat/completions"
+
+    @property
+    def headers(self):
+        api_key = self.api_key or os.getenv("API_KEY") or os.getenv("OPENAI_API_KEY", "")
+        return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    def _body(self, messages, params, stream=False):
+        body = {"model": "gpt-3.5-turbo", **params, "messages": messages}
+        if stream:
+            body["stream"] = True
+        return body
+
+    def _throttle_delay(self, body) -> float:
+        # 예상 토큰 = prompt 토큰 + 최대 생성 토큰
+        prompt_tokens = sum(count_tokens(message.get("content") or "") for message in body["messages"])
+        tokens = prompt_tokens + body.get("max_tokens", 256)
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        self._count("throttled_s", delay)
+        return delay
+
+    def _retry_delay(self, attempt, retry_after=None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _remaining(self, expires, deadline) -> float:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"LLM 호출 시간 초과 ({deadline}s)")
+        return remaining
+
+    def _status_error(self, status, text):
+        # 재시도할 수 없는 응답이면 바로 예외, 재시도할 수 있으면 예외 객체를 돌려준다.
+        if status not in RETRY_STATUS:
+            raise LLMError(f"LLM 호출 실패 {status}: {text[:200]}")
+        return LLMError(f"LLM 호출 실패 {status}")
+
+    def _before_retry(self, attempt, error, retry_after, expires, deadline) -> float:
+        # 다음 시도까지 기다릴 시간. 재시도 횟수나 deadline 을 넘으면 예외
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._retry_delay(attempt, retry_after)
+        if time.monotonic() + delay >= expires:
+            raise LLMTimeoutError(f"LLM 호출 시간 초과 ({deadline}s)") from error
+        logger.warning("LLM 재시도 %d/%d (%.2fs 후): %s", attempt + 1, self.max_retries, delay, error)
+        self._count("retries")
+        return delay
+
+    def _count(self, name, amount=1):
+        # 여러 스레드(sync 호출)와 event loop 에서 같이 더하므로 lock 안에서 센다.
+        with self._lock:
+            self.stats[name] += amount
+
+    @staticmethod
+    def _key(body) -> str:
+        return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    # ----------------- async -----------------##
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None:
+            with self._lock:
+                for closed in [other for other in self._loop_states if other.is_closed()]:
+                    # 닫힌 loop 의 세션은 닫을 수 없다. (그래서 asyncio.run 대신 run_sync 를 쓴다)
+                    del self._loop_states[closed]
+                state = self._loop_states[loop] = _LoopState(loop, self.max_concurrency, self.max_concurrency * 2)
+        return state
+
+    async def achat(self, messages, deadline=None, **params) -> dict:
+        # 응답 message(dict) 를 돌려준다. (function_call 포함)
+        body = self._body(messages, params)
+        state = self._state()
+        key = self._key(body)
+        # 같은 요청은 upstream 호출 task 하나를 모두가 shield 해서 기다린다.
+        # 기다리던 쪽 하나가 취소돼도 다른 쪽에는 영향이 없고, 모두 취소됐을 때만 호출을 멈춘다.
+        entry = state.inflight.get(key)
+        if entry is None:
+            task = state.loop.create_task(self._apost(state, body, deadline or self.deadline))
+            entry = state.inflight[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda done: self._finish_inflight(state, key, entry, done))
+        else:
+            self._count("coalesced")
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        finally:
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0 and not entry["task"].done():
+                if state.inflight.get(key) is entry:
+                    del state.inflight[key]
+                entry["task"].cancel()
+
+    @staticmethod
+    def _finish_inflight(state, key, entry, task):
+        if state.inflight.get(key) is entry:
+            del state.inflight[key]
+        # 기다리는 쪽이 없으면 "exception was never retrieved" 경고가 나지 않도록
+        if not task.cancelled():
+            task.exception()
+
+    async def acomplete(self, prompt: str, **params) -> str:
+        message = await self.achat([{"role": "user", "content": prompt}], **params)
+        return message.get("content") or ""
+
+    async def _apost(self, state, body, deadline):
+        expires = time.monotonic() + deadline
+        await asyncio.sleep(self._throttle_delay(body))
+        for attempt in range(self.max_retries + 1):
+            remaining = self._remaining(expires, deadline)
+            retry_after = None
+            try:
+                async with state.semaphore:
+                    self._count("requests")
+                    async with state.session.post(self.url, json=body, headers=self.headers,
+                                                  timeout=aiohttp.ClientTimeout(total=remaining)) as resp:
+                        if resp.status == 200:
+                            return (await resp.json())["choices"][0]["message"]
+                        error = self._status_error(resp.status, await resp.text())
+                        retry_after = resp.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            await asyncio.sleep(self._before_retry(attempt, error, retry_after, expires, deadline))
+
+    async def astream(self, messages, deadline=None, **params):
+        # 생성되는 토큰을 하나씩 흘려보낸다. 첫 토큰을 받기 전에 실패한 경우만 재시도한다.
+        body = self._body(messages, params, stream=True)
+        state = self._state()
+        deadline = deadline or self.deadline
+        expires = time.monotonic() + deadline
+        await asyncio.sleep(self._throttle_delay(body))
+        for attempt in range(self.max_retries + 1):
+            remaining = self._remaining(expires, deadline)
+            retry_after = None
+            started = False
+            try:
+                async with state.semaphore:
+                    self._count("requests")
+                    async with state.session.post(self.url, json=body, headers=self.headers,
+                                                  timeout=aiohttp.ClientTimeout(total=remaining)) as resp:
+                        if resp.status == 200:
+                            async for line in resp.content:
+                                line = line.decode("utf-8").strip()
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    return
+                                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                                if delta:
+                                    started = True
+                                    yield delta
+                            return
+                        error = self._status_error(resp.status, await resp.text())
+                        retry_after = resp.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if started:
+                    raise
+                error = e
+            await asyncio.sleep(self._before_retry(attempt, error, retry_after, expires, deadline))
+
+    async def aclose(self):
+        # 지금 loop 의 세션만 닫는다. (다른 loop 에서 쓰는 세션은 그대로)
+        with self._lock:
+            state = self._loop_states.pop(asyncio.get_running_loop(), None)
+        if state is not None and not state.session.closed:
+            await state.session.close()
+
+    async def warm_up(self, timeout=5.0):
+        # 서버 시작 시 호출: 첫 요청이 DNS / TLS handshake 를 기다리지 않도록 sync, async 세션 둘 다 연결을 맺어둔다.
+        # 응답 내용은 쓰지 않으므로 실패해도 경고만 남긴다.
+        url = self.url.rsplit("/", 1)[0] + "/models"
+
+        async def connect_async():
+            async with self._state().session.get(url, headers=self.headers,
+                                                 timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                await resp.read()
+
+        def connect_sync():
+            self._session().get(url, headers=self.headers, timeout=timeout).close()
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(connect_async(), loop.run_in_executor(None, connect_sync),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("LLM 연결 warm-up 실패: %s", result)
+
+    # ----------------- sync -----------------##
+
+    def _session(self) -> requests.Session:
+        if self._sync_session is None:
+            with self._lock:
+                if self._sync_session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._sync_session = session
+        return self._sync_session
+
+    def chat(self, messages, deadline=None, **params) -> dict:
+        body = self._body(messages, params)
+        key = self._key(body)
+        with self._lock:
+            waiter = self._sync_inflight.get(key)
+            if waiter is None:
+                waiter = self._sync_inflight[key] = {"done": threading.Event()}
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            self._count("coalesced")
+            waiter["done"].wait()
+            if "error" in waiter:
+                raise waiter["error"]
+            return waiter["result"]
+
+        try:
+            waiter["result"] = self._post(body, deadline or self.deadline)
+            return waiter["result"]
+        except BaseException as e:
+            waiter["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._sync_inflight.pop(key, None)
+            waiter["done"].set()
+
+    def complete(self, prompt: str, **params) -> str:
+        message = self.chat([{"role": "user", "content": prompt}], **params)
+        return message.get("content") or ""
+
+    def _post(self, body, deadline):
+        expires = time.monotonic() + deadline
+        time.sleep(self._throttle_delay(body))
+        for attempt in range(self.max_retries + 1):
+            remaining = self._remaining(expires, deadline)
+            retry_after = None
+            try:
+                with self._sync_semaphore:
+                    self._count("requests")
+                    resp = self._session().post(self.url, json=body, headers=self.headers, timeout=remaining)
+                if resp.status_code == 200:
+                    return resp.json()["choices"][0]["message"]
+                error = self._status_error(resp.status_code, resp.text)
+                retry_after = resp.headers.get("Retry-After")
+            except requests.RequestException as e:
+                error = e
+            time.sleep(self._before_retry(attempt, error, retry_after, expires, deadline))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def run_sync(coro):
+    # sync 함수에서 async 파이프라인을 돌릴 때 asyncio.run 대신 사용한다.
+    # loop 가 닫히기 전에 그 loop 에서 만든 aiohttp 세션을 닫아서 호출마다 연결이 남지 않게 한다.
+    async def main():
+        try:
+            return await coro
+        finally:
+            await get_llm_client().aclose()
+
+    return asyncio.run(main())
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+                    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "3500")),
+                    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "90000")),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+                    deadline=float(os.getenv("LLM_DEADLINE", "60")),
+                )
+    return _client
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from tokenizer import count_tokens, get_encoding, truncate_tokens
+
+logger = logging.getLogger("Memory")
+ROLE_LABELS = {"user": "사용자", "assistant": "봇"}
+
+# 대화 한 턴. 토큰 수를 같이 들고 있어서 예산 계산 때 다시 세지 않는다.
+Turn = namedtuple("Turn", ["role", "content", "tokens"])
+
+
+def compact_text(text: str, max_tokens: int) -> str:
+    return truncate_tokens(re.sub(r"\s+", " ", text).strip(), max_tokens)
+
+
+def keep_tail(text: str, max_tokens: int) -> str:
+    # 앞부분을 버리고 뒤(최근) max_tokens 만 남긴다.
+    encoding = get_encoding()
+    if encoding is None:
+        return text[-max_tokens:]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:]).lstrip("\ufffd :/")
+
+
+class Conversation:
+    def __init__(self, summary="", turns=(), updated=None):
+        self.summary = summary
+        self.turns = list(turns)
+        self.updated = updated or time.time()
+        self.lock = threading.Lock()
+        self.compacting = False
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.summary) + sum(turn.tokens for turn in self.turns)
+
+    def to_row(self):
+        return self.summary, json.dumps([[turn.role, turn.content] for turn in self.turns], ensure_ascii=False)
+
+    @classmethod
+    def from_row(cls, summary, turns, updated):
+        return cls(summary, [Turn(role, content, count_tokens(content)) for role, content in json.loads(turns)],
+                   updated)
+
+
+class ConversationStore:
+    # 선택: 재시작 후에도 대화를 이어가도록 sqlite 에 저장한다. (필요한 사용자만 그때그때 읽음)
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation "
+            "(user_id TEXT PRIMARY KEY, summary TEXT, turns TEXT, updated_at REAL)"
+        )
+        self._conn.commit()
+
+    def load(self, user_id, idle_ttl):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, turns, updated_at FROM conversation WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or (idle_ttl and row[2] < time.time() - idle_ttl):
+            return None
+        return Conversation.from_row(*row)
+
+    def save(self, user_id, conversation):
+        summary, turns = conversation.to_row()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversation (user_id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, summary, turns, conversation.updated),
+            )
+            self._conn.commit()
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM conversation WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def prune(self, idle_ttl):
+        with self._lock:
+            self._conn.execute("DELETE FROM conversation WHERE updated_at < ?", (time.time() - idle_ttl,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ConversationMemory:
+    # 사용자(카카오 user.id)별 대화 기록
+    # - 턴은 공백을 줄이고 turn_max_tokens 로 잘라서 저장한다.
+    # - 요약 + 최근 턴이 max_tokens 를 넘으면 오래된 턴부터 summarize 로 요약에 합친다. (최근 keep_turns 개는 그대로)
+    # - 메모리에는 최근 사용한 max_sessions 명만 두고, idle_ttl 동안 말이 없던 대화는 버린다. (LRU)
+    # - db_path 가 있으면 sqlite 에도 저장해서 메모리에서 밀려나거나 재시작해도 이어진다.
+    def __init__(self, summarize=None, max_tokens=600, summary_max_tokens=200, turn_max_tokens=200, keep_turns=2,
+                 max_sessions=1000, idle_ttl=60 * 60, db_path=None):
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.turn_max_tokens = turn_max_tokens
+        self.keep_turns = keep_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.store = ConversationStore(db_path) if db_path else None
+        self.evictions = 0
+        self.summaries = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, user_id, create=True):
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            conversation = self._sessions.get(user_id)
+            if conversation is not None:
+                if not self._expired(conversation, now):
+                    self._sessions.move_to_end(user_id)
+                    return conversation
+                del self._sessions[user_id]
+                self.evictions += 1
+
+        conversation = self.store.load(user_id, self.idle_ttl) if self.store else None
+        if conversation is None:
+            if not create:
+                return None
+            conversation = Conversation()
+        with self._lock:
+            # 다른 스레드가 먼저 올려뒀으면 그걸 쓴다.
+            conversation = self._sessions.setdefault(user_id, conversation)
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        return conversation
+
+    def _expired(self, conversation, now):
+        return self.idle_ttl and conversation.updated < now - self.idle_ttl
+
+    def _evict_idle(self, now):
+        # 가장 오래 안 쓴 대화부터 보면서 idle_ttl 이 지난 것들을 버린다.
+        while self._sessions:
+            user_id, conversation = next(iter(self._sessions.items()))
+            if not self._expired(conversation, now):
+                break
+            del self._sessions[user_id]
+            self.evictions += 1
+
+    def messages(self, user_id) -> list:
+        # chat completion messages 형태 (요약은 system 메시지)
+        conversation = self._get(user_id, create=False)
+        if conversation is None:
+            return []
+        with conversation.lock:
+            messages = [{"role": "system", "content": f"이전 대화 요약: {conversation.summary}"}] \
+                if conversation.summary else []
+            messages.extend({"role": turn.role, "content": turn.content} for turn in conversation.turns)
+        return messages
+
+    def render(self, user_id) -> str:
+        # prompt 템플릿에 넣는 텍스트 형태
+        conversation = self._get(user_id, create=False)
+        if conversation is None:
+            return ""
+        with conversation.lock:
+            lines = [f"(요약) {conversation.summary}"] if conversation.summary else []
+            lines.extend(f"{ROLE_LABELS.get(turn.role, turn.role)}: {turn.content}" for turn in conversation.turns)
+        return "\n".join(lines)
+
+    def append(self, user_id, role, content):
+        content = compact_text(content, self.turn_max_tokens)
+        if not content:
+            return
+        conversation = self._get(user_id)
+        with conversation.lock:
+            conversation.turns.append(Turn(role, content, count_tokens(content)))
+            conversation.updated = time.time()
+            if self.store:
+                self.store.save(user_id, conversation)
+
+    def record(self, user_id, question, answer, compact=True):
+        # 질문/답변 한 쌍을 저장하고 예산을 넘으면 요약한다. (답변을 보낸 뒤에 호출)
+        # compact=False 면 저장만 하고 요약(LLM 호출)은 호출한 쪽에서 따로 compact 를 부른다.
+        self.append(user_id, "user", question)
+        self.append(user_id, "assistant", answer)
+        if compact:
+            self.compact(user_id)
+
+    def compact(self, user_id):
+        conversation = self._get(user_id, create=False)
+        if conversation is None:
+            return
+        with conversation.lock:
+            if conversation.compacting or conversation.tokens <= self.max_tokens \
+                    or len(conversation.turns) <= self.keep_turns:
+                return
+            # 최근 keep_turns 개만 남기고 나머지를 요약으로 합친다.
+            old = conversation.turns[:len(conversation.turns) - self.keep_turns]
+            summary = conversation.summary
+            conversation.compacting = True
+        try:
+            # 요약(LLM 호출)하는 동안에도 같은 사용자의 다음 요청이 기다리지 않도록 lock 밖에서 한다.
+            history = "\n".join(f"{ROLE_LABELS.get(turn.role, turn.role)}: {turn.content}" for turn in old)
+            summary = self._summarize(summary, history)
+        finally:
+            with conversation.lock:
+                conversation.compacting = False
+        with conversation.lock:
+            conversation.summary = summary
+            conversation.turns = conversation.turns[len(old):]
+            self.summaries += 1
+            if self.store:
+                self.store.save(user_id, conversation)
+
+    def _summarize(self, summary, history) -> str:
+        if self.summarize is not None:
+            try:
+                return compact_text(self.summarize(summary, history), self.summary_max_tokens)
+            except Exception:
+                logger.exception("대화 요약 실패, 기본 요약 사용")
+        # 요약 함수가 없거나 실패하면 턴마다 앞부분만 이어 붙이고, 최근 내용이 남도록 뒤에서부터 자른다.
+        lines = [summary] + [truncate_tokens(line, 40) for line in history.splitlines()]
+        return keep_tail(" / ".join(line for line in lines if line), self.summary_max_tokens)
+
+    def clear(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+        if self.store:
+            self.store.delete(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "evictions": self.evictions,
+            "summaries": self.summaries,
+        }
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_memory(summarize=None) -> ConversationMemory:
+    # summarize 함수를 넘기면 (이미 만들어져 있어도) 그 함수를 쓴다.
+    # 인자 없이 먼저 부른 곳(/metrics 등)이 있어도 요약이 꺼지지 않게 한다.
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = ConversationMemory(
+                    summarize=summarize,
+                    max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "600")),
+                    max_sessions=int(os.getenv("MEMORY_MAX_SESSIONS", "1000")),
+                    idle_ttl=float(os.getenv("MEMORY_IDLE_TTL", "3600")),
+                    db_path=os.getenv("MEMORY_DB_PATH") or None,
+                )
+    if summarize is not None:
+        _memory.summarize = summarize
+    return _memory
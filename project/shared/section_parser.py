@@ -0,0 +1,69 @@
+import os
+import re
+from collections import namedtuple
+
+# "#시작하기", "# 과정 예시", "## Step 1" 처럼 줄 맨 앞의 # 을 제목으로 본다.
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]*(\S[^\n]*?)[ \t]*$")
+HEADING_MAX_LENGTH = 60
+DEFAULT_SECTION = "제목"
+
+Section = namedtuple("Section", ["file", "section_path", "offset", "text"])
+
+
+def parse_heading(line: str):
+    # (깊이, 제목) 을 돌려준다. 제목이 아니면 None
+    match = HEADING_PATTERN.match(line)
+    if match is None or len(match.group(2)) > HEADING_MAX_LENGTH:
+        return None
+    return len(match.group(1)), match.group(2)
+
+
+def iter_sections(filepath, max_chars=4000):
+    # 파일을 한 줄씩 읽으면서 섹션이 끝날 때마다 바로 흘려보낸다.
+    # 같은 제목이 여러 번 나와도 각각 따로 나오고, max_chars 보다 긴 섹션은 줄 단위로 나눠서 내보내므로
+    # 파일 크기와 상관없이 메모리 사용량이 일정하다.
+    # offset 은 해당 텍스트가 시작하는 파일의 byte 위치
+    file = os.path.basename(filepath)
+    # (깊이, 제목) 목록. 첫 제목이 나오기 전 내용은 기본 섹션으로 묶는다.
+    path = [(0, DEFAULT_SECTION)]
+    lines = []
+    size = 0
+    start = 0
+    position = 0
+
+    def flush():
+        text = "".join(lines).strip()
+        if text:
+            return Section(file, " > ".join(title for _, title in path), start, text)
+
+    with open(filepath, "rb") as f:
+        for raw in f:
+            line = raw.decode("utf-8")
+            heading = parse_heading(line.rstrip("\r\n"))
+            if heading is not None or size >= max_chars:
+                section = flush()
+                if section:
+                    yield section
+                lines, size = [], 0
+                start = position
+                if heading is not None:
+                    # 기본 섹션과 자기보다 깊거나 같은 단계의 제목은 닫는다.
+                    while path and (path[-1][0] == 0 or path[-1][0] >= heading[0]):
+                        path.pop()
+                    path.append(heading)
+                    start = position + len(raw)
+            if heading is None:
+                lines.append(line)
+                size += len(line)
+            position += len(raw)
+
+    section = flush()
+    if section:
+        yield section
+
+
+def iter_dataset_sections(dir_path, max_chars=4000):
+    # 폴더 안의 모든 txt 파일 섹션을 파일 이름 순서대로 흘려보낸다.
+    for file in sorted(os.listdir(dir_path)):
+        if file.endswith(".txt"):
+            yield from iter_sections(os.path.join(dir_path, file), max_chars=max_chars)
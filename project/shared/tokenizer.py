@@ -0,0 +1,42 @@
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("Tokenizer")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name="cl100k_base"):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # 오프라인이거나 BPE 파일 캐시(TIKTOKEN_CACHE_DIR)가 없으면 내려받다가 실패한다.
+        # 토큰 수는 chunk / context 예산, 호출 한도 계산에만 쓰므로 대략 센 값으로 계속한다. (한번만 시도)
+        logger.warning("tiktoken %s 을 불러오지 못해 대략적인 토큰 수를 사용합니다.", name, exc_info=True)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        # tiktoken 이 없으면 한글 기준으로 대략 글자 수 만큼
+        return len(text)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
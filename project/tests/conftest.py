@@ -0,0 +1,11 @@
+import os
+import sys
+
+# chatbot 폴더와 shared 폴더의 모듈은 패키지가 아니라 바로 import 한다. (서버 실행과 같은 방식)
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, "chatbot_3"))
+sys.path.append(os.path.join(PROJECT_DIR, "shared"))
+
+# chatbot_3 는 import 할 때 키 환경 변수가 있는지 확인한다. (테스트에서 실제 API 는 호출하지 않음)
+for name in ["API_KEY", "OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"]:
+    os.environ.setdefault(name, "test")
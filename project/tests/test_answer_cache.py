@@ -0,0 +1,69 @@
+import os
+import pytest
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "DATASET_DIR", str(tmp_path))
+    path = tmp_path / "project_data_kakao_sync.txt"
+    path.write_text("카카오싱크:\n", encoding="utf-8")
+    return path
+
+
+def test_lookup_hits_only_above_threshold(dataset):
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("sync", [1.0, 0.0], "카카오싱크 답변")
+    # 크기는 상관없이 방향(코사인 유사도)만 본다.
+    assert cache.lookup("sync", [3.0, 0.1]) == "카카오싱크 답변"
+    assert cache.lookup("sync", [1.0, 1.0]) is None
+    # intent 가 다르면 비슷해도 쓰지 않는다.
+    assert cache.lookup("social", [1.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_lookup_returns_closest_answer(dataset):
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("sync", [1.0, 0.0, 0.0], "첫 번째")
+    cache.store("sync", [0.0, 1.0, 0.0], "두 번째")
+    assert cache.lookup("sync", [0.1, 1.0, 0.0]) == "두 번째"
+    cache.store("sync", [0.0, 0.0, 1.0], "세 번째")
+    assert cache.lookup("sync", [1.0, 0.0, 0.1]) == "첫 번째"
+
+
+def test_least_recently_used_answer_is_evicted(dataset):
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    cache.store("sync", [1.0, 0.0, 0.0], "a")
+    cache.store("sync", [0.0, 1.0, 0.0], "b")
+    assert cache.lookup("sync", [1.0, 0.0, 0.0]) == "a"
+    cache.store("sync", [0.0, 0.0, 1.0], "c")
+    assert cache.lookup("sync", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("sync", [1.0, 0.0, 0.0]) == "a"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_changed_dataset_invalidates_answers(dataset):
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("sync", [1.0, 0.0], "이전 답변")
+    assert cache.lookup("sync", [1.0, 0.0]) == "이전 답변"
+
+    dataset.write_text("카카오싱크:\n#새 섹션\n내용이 바뀌었습니다.\n", encoding="utf-8")
+    stat = os.stat(dataset)
+    os.utime(dataset, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.lookup("sync", [1.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidate_drops_one_intent_or_all(dataset):
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("sync", [1.0, 0.0], "싱크")
+    cache.store("social", [1.0, 0.0], "소셜")
+    cache.invalidate("sync")
+    assert cache.lookup("sync", [1.0, 0.0]) is None
+    assert cache.lookup("social", [1.0, 0.0]) == "소셜"
+    cache.invalidate()
+    assert cache.lookup("social", [1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
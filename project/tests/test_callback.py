@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import callback
+from streaming import ContinuationStore
+
+
+def make_request(user_id="user"):
+    return SimpleNamespace(userRequest=SimpleNamespace(
+        utterance="카카오싱크가 뭐야?", callbackUrl="http://callback", user=SimpleNamespace(id=user_id)))
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    posted = []
+
+    async def post_callback(request, payload):
+        posted.append(payload)
+
+    store = ContinuationStore()
+    monkeypatch.setattr(callback, "post_callback", post_callback)
+    monkeypatch.setattr(callback, "get_continuations", lambda: store)
+    monkeypatch.setattr(callback, "CALLBACK_MIN_CHARS", 10)
+    monkeypatch.setattr(callback, "CALLBACK_DEADLINE", 0.2)
+    return posted
+
+
+def use_generator(monkeypatch, generate):
+    async def generate_answer_async(utterance, answer_stream, user_id):
+        await generate(answer_stream)
+
+    monkeypatch.setattr(callback, "generate_answer_async", generate_answer_async)
+
+
+def text_of(payload):
+    return payload["template"]["outputs"][0]["simpleText"]["text"]
+
+
+def test_short_answer_is_posted_whole(monkeypatch, posted):
+    async def generate(stream):
+        stream.feed("카카오싱크는 간편가입 서비스입니다.")
+        stream.finish()
+
+    use_generator(monkeypatch, generate)
+    asyncio.run(callback.callback_handler(make_request()))
+    assert text_of(posted[0]) == "카카오싱크는 간편가입 서비스입니다."
+    assert "quickReplies" not in posted[0]["template"]
+
+
+def test_first_sentence_is_posted_early_and_the_rest_is_continued(monkeypatch, posted):
+    async def generate(stream):
+        stream.feed("카카오싱크는 간편가입 서비스입니다. ")
+        await asyncio.sleep(0.05)
+        stream.feed("로그인도 지원합니다.")
+        stream.finish()
+
+    async def main():
+        await callback.callback_handler(make_request())
+        return await callback.continue_handler(make_request())
+
+    use_generator(monkeypatch, generate)
+    rest = asyncio.run(main())
+    assert text_of(posted[0]) == "카카오싱크는 간편가입 서비스입니다."
+    assert "quickReplies" in posted[0]["template"]
+    assert text_of(rest) == " 로그인도 지원합니다."
+    assert "quickReplies" not in rest["template"]
+
+
+def test_nothing_by_the_deadline_posts_a_pending_message(monkeypatch, posted):
+    async def generate(stream):
+        await asyncio.sleep(0.3)
+        stream.feed("늦은 답변입니다.")
+        stream.finish()
+
+    async def main():
+        await callback.callback_handler(make_request())
+        return await callback.continue_handler(make_request())
+
+    use_generator(monkeypatch, generate)
+    rest = asyncio.run(main())
+    assert text_of(posted[0]) == callback.PENDING_MESSAGE
+    assert "quickReplies" in posted[0]["template"]
+    assert text_of(rest) == "늦은 답변입니다."
+
+
+def test_generation_failure_still_posts_the_callback(monkeypatch, posted):
+    async def generate(stream):
+        await asyncio.sleep(0.01)
+        error = RuntimeError("LLM 실패")
+        stream.fail(error)
+        raise error
+
+    use_generator(monkeypatch, generate)
+    with pytest.raises(RuntimeError):
+        asyncio.run(callback.callback_handler(make_request()))
+    assert len(posted) == 1
+    assert text_of(posted[0]) == callback.ERROR_MESSAGE
+    assert "quickReplies" not in posted[0]["template"]
+
+
+def test_continue_without_a_stored_answer_returns_none(posted):
+    assert asyncio.run(callback.continue_handler(make_request("nobody"))) is None
@@ -0,0 +1,21 @@
+import pytest
+from chunker import StructureChunker, split_blocks
+
+
+@pytest.mark.parametrize("table", [
+    ["기능 | 설명 | 효과", "간편가입 | 카카오 계정으로 가입 | 전환율 상승", "동의 관리 | 약관 동의 통합 | 관리 편의"],
+    ["| 기능 | 설명 | 효과 |", "|---|---|---|", "| 간편가입 | 카카오 계정으로 가입 | 전환율 상승 |"],
+])
+def test_table_rows_are_one_block(table):
+    blocks = split_blocks("\n".join(["카카오싱크 기능 소개", ""] + table))
+    assert [kind for kind, _ in blocks] == ["paragraph", "blank", "table"]
+    assert blocks[-1][1] == table
+
+
+def test_markdown_table_rows_are_not_split():
+    rows = [f"| 기능{i} | 설명이 조금 긴 항목 {i} 입니다 | 효과 {i} |" for i in range(30)]
+    chunks = StructureChunker(max_tokens=80).split_text("\n".join(["| 기능 | 설명 | 효과 |"] + rows))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        for line in chunk.splitlines():
+            assert line == "| 기능 | 설명 | 효과 |" or line in rows
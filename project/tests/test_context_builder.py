@@ -0,0 +1,42 @@
+from context_builder import assemble_context
+from tokenizer import count_tokens
+
+LONG_BREADCRUMB = " > ".join("가나다라마바사아자차"[i] * 6 for i in range(8))
+
+
+def test_two_chunks_of_one_section_share_the_breadcrumb():
+    context = assemble_context([
+        ("[카카오싱크 > 기능]\n간편가입으로 회원가입 단계를 줄일 수 있습니다.", 0.9),
+        ("[카카오싱크 > 기능]\n약관 동의를 한번에 받을 수 있습니다.", 0.8),
+    ], 200)
+    assert context.count("[카카오싱크 > 기능]") == 1
+    assert context.index("간편가입") < context.index("약관 동의")
+
+
+def test_duplicate_chunk_is_dropped():
+    text = "[카카오싱크 > 기능]\n간편가입으로 회원가입 단계를 줄일 수 있습니다."
+    assert assemble_context([(text, 0.9), (text, 0.8)], 200).count("간편가입") == 1
+
+
+def test_breadcrumb_larger_than_budget_is_dropped():
+    context = assemble_context([(f"[{LONG_BREADCRUMB}]\n본문 내용입니다. 카카오싱크 간편가입 설명", 1.0)], 3)
+    assert context
+    assert "[" not in context
+    assert "본문 내용입니다. 카카오싱크 간편가입 설명".startswith(context)
+    assert count_tokens(context) <= 3
+
+
+def test_breadcrumb_on_the_same_line_is_not_emitted_as_a_fragment():
+    context = assemble_context([("[a > b > c > d > e > f > g > h] 본문 내용입니다", 1.0)], 3)
+    assert context and "[" not in context and ">" not in context
+
+
+def test_oversized_first_chunk_is_truncated_to_budget():
+    body = "카카오싱크 간편가입 설명 " * 50
+    context = assemble_context([(f"[카카오싱크]\n{body}", 1.0)], 40)
+    assert context.startswith("[카카오싱크]\n")
+    assert count_tokens(context) <= 40 + 2
+
+
+def test_zero_budget_gives_empty_context():
+    assert assemble_context([("[카카오싱크]\n본문", 1.0)], 0) == ""
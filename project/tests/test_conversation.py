@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import chatbot_3
+from memory import ConversationMemory
+
+
+@pytest.mark.parametrize("question", [
+    "그거 가격은 얼마야?",
+    "방금 말한 기능 더 자세히 알려줘",
+    "그럼 설정은 어떻게 해?",
+    "얼마야?",
+])
+def test_follow_up_questions_depend_on_history(question):
+    assert chatbot_3.depends_on_history(question)
+
+
+@pytest.mark.parametrize("question", [
+    "카카오싱크 기능이 무엇이 있는지 설명해주세요",
+    "카카오톡 채널 고객 관리에 대해 알려주세요",
+    "검색 범위에 포함되는 항목은 뭐야?",
+])
+def test_self_contained_questions_do_not_depend_on_history(question):
+    assert not chatbot_3.depends_on_history(question)
+
+
+@pytest.fixture
+def precomputed_hit(monkeypatch):
+    looked_up = []
+
+    async def lookup_precomputed(param):
+        looked_up.append(param)
+        return SimpleNamespace(intent="sync", answer="미리 만든 답변")
+
+    monkeypatch.setattr(chatbot_3, "lookup_precomputed", lookup_precomputed)
+    return looked_up
+
+
+def test_returning_user_still_gets_precomputed_answer(precomputed_hit):
+    result = asyncio.run(chatbot_3.run_pipeline(
+        "카카오싱크 기능이 무엇이 있는지 설명해주세요", chat_history="사용자: 안녕"))
+    assert result["source"] == "precomputed"
+    assert precomputed_hit
+
+
+def test_follow_up_skips_precomputed_answer(monkeypatch, precomputed_hit):
+    class Stop(Exception):
+        pass
+
+    def get_runtime():
+        raise Stop()
+
+    monkeypatch.setattr(chatbot_3, "get_runtime", get_runtime)
+    with pytest.raises(Stop):
+        asyncio.run(chatbot_3.run_pipeline("그거 가격은 얼마야?", chat_history="사용자: 카카오싱크가 뭐야?"))
+    assert not precomputed_hit
+
+
+def test_summary_runs_after_answer_is_returned(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def summarize(summary, history):
+        started.set()
+        release.wait(5)
+        return "요약"
+
+    memory = ConversationMemory(summarize=summarize, max_tokens=20, keep_turns=1)
+    monkeypatch.setattr(chatbot_3, "get_memory", lambda summarize=None: memory)
+
+    async def _generate_answer(param, answer_stream, chat_history=""):
+        return "카카오싱크는 간편가입 서비스입니다. " * 3
+
+    monkeypatch.setattr(chatbot_3, "_generate_answer", _generate_answer)
+    try:
+        answer = asyncio.run(chatbot_3.generate_answer_async("카카오싱크가 뭐야?", user_id="user"))
+        assert answer.startswith("카카오싱크는")
+        assert started.wait(5)
+        assert memory.stats()["summaries"] == 0
+    finally:
+        release.set()
+    deadline = time.time() + 5
+    while memory.stats()["summaries"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert memory.render("user").startswith("(요약) 요약")
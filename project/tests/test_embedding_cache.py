@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+import pytest
+import embedding_cache
+from embedding_cache import CachedEmbeddings, DiskCache, LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(monotonic=clock.monotonic, time=clock.time))
+    return clock
+
+
+class CountingEmbedding:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = LRUCache(max_size=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_lru_entries_expire_after_ttl(clock):
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.evictions == 1
+    assert len(cache) == 0
+
+
+def test_disk_cache_keeps_newest_max_entries(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=3, ttl=None, prune_interval=1)
+    for index in range(5):
+        clock.now += 1
+        cache.set(f"key-{index}", [float(index)])
+    assert len(cache) == 3
+    assert cache.get("key-0") is None
+    assert cache.get("key-1") is None
+    assert cache.get("key-4") == [4.0]
+    assert cache.evictions == 2
+
+
+def test_disk_cache_expires_and_prunes_on_open(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path, ttl=60)
+    cache.set("old", [1.0])
+    clock.now += 61
+    assert cache.get("old") is None
+    cache.close()
+    # 다시 열 때 만료된 것은 지운다.
+    reopened = DiskCache(path, ttl=60)
+    assert len(reopened) == 0
+    assert reopened.evictions == 1
+    reopened.close()
+
+
+def test_cached_embeddings_normalize_text_and_embed_only_misses(tmp_path, clock):
+    embedding = CountingEmbedding()
+    cached = CachedEmbeddings(embedding, namespace="test")
+    vector = cached.embed_query("카카오싱크  기능은?")
+    assert cached.embed_query(" 카카오싱크 기능은? ") == vector
+    assert cached.embed_documents(["카카오싱크 기능은?", "새 문장"]) == [vector, [4.0, 1.0]]
+    assert embedding.calls == [["카카오싱크  기능은?"], ["새 문장"]]
+    assert cached.stats()["hits"] == 2
+    assert cached.stats()["misses"] == 2
+
+
+def test_disk_cache_survives_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    first = CachedEmbeddings(CountingEmbedding(), namespace="test", disk_path=path)
+    vector = first.embed_query("카카오싱크")
+    first.disk.close()
+
+    embedding = CountingEmbedding()
+    second = CachedEmbeddings(embedding, namespace="test", disk_path=path)
+    assert second.embed_query("카카오싱크") == vector
+    assert embedding.calls == []
+    assert second.stats()["disk_hits"] == 1
+    # namespace(임베딩 모델)가 다르면 공유하지 않는다.
+    other = CachedEmbeddings(embedding, namespace="other", disk_path=path)
+    other.embed_query("카카오싱크")
+    assert embedding.calls == [["카카오싱크"]]
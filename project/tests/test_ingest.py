@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import chromadb
+import pytest
+from langchain.schema import Document
+import ingest
+from ingest import MANIFEST_NAME, EmbeddingEngine, chunk_id, ingest_documents
+from lexical_index import LEXICAL_INDEX_NAME, LexicalIndex
+from retrieval import UNIFIED_COLLECTION_NAME
+from vector_store import NumpyVectorStore, numpy_store_path
+
+
+class FakeEmbedding:
+    # 내용 hash 로 만든 고정 벡터. 임베딩한 문장을 기록한다.
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:8]]
+
+
+def document(category, section, text):
+    return Document(page_content=text, metadata={
+        "category": category, "section": section, "source": f"project_data_kakao_{category}.txt"})
+
+
+FIRST = [
+    document("sync", "기능 소개", "카카오싱크는 간편가입 서비스입니다."),
+    document("sync", "설정하기", "앱 설정에서 카카오싱크를 켭니다."),
+    document("channel", "기능 소개", "카카오톡 채널은 메시지를 보냅니다."),
+]
+
+
+@pytest.fixture
+def persist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "VECTOR_BACKEND", "numpy")
+    return str(tmp_path / "chroma")
+
+
+def run(persist_dir, documents, embedding):
+    return ingest_documents(iter(documents), persist_directory=persist_dir, embedding=embedding, batch_size=2,
+                            max_workers=2)
+
+
+def stored_ids(persist_dir):
+    collection = chromadb.PersistentClient(path=persist_dir).get_collection(UNIFIED_COLLECTION_NAME)
+    return set(collection.get()["ids"])
+
+
+def test_chunk_id_depends_on_source_section_and_content():
+    base = chunk_id(FIRST[0].metadata, FIRST[0].page_content)
+    assert base == chunk_id(dict(FIRST[0].metadata), FIRST[0].page_content)
+    assert base != chunk_id(FIRST[1].metadata, FIRST[0].page_content)
+    assert base != chunk_id(FIRST[0].metadata, FIRST[0].page_content + " ")
+
+
+def test_rerun_embeds_only_changed_chunks(persist_dir):
+    embedding = FakeEmbedding()
+    result = run(persist_dir, FIRST, embedding)
+    assert (result["added"], result["removed"], result["unchanged"]) == (3, 0, 0)
+    assert result["categories"] == ["channel", "sync"]
+    first_ids = {chunk_id(doc.metadata, doc.page_content) for doc in FIRST}
+    assert stored_ids(persist_dir) == first_ids
+
+    # 같은 데이터로 다시 돌리면 아무것도 임베딩하지 않는다.
+    embedding = FakeEmbedding()
+    result = run(persist_dir, FIRST, embedding)
+    assert (result["added"], result["removed"], result["unchanged"]) == (0, 0, 3)
+    assert embedding.embedded == []
+
+    # 하나는 바뀌고, 하나는 지워지고, 하나는 새로 생긴 데이터
+    changed = document("sync", "설정하기", "내 애플리케이션 > 카카오 로그인에서 카카오싱크를 켭니다.")
+    added = document("social", "기능 소개", "카카오톡 소셜은 친구 목록을 제공합니다.")
+    second = [FIRST[0], changed, added]
+    embedding = FakeEmbedding()
+    result = run(persist_dir, second, embedding)
+    assert (result["added"], result["removed"], result["unchanged"]) == (2, 2, 1)
+    assert sorted(embedding.embedded) == sorted([changed.page_content, added.page_content])
+    assert result["categories"] == ["channel", "social", "sync"]
+
+    second_ids = {chunk_id(doc.metadata, doc.page_content) for doc in second}
+    assert stored_ids(persist_dir) == second_ids
+    with open(os.path.join(persist_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        assert set(json.load(f)["chunks"]) == second_ids
+    lexical_index = LexicalIndex(os.path.join(persist_dir, LEXICAL_INDEX_NAME)).load()
+    assert set(lexical_index.documents) == second_ids
+    store = NumpyVectorStore(numpy_store_path(persist_dir, UNIFIED_COLLECTION_NAME), embedding)
+    assert store.count() == 3
+
+
+def test_duplicate_chunks_are_embedded_once(persist_dir):
+    embedding = FakeEmbedding()
+    result = run(persist_dir, FIRST + [FIRST[0]], embedding)
+    assert result["added"] == 3
+    assert len(embedding.embedded) == 3
+
+
+def test_failed_run_resumes_from_saved_chunks(persist_dir, monkeypatch):
+    class FailingEmbedding(FakeEmbedding):
+        def embed_documents(self, texts):
+            if any("채널" in text for text in texts):
+                raise RuntimeError("임베딩 서버 오류")
+            return super().embed_documents(texts)
+
+    # 재시도 없이 바로 실패하게 하고, 앞 batch 가 먼저 저장되도록 worker 는 하나만 쓴다.
+    monkeypatch.setattr(ingest, "EmbeddingEngine", lambda embedding, max_workers: EmbeddingEngine(
+        embedding, max_workers=1, max_retries=0))
+    with pytest.raises(RuntimeError):
+        run(persist_dir, FIRST, FailingEmbedding())
+    monkeypatch.setattr(ingest, "EmbeddingEngine", EmbeddingEngine)
+
+    embedding = FakeEmbedding()
+    result = run(persist_dir, FIRST, embedding)
+    assert result["added"] == 1
+    assert embedding.embedded == [FIRST[2].page_content]
@@ -0,0 +1,70 @@
+import zlib
+import numpy as np
+import pytest
+from intent_classifier import NONE_INTENT, IntentClassifier
+
+DIMENSION = 512
+
+
+class FakeEmbedding:
+    # ada-002 처럼 관계없는 문장끼리도 유사도가 0.8 정도 나오게, 공통 방향에 글자 bigram 해시 벡터를 더한다.
+    def embed_query(self, text):
+        base = np.zeros(DIMENSION, dtype=np.float32)
+        base[0] = 1.0
+        bag = np.zeros(DIMENSION, dtype=np.float32)
+        compact = text.replace(" ", "")
+        for i in range(len(compact) - 1):
+            bag[1 + zlib.crc32(compact[i:i + 2].encode()) % (DIMENSION - 1)] += 1.0
+        bag /= np.linalg.norm(bag) or 1.0
+        return (0.91 * base + 0.41 * bag).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeRegistry:
+    embedding = FakeEmbedding()
+
+    def category_embeddings(self, intent):
+        return []
+
+
+INTENT_TABLE = {
+    "sync": "카카오싱크 간편 회원가입 로그인 서비스, 카카오 계정으로 로그인 연동",
+    "channel": "카카오톡 채널 친구 관리 메시지 발송 채팅 상담",
+    "social": "카카오 소셜 광고 플랫폼 타겟팅 광고 집행 성과 측정",
+}
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(INTENT_TABLE, FakeRegistry())
+
+
+@pytest.mark.parametrize("question", [
+    "내일 서울 날씨 어때?",
+    "저녁 메뉴 추천해줘",
+    "요즘 볼 만한 영화 추천해줘",
+    "비트코인 시세 알려줘",
+])
+def test_off_domain_question_goes_to_none(classifier, question):
+    intent, score, confident = classifier.classify(question)
+    assert (intent, confident) == (NONE_INTENT, True)
+    # 관계없는 질문도 인텐트 점수는 threshold 를 넘는다. (None 클래스가 없으면 그대로 확신했을 점수)
+    assert max(classifier.scores(question)[name] for name in INTENT_TABLE) >= classifier.threshold
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("카카오싱크 로그인 연동하려면 어떻게 해?", "sync"),
+    ("카카오톡 채널 친구 메시지 발송 방법", "channel"),
+    ("카카오 소셜 광고 타겟팅 설정", "social"),
+])
+def test_in_domain_question_is_confident(classifier, question, expected):
+    intent, score, confident = classifier.classify(question)
+    assert intent == expected
+    assert confident
+
+
+def test_without_off_domain_examples_there_is_no_none_score():
+    classifier = IntentClassifier(INTENT_TABLE, FakeRegistry(), off_domain_examples=[])
+    assert NONE_INTENT not in classifier.scores("내일 서울 날씨 어때?")
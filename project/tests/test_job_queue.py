@@ -0,0 +1,137 @@
+import asyncio
+from job_queue import JobQueue, LatencyWindow
+
+
+async def drain(queue, timeout=2.0):
+    # 넣은 작업이 모두 끝날 때까지 돌리고 worker 를 멈춘다.
+    queue.start()
+
+    async def finished():
+        while queue.counts["completed"] + queue.counts["failed"] + queue.counts["expired"] < queue.counts["submitted"]:
+            await asyncio.sleep(0.001)
+
+    try:
+        await asyncio.wait_for(finished(), timeout)
+    finally:
+        await queue.stop()
+
+
+def test_users_are_served_round_robin():
+    handled = []
+
+    async def handler(job):
+        handled.append(job)
+
+    async def main():
+        queue = JobQueue(handler, workers=1, max_per_user=3)
+        for job in ["a1", "a2", "a3"]:
+            assert queue.submit("a", job)
+        assert queue.submit("b", "b1")
+        assert queue.submit("c", "c1")
+        await drain(queue)
+
+    asyncio.run(main())
+    assert handled == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_submit_rejects_over_per_user_limit():
+    async def main():
+        queue = JobQueue(lambda job: asyncio.sleep(0), workers=1, max_per_user=2)
+        assert queue.submit("a", 1)
+        assert queue.submit("a", 2)
+        assert not queue.submit("a", 3)
+        # 다른 사용자는 영향을 받지 않는다.
+        assert queue.submit("b", 1)
+        assert queue.counts["rejected"] == 1
+        await drain(queue)
+        # 줄이 비면 같은 사용자도 다시 넣을 수 있다.
+        assert queue.submit("a", 4)
+
+    asyncio.run(main())
+
+
+def test_submit_rejects_when_queue_is_full():
+    queue = JobQueue(lambda job: asyncio.sleep(0), max_depth=3, max_per_user=10)
+    assert all(queue.submit(f"user-{index}", index) for index in range(3))
+    assert not queue.submit("other", 3)
+    assert queue.metrics()["depth"] == 3
+    assert queue.metrics()["users_waiting"] == 3
+    assert queue.counts["rejected"] == 1
+
+
+def test_jobs_waiting_longer_than_max_wait_expire():
+    handled, expired = [], []
+
+    async def handler(job):
+        handled.append(job)
+
+    async def on_expired(job):
+        expired.append(job)
+
+    async def main():
+        queue = JobQueue(handler, workers=1, max_wait=0.05, on_expired=on_expired)
+        assert queue.submit("a", "old")
+        await asyncio.sleep(0.1)
+        await drain(queue)
+        assert queue.submit("a", "new")
+        await drain(queue)
+        return queue
+
+    queue = asyncio.run(main())
+    assert expired == ["old"]
+    assert handled == ["new"]
+    assert queue.counts["expired"] == 1
+    assert queue.counts["completed"] == 1
+
+
+def test_metrics_count_outcomes_and_latency():
+    async def handler(job):
+        await asyncio.sleep(0.01)
+        if job == "bad":
+            raise ValueError(job)
+
+    async def main():
+        queue = JobQueue(handler, workers=2)
+        for user_id, job in [("a", "ok"), ("b", "bad"), ("c", "ok")]:
+            assert queue.submit(user_id, job)
+        await drain(queue)
+        return queue.metrics()
+
+    metrics = asyncio.run(main())
+    assert metrics["submitted"] == 3
+    assert metrics["completed"] == 2
+    assert metrics["failed"] == 1
+    assert metrics["depth"] == 0
+    assert metrics["running"] == 0
+    assert metrics["service_time"]["count"] == 3
+    assert metrics["service_time"]["p50_ms"] >= 10
+    assert metrics["wait_time"]["count"] == 3
+
+
+def test_workers_run_jobs_concurrently():
+    running, peak = [0], [0]
+
+    async def handler(job):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+
+    async def main():
+        queue = JobQueue(handler, workers=3)
+        for index in range(6):
+            assert queue.submit(f"user-{index}", index)
+        await drain(queue)
+
+    asyncio.run(main())
+    assert peak[0] == 3
+
+
+def test_latency_window_keeps_recent_samples():
+    window = LatencyWindow(max_samples=2)
+    for seconds in [1.0, 0.1, 0.2]:
+        window.add(seconds)
+    summary = window.summary()
+    assert summary["count"] == 3
+    assert summary["max_ms"] == 200.0
+    assert summary["avg_ms"] == round(1.3 / 3 * 1000, 1)
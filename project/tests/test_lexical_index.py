@@ -0,0 +1,69 @@
+from langchain.schema import Document
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "sync-1": ("카카오싱크는 간편가입과 약관 동의를 한 번에 처리합니다.", {"category": "sync"}),
+    "sync-2": ("카카오싱크 도입 전에 검수를 받아야 합니다.", {"category": "sync"}),
+    "channel-1": ("카카오톡 채널은 친구에게 메시지를 보냅니다.", {"category": "channel"}),
+    "social-1": ("카카오 로그인으로 친구 목록 API 를 사용합니다.", {"category": "social"}),
+}
+
+
+def build(path=None):
+    index = LexicalIndex(path)
+    for id, (text, metadata) in DOCUMENTS.items():
+        index.add(id, text, metadata)
+    return index
+
+
+def ids(results):
+    by_text = {text: id for id, (text, _) in DOCUMENTS.items()}
+    return [by_text[document.page_content] for document, _ in results]
+
+
+def test_tokenize_uses_hangul_bigrams_and_words():
+    assert tokenize("카카오싱크는 API") == ["카카", "카오", "오싱", "싱크", "크는", "api"]
+
+
+def test_bm25_ranks_matching_chunks_first():
+    index = build()
+    results = index.search("카카오싱크 검수", k=4)
+    assert ids(results)[0] == "sync-2"
+    assert set(ids(results)[:2]) == {"sync-1", "sync-2"}
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert index.search("전혀 없는 단어 xyz") == []
+
+
+def test_search_filters_category_and_respects_k():
+    index = build()
+    assert ids(index.search("친구", k=4, category="social")) == ["social-1"]
+    assert len(index.search("카카오", k=2)) == 2
+
+
+def test_add_replaces_and_remove_forgets(tmp_path):
+    index = build(str(tmp_path / "index.json"))
+    index.add("sync-2", "카카오싱크 요금은 무료입니다.", {"category": "sync"})
+    assert len(index) == 4
+    # 바뀌기 전 내용의 단어로는 더 이상 찾지 못한다.
+    assert index.search("검수") == []
+    index.remove("channel-1")
+    assert index.search("메시지") == []
+
+    index.save()
+    loaded = LexicalIndex(str(tmp_path / "index.json")).load()
+    assert set(loaded.documents) == {"sync-1", "sync-2", "social-1"}
+    assert loaded.search("요금")[0][0].page_content == "카카오싱크 요금은 무료입니다."
+
+
+def test_rrf_merges_by_rank_and_dedupes_by_content():
+    a, b, c = (Document(page_content=text) for text in ["a", "b", "c"])
+    vector = [(a, 0.1), (b, 0.2)]
+    # 같은 내용이면 다른 객체여도 한 번만 나온다.
+    lexical = [(Document(page_content="b", metadata={"from": "lexical"}), 9.0), (c, 5.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=3, rrf_k=60)
+    assert [document.page_content for document, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    # 먼저 나온 목록의 Document 를 쓴다.
+    assert fused[0][0] is b
+    assert len(reciprocal_rank_fusion([vector, lexical], k=1)) == 1
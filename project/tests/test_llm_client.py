@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from llm_client import LLMClient, LLMError
+
+
+class FakeChatServer:
+    # 별도 스레드의 loop 에서 도는 chat completions 서버. script 의 (status, Retry-After) 를 앞에서부터 쓰고, 비면 200
+    def __init__(self):
+        self.calls = 0
+        self.delay = 0.0
+        self.script = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def handle(self, request):
+        self.calls += 1
+        status, retry_after = self.script.pop(0) if self.script else (200, None)
+        await asyncio.sleep(self.delay)
+        if status != 200:
+            return web.Response(status=status, text="busy", headers={"Retry-After": retry_after} if retry_after else {})
+        body = await request.json()
+        content = body["messages"][-1]["content"]
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        self.thread.start()
+        port = asyncio.run_coroutine_threadsafe(self._start(), self.loop).result(10)
+        self.url = f"http://127.0.0.1:{port}/v1"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def server():
+    server = FakeChatServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return LLMClient(api_key="test", api_base=server.url, requests_per_minute=0, tokens_per_minute=0,
+                     max_retries=3, backoff=0.01, max_backoff=0.05, deadline=5.0)
+
+
+def run(client, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+def ask(client, text):
+    return client.acomplete(text, max_tokens=10)
+
+
+def test_same_request_is_sent_once(server, client):
+    server.delay = 0.1
+
+    async def main():
+        return await asyncio.gather(ask(client, "안녕"), ask(client, "안녕"), ask(client, "다른 질문"))
+
+    assert run(client, main()) == ["안녕", "안녕", "다른 질문"]
+    assert server.calls == 2
+    assert client.stats["coalesced"] == 1
+
+
+def test_cancelling_one_waiter_does_not_cancel_the_others(server, client):
+    server.delay = 0.2
+
+    async def main():
+        first = asyncio.ensure_future(ask(client, "안녕"))
+        second = asyncio.ensure_future(ask(client, "안녕"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    assert run(client, main()) == "안녕"
+    assert server.calls == 1
+
+
+def test_cancelling_every_waiter_cancels_the_call(server, client):
+    server.delay = 0.5
+
+    async def main():
+        waiter = asyncio.ensure_future(ask(client, "안녕"))
+        await asyncio.sleep(0.05)
+        entry = next(iter(client._state().inflight.values()))
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        return entry, client._state().inflight
+
+    entry, inflight = run(client, main())
+    assert entry["task"].cancelled()
+    assert inflight == {}
+
+
+def test_retryable_status_is_retried_with_backoff(server, client):
+    server.script = [(429, "0.01"), (503, None)]
+    assert run(client, ask(client, "안녕")) == "안녕"
+    assert server.calls == 3
+    assert client.stats["retries"] == 2
+
+
+def test_non_retryable_status_fails_without_retry(server, client):
+    server.script = [(400, None)]
+    with pytest.raises(LLMError):
+        run(client, ask(client, "안녕"))
+    assert server.calls == 1
+
+
+def test_gives_up_after_max_retries(server, client):
+    server.script = [(500, None)] * 10
+    with pytest.raises(LLMError):
+        run(client, ask(client, "안녕"))
+    assert server.calls == client.max_retries + 1
+
+
+def test_retry_delay_uses_retry_after_and_is_capped(client):
+    assert client._retry_delay(0, "0.02") == 0.02
+    assert client._retry_delay(0, "100") == client.max_backoff
+    assert all(0 <= client._retry_delay(attempt) <= client.max_backoff for attempt in range(20))
+
+
+def test_sync_chat_retries(server, client):
+    server.script = [(502, None)]
+    assert client.complete("안녕", max_tokens=10) == "안녕"
+    assert server.calls == 2
+
+
+def test_each_event_loop_keeps_its_own_session(server, client):
+    # 서버 loop 가 쓰는 중에 다른 loop (run_sync, 평가 worker 등) 가 같은 client 를 써도 서로의 세션을 닫지 않는다.
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def in_loop(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(10)
+
+    try:
+        assert in_loop(ask(client, "첫번째")) == "첫번째"
+        session = client._loop_states[loop].session
+        assert run(client, ask(client, "다른 loop")) == "다른 loop"
+        assert not session.closed
+        assert in_loop(ask(client, "두번째")) == "두번째"
+        assert client._loop_states[loop].session is session
+    finally:
+        in_loop(client.aclose())
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    assert client._loop_states == {}
+
+
+def test_state_of_a_closed_loop_is_dropped(server, client):
+    asyncio.run(ask(client, "닫히는 loop"))
+    assert len(client._loop_states) == 1
+    assert run(client, ask(client, "새 loop")) == "새 loop"
+    assert client._loop_states == {}
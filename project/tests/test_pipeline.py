@@ -0,0 +1,183 @@
+import asyncio
+import gc
+import pytest
+from pipeline import PipelinePlan, Stage
+
+
+def test_unused_stages_are_pruned():
+    calls = []
+
+    def stage(name, *inputs):
+        def func(**kwargs):
+            calls.append(name)
+            return name
+        return Stage(name, func, inputs)
+
+    plan = PipelinePlan("test", [stage("a", "x"), stage("b", "a"), stage("unused", "a")], outputs=["b"])
+    assert [stage.name for stage in plan.stages] == ["a", "b"]
+    assert plan.pruned == ["unused"]
+    assert plan.inputs == ["x"]
+    context = asyncio.run(plan.run(x=1))
+    assert calls == ["a", "b"]
+    assert "unused" not in context
+
+
+def test_missing_input_and_cycle_are_errors():
+    plan = PipelinePlan("test", [Stage("a", lambda x: x, ["x"])], outputs=["a"])
+    with pytest.raises(ValueError, match="입력값 누락"):
+        asyncio.run(plan.run())
+    with pytest.raises(ValueError, match="순환"):
+        PipelinePlan("test", [Stage("a", lambda b: b, ["b"]), Stage("b", lambda a: a, ["a"])], outputs=["a"])
+
+
+def test_constant_stage_is_computed_once():
+    calls = []
+
+    def load_template():
+        calls.append("template")
+        return "template"
+
+    plan = PipelinePlan("test", [
+        Stage("template", load_template, constant=True),
+        Stage("answer", lambda template, question: f"{template}:{question}", ["template", "question"]),
+    ], outputs=["answer"])
+
+    async def main():
+        return [(await plan.run(question=question))["answer"] for question in ["q1", "q2"]]
+
+    assert asyncio.run(main()) == ["template:q1", "template:q2"]
+    assert calls == ["template"]
+
+
+def test_independent_stages_run_concurrently():
+    async def slow(x):
+        await asyncio.sleep(0.05)
+        return x
+
+    plan = PipelinePlan("test", [
+        Stage("a", slow, ["x"]),
+        Stage("b", slow, ["x"]),
+        Stage("both", lambda a, b: a + b, ["a", "b"]),
+    ], outputs=["both"])
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        context = await plan.run(x=1)
+        return context["both"], loop.time() - started
+
+    both, elapsed = asyncio.run(main())
+    assert both == 2
+    assert elapsed < 0.09
+
+
+def gated_plan(calls, speculative, intent_delay=0.0):
+    async def classify(message):
+        await asyncio.sleep(intent_delay)
+        return "None" if "날씨" in message else "sync"
+
+    async def search(message):
+        calls.append("search:start")
+        await asyncio.sleep(0.05)
+        calls.append("search:done")
+        return ["doc"]
+
+    return PipelinePlan("test", [
+        Stage("intent", classify, ["message"]),
+        Stage("documents", search, ["message"], when=("intent", lambda intent: intent != "None"), default=[],
+              speculative=speculative),
+    ], outputs=["intent", "documents"])
+
+
+def test_non_speculative_stage_runs_only_when_condition_holds():
+    calls = []
+    plan = gated_plan(calls, speculative=False)
+    assert asyncio.run(plan.run(message="카카오싱크"))["documents"] == ["doc"]
+    assert calls == ["search:start", "search:done"]
+    calls.clear()
+    assert asyncio.run(plan.run(message="오늘 날씨"))["documents"] == []
+    assert calls == []
+
+
+def test_speculative_stage_is_cancelled_when_condition_fails():
+    calls = []
+    plan = gated_plan(calls, speculative=True, intent_delay=0.01)
+
+    async def main():
+        context = await plan.run(message="오늘 날씨")
+        await asyncio.sleep(0.08)
+        return context
+
+    assert asyncio.run(main())["documents"] == []
+    # 조건을 확인하기 전에 시작했지만 끝나기 전에 취소된다.
+    assert calls == ["search:start"]
+
+
+def test_speculative_stage_result_is_used_when_condition_holds():
+    calls = []
+    plan = gated_plan(calls, speculative=True, intent_delay=0.05)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        context = await plan.run(message="카카오싱크")
+        return context, loop.time() - started
+
+    context, elapsed = asyncio.run(main())
+    assert context["documents"] == ["doc"]
+    # intent 를 기다리는 동안 검색이 이미 진행된다.
+    assert elapsed < 0.09
+
+
+def test_failed_speculative_stage_exception_is_retrieved():
+    errors = []
+
+    async def classify(message):
+        await asyncio.sleep(0.02)
+        return "None"
+
+    async def search(message):
+        # 취소되는 도중에 다른 예외로 끝나는 경우
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            raise RuntimeError("검색 실패")
+
+    plan = PipelinePlan("test", [
+        Stage("intent", classify, ["message"]),
+        Stage("documents", search, ["message"], when=("intent", lambda intent: intent != "None"), default=[]),
+    ], outputs=["documents"])
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        context = await plan.run(message="오늘 날씨")
+        await asyncio.sleep(0)
+        gc.collect()
+        await asyncio.sleep(0)
+        return context
+
+    assert asyncio.run(main())["documents"] == []
+    assert errors == []
+
+
+def test_failure_cancels_sibling_stages():
+    calls = []
+
+    async def fail(x):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("실패")
+
+    async def slow(x):
+        await asyncio.sleep(0.05)
+        calls.append("slow")
+        return x
+
+    plan = PipelinePlan("test", [Stage("a", fail, ["x"]), Stage("b", slow, ["x"])], outputs=["a", "b"])
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await plan.run(x=1)
+        await asyncio.sleep(0.08)
+
+    asyncio.run(main())
+    assert calls == []
@@ -0,0 +1,69 @@
+import pytest
+from precomputed import PrecomputedAnswers, dataset_hash, question_key
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "dataset"
+    path.mkdir()
+    (path / "project_data_kakao_sync.txt").write_text("카카오싱크:\n#기능\n간편가입\n", encoding="utf-8")
+    return path
+
+
+def build(path, version, rows):
+    answers = PrecomputedAnswers(str(path), threshold=0.95)
+    answers.begin(version)
+    for question, intent, answer, vector in rows:
+        answers.put(question, intent, answer, vector)
+    answers.close()
+
+
+def test_question_key_ignores_spacing_case_and_trailing_punctuation():
+    assert question_key("  카카오싱크   기능은 뭐야?? ") == question_key("카카오싱크 기능은 뭐야")
+    assert question_key("Kakao Sync?") == question_key("kakao sync")
+    assert question_key("카카오싱크 기능") != question_key("카카오싱크 가격")
+
+
+def test_exact_and_semantic_lookup(tmp_path, dataset):
+    version = dataset_hash(str(dataset))
+    build(tmp_path / "answers.sqlite3", version, [
+        ("카카오싱크 기능은 뭐야?", "sync", "간편가입입니다.", [1.0, 0.0, 0.0]),
+        ("카카오톡 채널이 뭐야?", "channel", "메시지 채널입니다.", [0.0, 1.0, 0.0]),
+    ])
+    answers = PrecomputedAnswers(str(tmp_path / "answers.sqlite3"), threshold=0.95).load(version)
+    assert len(answers) == 2
+    assert answers.get("카카오싱크 기능은 뭐야").answer == "간편가입입니다."
+    assert answers.get("카카오싱크 가격은?") is None
+
+    hit = answers.nearest([0.1, 2.0, 0.0])
+    assert (hit.intent, hit.answer) == ("channel", "메시지 채널입니다.")
+    assert answers.nearest([1.0, 1.0, 0.0]) is None
+    assert answers.stats() == {"size": 2, "hits": 1, "semantic_hits": 1, "misses": 1}
+
+
+def test_answers_from_another_dataset_version_are_not_served(tmp_path, dataset):
+    path = tmp_path / "answers.sqlite3"
+    build(path, dataset_hash(str(dataset)), [("카카오싱크 기능은 뭐야?", "sync", "간편가입입니다.", [1.0, 0.0])])
+
+    (dataset / "project_data_kakao_sync.txt").write_text("카카오싱크:\n#기능\n바뀐 내용\n", encoding="utf-8")
+    version = dataset_hash(str(dataset))
+    answers = PrecomputedAnswers(str(path)).load(version)
+    assert len(answers) == 0
+    assert not answers.has_vectors
+    assert answers.get("카카오싱크 기능은 뭐야?") is None
+
+    # 새 버전으로 배치를 시작하면 이전 답변은 지워진다.
+    answers.begin(version)
+    assert answers.done_keys() == set()
+
+
+def test_begin_with_same_version_resumes(tmp_path, dataset):
+    path = tmp_path / "answers.sqlite3"
+    version = dataset_hash(str(dataset))
+    build(path, version, [("카카오싱크 기능은 뭐야?", "sync", "간편가입입니다.", None)])
+    answers = PrecomputedAnswers(str(path))
+    answers.begin(version)
+    assert answers.done_keys() == {question_key("카카오싱크 기능은 뭐야?")}
+    answers.begin(version, reset=True)
+    assert answers.done_keys() == set()
+    answers.close()
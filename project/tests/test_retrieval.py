@@ -0,0 +1,17 @@
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from retrieval import RetrievalRegistry
+
+
+def test_close_drops_only_its_own_chroma_client(tmp_path):
+    other = chromadb.PersistentClient(path=str(tmp_path / "other"))
+    other.get_or_create_collection("kept").add(ids=["1"], documents=["유지"], embeddings=[[1.0, 0.0]])
+    registry = RetrievalRegistry(persist_directory=str(tmp_path / "mine"), embedding=object())
+    registry._chroma_client().get_or_create_collection("mine")
+
+    registry.close()
+
+    systems = SharedSystemClient._identifer_to_system
+    assert str(tmp_path / "mine") not in systems
+    assert str(tmp_path / "other") in systems
+    assert other.get_collection("kept").count() == 1
@@ -0,0 +1,43 @@
+from section_parser import DEFAULT_SECTION, iter_dataset_sections, iter_sections
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_duplicate_titles_are_kept_separately(tmp_path):
+    filepath = write(tmp_path / "data.txt", "카카오싱크:\n\n#설정\n첫 번째\n\n#기능\n기능 설명\n\n#설정\n두 번째\n")
+    sections = [(section.section_path, section.text) for section in iter_sections(filepath)]
+    assert sections == [
+        (DEFAULT_SECTION, "카카오싱크:"),
+        ("설정", "첫 번째"),
+        ("기능", "기능 설명"),
+        ("설정", "두 번째"),
+    ]
+
+
+def test_nested_and_non_hangul_headings(tmp_path):
+    filepath = write(tmp_path / "data.txt", "# 과정 예시\n개요\n## Step 1\n가입\n## Step 2 (API)\n동의\n# FAQ\n질문\n")
+    assert [section.section_path for section in iter_sections(filepath)] == [
+        "과정 예시", "과정 예시 > Step 1", "과정 예시 > Step 2 (API)", "FAQ"]
+
+
+def test_long_sections_are_split_by_lines_with_offsets(tmp_path):
+    lines = "".join(f"{index}번째 줄입니다.\n" for index in range(20))
+    filepath = write(tmp_path / "data.txt", f"#긴 섹션\n{lines}")
+    sections = list(iter_sections(filepath, max_chars=60))
+    assert len(sections) > 1
+    assert all(section.section_path == "긴 섹션" for section in sections)
+    assert "\n".join(section.text for section in sections) == lines.strip()
+    raw = open(filepath, "rb").read()
+    for section in sections:
+        assert raw[section.offset:].decode("utf-8").startswith(section.text)
+
+
+def test_dataset_sections_follow_file_order(tmp_path):
+    write(tmp_path / "b.txt", "#B\n내용\n")
+    write(tmp_path / "a.txt", "#A\n내용\n")
+    write(tmp_path / "notes.md", "#무시\n내용\n")
+    assert [(section.file, section.section_path) for section in iter_dataset_sections(str(tmp_path))] == [
+        ("a.txt", "A"), ("b.txt", "B")]
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import pytest
+from streaming import CONTINUE_UTTERANCE, AnswerStream, ContinuationStore, find_cut, simple_text_payload
+
+
+def test_find_cut_waits_for_min_chars_then_cuts_at_sentence_end():
+    text = "짧은 문장. 두번째 문장은 조금 더 깁니다. 세번째"
+    assert find_cut(text, min_chars=1, max_chars=100) == len("짧은 문장.")
+    assert find_cut(text, min_chars=10, max_chars=100) == len("짧은 문장. 두번째 문장은 조금 더 깁니다.")
+    assert find_cut("아직 끝나지 않은 문장", min_chars=1, max_chars=100) is None
+
+
+def test_find_cut_falls_back_to_space_then_hard_cut_over_max_chars():
+    assert find_cut("가나다 라마바 사아자", min_chars=1, max_chars=8) == len("가나다 라마바")
+    assert find_cut("가" * 20, min_chars=1, max_chars=8) == 8
+
+
+def test_next_part_returns_at_sentence_boundary_once_min_chars_arrive():
+    async def main():
+        stream = AnswerStream()
+
+        async def produce():
+            for delta in ["카카오싱크는 ", "간편가입 서비스입니다. ", "로그인도 ", "지원합니다."]:
+                await asyncio.sleep(0.01)
+                stream.feed(delta)
+            stream.finish()
+
+        producer = asyncio.ensure_future(produce())
+        first = await stream.next_part(min_chars=5, timeout=5)
+        rest = await stream.next_part(len(first[0]), min_chars=1000, timeout=5)
+        await producer
+        return first, rest
+
+    first, rest = asyncio.run(main())
+    assert first == ("카카오싱크는 간편가입 서비스입니다.", False)
+    assert rest == (" 로그인도 지원합니다.", True)
+
+
+def test_next_part_sends_what_it_has_when_the_deadline_passes():
+    async def main():
+        stream = AnswerStream()
+        stream.feed("첫 문장입니다. 아직 생성 중인")
+        start = time.monotonic()
+        part = await stream.next_part(min_chars=100, timeout=0.05)
+        return part, time.monotonic() - start
+
+    (text, complete), elapsed = asyncio.run(main())
+    assert (text, complete) == ("첫 문장입니다.", False)
+    assert elapsed < 1
+
+
+def test_next_part_returns_empty_text_when_nothing_arrived_by_the_deadline():
+    assert asyncio.run(AnswerStream().next_part(timeout=0.01)) == ("", False)
+
+
+def test_next_part_returns_everything_when_done():
+    stream = AnswerStream()
+    stream.feed("짧은 답")
+    stream.finish()
+    assert asyncio.run(stream.next_part(min_chars=100)) == ("짧은 답", True)
+
+
+def test_next_part_raises_the_generation_error():
+    stream = AnswerStream()
+    stream.fail(RuntimeError("LLM 실패"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(stream.next_part(timeout=1))
+
+
+def test_continuation_is_popped_once_with_its_offset():
+    store = ContinuationStore()
+    stream = AnswerStream()
+    store.put("user", stream, 12)
+    assert store.pop("user") == (stream, 12)
+    assert store.pop("user") is None
+
+
+def test_continuation_expires_after_ttl():
+    store = ContinuationStore(ttl=0.01)
+    store.put("user", AnswerStream(), 0)
+    time.sleep(0.02)
+    assert store.pop("user") is None
+
+
+def test_continuation_store_drops_the_oldest_user_over_max_entries():
+    store = ContinuationStore(max_entries=2)
+    for user in ["a", "b", "a", "c"]:
+        store.put(user, AnswerStream(), 0)
+    assert store.pop("b") is None
+    assert store.pop("a") is not None and store.pop("c") is not None
+
+
+def test_payload_has_continue_button_only_when_more_remains():
+    assert "quickReplies" not in simple_text_payload("끝", has_more=False)["template"]
+    replies = simple_text_payload("앞부분", has_more=True)["template"]["quickReplies"]
+    assert replies[0]["messageText"] == CONTINUE_UTTERANCE
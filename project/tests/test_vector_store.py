@@ -0,0 +1,67 @@
+import glob
+import multiprocessing
+import os
+import numpy as np
+from vector_store import METADATA_NAME, NumpyVectorStore, write_store
+
+
+def write(path, count, dtype="float32"):
+    rng = np.random.default_rng(count)
+    ids = [f"id-{i}" for i in range(count)]
+    write_store(path, ids, [f"문서 {i}" for i in range(count)], [{"category": "sync"}] * count,
+                rng.standard_normal((count, 8)).tolist(), dtype)
+
+
+def versions(path):
+    return sorted(glob.glob(f"{path}.v-*"))
+
+
+def test_rewrite_swaps_the_link_and_keeps_one_previous_version(tmp_path):
+    path = str(tmp_path / "numpy_store" / "kakao")
+    for count in [3, 4, 5]:
+        write(path, count)
+        assert os.path.islink(path)
+        assert len(NumpyVectorStore(path, None).ids) == count
+    assert len(versions(path)) == 2
+    assert not glob.glob(f"{path}.tmp-*") and not glob.glob(f"{path}.link-*")
+
+
+def test_open_store_keeps_working_after_later_swaps(tmp_path):
+    path = str(tmp_path / "kakao")
+    write(path, 3)
+    store = NumpyVectorStore(path, None)
+    write(path, 4)
+    write(path, 5)
+    assert len(store.ids) == 3
+    assert store._scores(np.ones(8), None).shape == (3,)
+
+
+def test_old_directory_layout_is_replaced(tmp_path):
+    path = str(tmp_path / "kakao")
+    os.makedirs(path)
+    with open(os.path.join(path, METADATA_NAME), "w") as f:
+        f.write("{}")
+    write(path, 3)
+    assert os.path.islink(path)
+    assert len(NumpyVectorStore(path, None).ids) == 3
+
+
+def _write_many(path, seed):
+    for i in range(10):
+        write(path, seed * 100 + i)
+
+
+def test_concurrent_writers_do_not_race(tmp_path):
+    # uvicorn worker 여러 개가 처음 export 를 동시에 하는 경우
+    path = str(tmp_path / "kakao")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_write_many, args=(path, seed)) for seed in range(1, 5)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+    store = NumpyVectorStore(path, None)
+    assert len(store.ids) in {seed * 100 + 9 for seed in range(1, 5)}
+    assert len(versions(path)) == 2
+    assert not glob.glob(f"{path}.tmp-*")